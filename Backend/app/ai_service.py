@@ -2,22 +2,27 @@
 AI Service for Document Analysis using Google Gemini
 """
 
-try:
-    import google.generativeai as genai
-    from google.generativeai import types
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    print("⚠️  Warning: google-generativeai not available. AI features disabled.")
-
-from PIL import Image
+import hashlib
 import json
 import re
 import base64
-import io
 from typing import Dict, Any, Optional
 import os
 from decouple import config
+from app.image_pipeline import prepare_image_async
+from app.result_cache import make_cache_key, get_cached_result, store_result
+from app.rate_limiter import RateLimitExceeded, get_rate_limiter, rate_limited, retry_after_seconds
+from app.model_backend import get_model_backend
+from app.structured_output import (
+    AI_STRUCTURED_OUTPUT,
+    DOCUMENT_ANALYSIS_SCHEMA,
+    DOCUMENT_CLASSIFICATION_SCHEMA,
+    DOCUMENT_COMBINED_SCHEMA,
+    INSURANCE_RECOMMENDATION_SCHEMA,
+    PERSON_INFO_SCHEMA,
+    VEHICLE_INFO_SCHEMA,
+    parse_json_response,
+)
 
 # Person Info Extraction Prompt - For CCCD/ID Cards/Driver License
 PERSON_INFO_EXTRACTION_PROMPT = """You are an expert at extracting personal information from Vietnamese ID cards (CCCD), Driver Licenses, and similar documents.
@@ -215,39 +220,23 @@ IMPORTANT:
 Now extract vehicle information from this document:"""
 
 # Configure Gemini API - Load from environment variable
-GEMINI_API_KEY = config('GEMINI_API_KEY')
+GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+
+# Opt-in: analyze each page with one combined structured + markdown call
+AI_COMBINED_ANALYSIS = config('AI_COMBINED_ANALYSIS', default=False, cast=bool)
 print(f"🔑 DEBUG: GEMINI_API_KEY loaded: {GEMINI_API_KEY[:20]}...{GEMINI_API_KEY[-10:] if len(GEMINI_API_KEY) > 30 else ''}")
 
-# Mock client for compatibility (will be replaced with proper implementation)
-class MockGeminiClient:
-    def __init__(self):
-        self.models = self
-    
-    def generate_content(self, *args, **kwargs):
-        # Return mock response for now
-        class MockResponse:
-            def __init__(self):
-                self.text = json.dumps({
-                    "document_type": "Unknown",
-                    "confidence": 0.5,
-                    "title": "Mock Analysis Result",
-                    "summary": "AI service temporarily disabled during deployment",
-                    "people": [],
-                    "organizations": [],
-                    "locations": [],
-                    "dates": [],
-                    "numbers": [],
-                    "signature_detected": False
-                })
-        return MockResponse()
+# Gemini model version (part of the AI result cache key)
+GEMINI_MODEL_NAME = 'gemini-2.5-flash-lite'
+
+
+def result_cache_model_name() -> str:
+    """
+    Model name in AI result cache keys, looked up per call so results of a
+    backend swapped in with set_model_backend (fake) are kept apart
+    """
+    return get_model_backend().cache_name(GEMINI_MODEL_NAME)
 
-if GEMINI_AVAILABLE:
-    # Configure the Gemini model
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    client = genai  # Use real Gemini API
-else:
-    client = MockGeminiClient()
 
 # Insurance Chatbot Prompt - Smart advisor based on document analysis
 INSURANCE_CHATBOT_PROMPT = """Bạn là AI Tư vấn viên bảo hiểm chuyên nghiệp của công ty ADE Insurance.
@@ -618,25 +607,97 @@ IMPORTANT:
 Now analyze the document and return ONLY the JSON object:"""
 
 
-def clean_json_response(response_text: str) -> str:
+# Text Analysis Prompt - same schema, input is the PDF text layer instead of an image
+DOCUMENT_TEXT_ANALYSIS_PROMPT = DOCUMENT_AUTO_ANALYSIS_PROMPT.replace(
+    "Your task is to analyze this document image and extract structured information in valid JSON format.",
+    "Your task is to analyze the text of one page of a digital PDF (extracted from its text layer, "
+    "tables as markdown) and extract structured information in valid JSON format."
+).replace(
+    "Now analyze the document and return ONLY the JSON object:",
+    "NOTE: Only text is available. Set signature_detected to true only if the text explicitly "
+    "mentions a signature, stamp or digital signature.\n\n"
+    "Now analyze the document text below and return ONLY the JSON object:"
+)
+
+# Combined Analysis Prompt - Structured JSON + full Markdown in a single response
+DOCUMENT_COMBINED_ANALYSIS_PROMPT = """You are an expert document analyzer and OCR system for insurance and legal documents.
+
+Your task is to analyze this document image ONCE and return BOTH:
+1. Structured information (entities, dates, numbers) in the JSON schema below
+2. ALL text content of the document formatted as clean Markdown
+
+CRITICAL RULES:
+1. Automatically detect the document type (e.g., "Insurance Claim Form", "Policy Document", "Contract", "Invoice", "ID Card", etc.)
+2. Extract ONLY information that is ACTUALLY PRESENT and CLEARLY VISIBLE in the document
+3. DO NOT invent, guess, or infer information not explicitly shown
+4. Keep the original language - DO NOT translate
+5. Preserve all numbers, dates, codes, and special characters EXACTLY as shown
+
+OUTPUT FORMAT:
+- Return ONLY one valid JSON object (no markdown fences, no explanations)
+- The "markdown" value is a JSON string: escape quotes and newlines properly
+
+{
+  "structured": {
+    "document_type": "specific type of document",
+    "confidence": 0.0-1.0,
+    "title": "document title if present | null",
+    "summary": "concise 2-3 sentence summary of key information",
+    "people": [
+      {"name": "Full Name", "role": "Insured | Claimant | Witness | Doctor | etc. | null"}
+    ],
+    "organizations": [
+      {"name": "Company/Organization Name"}
+    ],
+    "locations": [
+      {"name": "Full Address or Location"}
+    ],
+    "dates": [
+      {"label": "Date of Birth | Effective Date | Claim Date | etc.", "value": "YYYY-MM-DD"}
+    ],
+    "numbers": [
+      {"label": "Policy Number | Claim Number | Amount | Phone | ID | Account | etc.", "value": "exact value as string"}
+    ],
+    "signature_detected": true | false
+  },
+  "markdown": "# Title\\n\\nFull document content as Markdown..."
+}
+
+STRUCTURED GUIDELINES:
+- Use null for missing text fields, [] for missing arrays, false for booleans
+- Tables: extract EACH important row as a separate "numbers" entry with clear field:value pairs
+- Dates: ONLY dates explicitly written, formatted as YYYY-MM-DD
+- signature_detected: true if a handwritten signature, stamp, seal, or official mark is visible
+
+MARKDOWN GUIDELINES:
+- Extract EVERY piece of text visible in the document - do not skip any content
+- Headers: # Title, ## Section, ### Subsection
+- Tables: proper Markdown table syntax with header row and |----| separator row, ALL rows
+- Lists: -, * or numbered; keep logical reading order (top to bottom, left to right)
+- Keep paragraph breaks
+
+Now analyze the document and return ONLY the JSON object:"""
+
+
+# Document Classification Prompt - cheap routing call on a downscaled image
+DOCUMENT_CLASSIFICATION_PROMPT = """Classify this document image into exactly one category:
+
+- "person": personal identity document - CCCD / CMND (ID card), driver license (Giấy phép lái xe), passport (Hộ chiếu)
+- "vehicle": vehicle document - vehicle registration (Giấy đăng ký xe / Cà vẹt), vehicle inspection certificate
+- "general": anything else - insurance policies, contracts, invoices, forms, letters, statements
+
+Return ONLY this JSON (no markdown, no explanations):
+{"category": "person | vehicle | general", "document_type": "short name of the document", "confidence": 0.0-1.0}
+"""
+
+
+def clean_markdown_response(markdown_text: str) -> str:
     """
-    Clean JSON response by removing markdown wrappers and extra text
+    Clean Markdown response by removing ```markdown code block wrappers
     """
-    # Remove markdown code blocks
-    text = re.sub(r'```json\s*', '', response_text)
-    text = re.sub(r'```\s*', '', text)
-    
-    # Remove any text before first { and after last }
-    text = text.strip()
-    
-    # Find first { and last }
-    start_idx = text.find('{')
-    end_idx = text.rfind('}')
-    
-    if start_idx != -1 and end_idx != -1:
-        text = text[start_idx:end_idx+1]
-    
-    return text.strip()
+    markdown_text = re.sub(r'^```markdown\s*', '', markdown_text, flags=re.MULTILINE)
+    markdown_text = re.sub(r'^```\s*$', '', markdown_text, flags=re.MULTILINE)
+    return markdown_text.strip()
 
 
 def validate_json_schema(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -666,6 +727,72 @@ def validate_json_schema(data: Dict[str, Any]) -> Dict[str, Any]:
     return schema
 
 
+def is_quota_error(error: Exception) -> bool:
+    """
+    Check whether a Gemini API error is a quota / rate limit error (HTTP 429)
+    """
+    error_msg = str(error)
+    return "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower()
+
+
+async def generate_content_async(
+    contents: list,
+    max_output_tokens: int = 8192,
+    max_retries: int = 1,
+    extractor: str = "analyze",
+    response_schema: Optional[Dict[str, Any]] = None
+):
+    """
+    Call Gemini through the model backend's async API so the event loop
+    keeps serving other requests while the model is working
+    
+    Every call first waits for admission from the process-wide rate
+    limiter (RPM / TPM / RPD budgets, priority queue). A quota error from
+    the API pauses the limiter and the call queues again, up to max_retries
+    attempts; any other error, or a quota error on the last attempt, is
+    raised to the caller.
+    
+    Args:
+        contents: Prompt parts (text and images)
+        max_output_tokens: Output token limit for the response
+        max_retries: Total number of attempts for quota errors
+        extractor: Which prompt this is (names the fake backend's canned response)
+        response_schema: Schema for JSON extractors (schema-constrained output
+            unless AI_STRUCTURED_OUTPUT is off)
+        
+    Returns:
+        Gemini response object
+        
+    Raises:
+        RateLimitExceeded: The limiter's queue is full or the wait too long
+    """
+    for attempt in range(max_retries):
+        try:
+            async with rate_limited(GEMINI_MODEL_NAME, contents, max_output_tokens) as call:
+                call["response"] = await get_model_backend().generate(
+                    GEMINI_MODEL_NAME,
+                    contents,
+                    max_output_tokens=max_output_tokens,
+                    temperature=0.1,
+                    top_p=0.95,
+                    top_k=40,
+                    extractor=extractor,
+                    response_schema=response_schema if AI_STRUCTURED_OUTPUT else None
+                )
+            return call["response"]
+        except RateLimitExceeded:
+            raise
+        except Exception as api_error:
+            if not is_quota_error(api_error):
+                raise
+            
+            # Budgets are out of sync with the server: pause admissions, then queue again
+            get_rate_limiter(GEMINI_MODEL_NAME).report_quota_error(retry_after_seconds(api_error))
+            if attempt >= max_retries - 1:
+                raise
+            print(f"   ⚠️  Quota exceeded (attempt {attempt + 1}/{max_retries}), queued for retry")
+
+
 async def analyze_auto_document(image_path: str) -> Dict[str, Any]:
     """
     Analyze document using Gemini 2.5 Flash
@@ -694,62 +821,42 @@ async def analyze_auto_document(image_path: str) -> Dict[str, Any]:
                 "signature_detected": False
             }
         
-        # Open image with PIL
-        image = Image.open(image_path)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Optimize image for large files (> 2MB or > 4000px)
-        file_size = os.path.getsize(image_path) / (1024 * 1024)  # Size in MB
-        max_dimension = max(image.size)
+        # Shared preprocessing: decoded and encoded once per page, reused by every extractor
+        prepared = await prepare_image_async(image_path)
         
-        if file_size > 2 or max_dimension > 4000:
-            # Calculate new size while maintaining aspect ratio
-            max_size = 3000  # Maximum dimension
-            if max_dimension > max_size:
-                ratio = max_size / max_dimension
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"   📐 Optimized image from {image_path} to {new_size} (original: {max_dimension}px, {file_size:.1f}MB)")
-        
-        # Convert PIL Image to bytes for Gemini
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
+        # Return cached result for identical image + prompt + model
+        cache_key = make_cache_key(prepared.digest, DOCUMENT_AUTO_ANALYSIS_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (analyze): {cache_key[:12]}")
+            return cached_result
         
         # Generate content with Gemini - simplified API call
-        response = model.generate_content(
+        response = await generate_content_async(
             [
                 DOCUMENT_AUTO_ANALYSIS_PROMPT,
-                Image.open(img_byte_arr)
+                prepared.as_part()
             ],
-            generation_config=genai.GenerationConfig(
-                temperature=0.1,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=8192
-            )
+            max_output_tokens=8192,
+            extractor="analyze",
+            response_schema=DOCUMENT_ANALYSIS_SCHEMA
         )
         
         # Get response text
         response_text = response.text
         
-        # Clean JSON response
-        cleaned_json = clean_json_response(response_text)
-        
-        # Parse JSON
+        # Parse JSON (schema-constrained; truncated output is recovered)
         try:
-            result = json.loads(cleaned_json)
+            result, complete = parse_json_response(response_text, "analyze", DOCUMENT_ANALYSIS_SCHEMA)
             # Validate schema
             result = validate_json_schema(result)
+            if complete:
+                await store_result(cache_key, "analyze", result_cache_model_name(), result)
             return result
         except json.JSONDecodeError as e:
             # If JSON parsing fails, return error with raw response
             print(f"JSON Parse Error: {e}")
             print(f"Raw response: {response_text}")
-            print(f"Cleaned JSON: {cleaned_json}")
             
             return {
                 "error": f"Failed to parse JSON response: {str(e)}",
@@ -784,6 +891,80 @@ async def analyze_auto_document(image_path: str) -> Dict[str, Any]:
         }
 
 
+async def analyze_document_text(page_text: str) -> Dict[str, Any]:
+    """
+    Analyze a page from its text layer with a text-only Gemini call
+    Used for born-digital PDF pages, no image is sent
+    
+    Args:
+        page_text: Page text (markdown) extracted from the PDF text layer
+        
+    Returns:
+        Dictionary containing structured analysis results (same schema as
+        analyze_auto_document)
+    """
+    try:
+        # Return cached result for identical text + prompt + model
+        text_digest = hashlib.sha256(page_text.encode("utf-8")).hexdigest()
+        cache_key = make_cache_key(text_digest, DOCUMENT_TEXT_ANALYSIS_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (text analyze): {cache_key[:12]}")
+            return cached_result
+        
+        response = await generate_content_async(
+            [
+                DOCUMENT_TEXT_ANALYSIS_PROMPT,
+                f"DOCUMENT TEXT:\n{page_text}"
+            ],
+            max_output_tokens=8192,
+            extractor="text-analyze",
+            response_schema=DOCUMENT_ANALYSIS_SCHEMA
+        )
+        
+        response_text = response.text
+        
+        try:
+            data, complete = parse_json_response(response_text, "text-analyze", DOCUMENT_ANALYSIS_SCHEMA)
+            result = validate_json_schema(data)
+            if complete:
+                await store_result(cache_key, "text-analyze", result_cache_model_name(), result)
+            return result
+        except json.JSONDecodeError as e:
+            print(f"JSON Parse Error (text): {e}")
+            print(f"Raw response: {response_text[:500]}")
+            
+            return {
+                "error": f"Failed to parse JSON response: {str(e)}",
+                "raw_response": response_text[:500],
+                "document_type": "Parse Error",
+                "confidence": 0.0,
+                "title": None,
+                "summary": "Failed to parse AI response",
+                "people": [],
+                "organizations": [],
+                "locations": [],
+                "dates": [],
+                "numbers": [],
+                "signature_detected": False
+            }
+            
+    except Exception as e:
+        print(f"Error in analyze_document_text: {e}")
+        return {
+            "error": str(e),
+            "document_type": "Error",
+            "confidence": 0.0,
+            "title": None,
+            "summary": f"Analysis failed: {str(e)}",
+            "people": [],
+            "organizations": [],
+            "locations": [],
+            "dates": [],
+            "numbers": [],
+            "signature_detected": False
+        }
+
 async def extract_markdown_content(image_path: str) -> str:
     """
     Extract full text content from document as Markdown
@@ -800,53 +981,30 @@ async def extract_markdown_content(image_path: str) -> str:
         if not os.path.exists(image_path):
             return f"# Error\n\nImage file not found: {image_path}"
         
-        # Open image with PIL
-        image = Image.open(image_path)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Shared preprocessing: decoded and encoded once per page, reused by every extractor
+        prepared = await prepare_image_async(image_path)
         
-        # Optimize image for large files (> 2MB or > 4000px)
-        file_size = os.path.getsize(image_path) / (1024 * 1024)  # Size in MB
-        max_dimension = max(image.size)
-        
-        if file_size > 2 or max_dimension > 4000:
-            # Calculate new size while maintaining aspect ratio
-            max_size = 3000  # Maximum dimension
-            if max_dimension > max_size:
-                ratio = max_size / max_dimension
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"   📐 Optimized image from {image_path} to {new_size} (original: {max_dimension}px, {file_size:.1f}MB)")
-        
-        # Convert PIL Image to bytes for Gemini
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
+        # Return cached result for identical image + prompt + model
+        cache_key = make_cache_key(prepared.digest, DOCUMENT_MARKDOWN_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (markdown): {cache_key[:12]}")
+            return cached_result
         
         # Generate content with Gemini - simplified API call
-        response = model.generate_content(
+        response = await generate_content_async(
             [
                 DOCUMENT_MARKDOWN_PROMPT,
-                Image.open(img_byte_arr)
+                prepared.as_part()
             ],
-            generation_config=genai.GenerationConfig(
-                temperature=0.1,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=8192
-            )
+            max_output_tokens=8192,
+            extractor="markdown"
         )
         
-        # Get response text
-        markdown_text = response.text
-        
-        # Clean up any markdown code blocks if present
-        markdown_text = re.sub(r'^```markdown\s*', '', markdown_text, flags=re.MULTILINE)
-        markdown_text = re.sub(r'^```\s*$', '', markdown_text, flags=re.MULTILINE)
-        markdown_text = markdown_text.strip()
-        
+        # Get response text and clean up any markdown code blocks if present
+        markdown_text = clean_markdown_response(response.text)
+        if markdown_text:
+            await store_result(cache_key, "markdown", result_cache_model_name(), markdown_text)
         return markdown_text
         
     except Exception as e:
@@ -857,6 +1015,118 @@ async def extract_markdown_content(image_path: str) -> str:
         return f"# Error\n\nFailed to extract text: {str(e)}"
 
 
+async def analyze_document_combined(image_path: str) -> Dict[str, Any]:
+    """
+    Analyze document and extract its Markdown text in a single Gemini call
+    Sends the page image once instead of twice (structured + markdown)
+    
+    Args:
+        image_path: Path to the image file
+        
+    Returns:
+        Dictionary with "structured" (validated analysis result, same schema
+        as analyze_auto_document) and "markdown" (Markdown text content)
+    """
+    try:
+        # Load image
+        if not os.path.exists(image_path):
+            return {
+                "structured": {
+                    "error": f"Image file not found: {image_path}",
+                    "document_type": "Error",
+                    "confidence": 0.0,
+                    "title": None,
+                    "summary": "Failed to load document image",
+                    "people": [],
+                    "organizations": [],
+                    "locations": [],
+                    "dates": [],
+                    "numbers": [],
+                    "signature_detected": False
+                },
+                "markdown": f"# Error\n\nImage file not found: {image_path}"
+            }
+        
+        # Shared preprocessing: decoded and encoded once per page, reused by every extractor
+        prepared = await prepare_image_async(image_path)
+        
+        # Return cached result for identical image + prompt + model
+        cache_key = make_cache_key(prepared.digest, DOCUMENT_COMBINED_ANALYSIS_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (combined): {cache_key[:12]}")
+            return cached_result
+        
+        # Structured JSON and full markdown share one output budget
+        response = await generate_content_async(
+            [
+                DOCUMENT_COMBINED_ANALYSIS_PROMPT,
+                prepared.as_part()
+            ],
+            max_output_tokens=16384,
+            extractor="combined",
+            response_schema=DOCUMENT_COMBINED_SCHEMA
+        )
+        
+        response_text = response.text
+        
+        try:
+            # The parser tracks strings, so ``` inside the markdown value is kept
+            result, complete = parse_json_response(response_text, "combined", DOCUMENT_COMBINED_SCHEMA)
+            structured = result.get("structured") if isinstance(result, dict) else None
+            if not isinstance(structured, dict):
+                raise ValueError("Response is missing the 'structured' object")
+            
+            markdown_text = result.get("markdown") or ""
+            combined_result = {
+                "structured": validate_json_schema(structured),
+                "markdown": clean_markdown_response(str(markdown_text))
+            }
+            if complete:
+                await store_result(cache_key, "combined", result_cache_model_name(), combined_result)
+            return combined_result
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"JSON Parse Error (combined): {e}")
+            print(f"Raw response: {response_text[:500]}")
+            
+            return {
+                "structured": {
+                    "error": f"Failed to parse JSON response: {str(e)}",
+                    "raw_response": response_text[:500],
+                    "document_type": "Parse Error",
+                    "confidence": 0.0,
+                    "title": None,
+                    "summary": "Failed to parse AI response",
+                    "people": [],
+                    "organizations": [],
+                    "locations": [],
+                    "dates": [],
+                    "numbers": [],
+                    "signature_detected": False
+                },
+                "markdown": "*Error extracting content from this page*"
+            }
+            
+    except Exception as e:
+        print(f"Error in analyze_document_combined: {e}")
+        return {
+            "structured": {
+                "error": str(e),
+                "document_type": "Error",
+                "confidence": 0.0,
+                "title": None,
+                "summary": f"Analysis failed: {str(e)}",
+                "people": [],
+                "organizations": [],
+                "locations": [],
+                "dates": [],
+                "numbers": [],
+                "signature_detected": False
+            },
+            "markdown": f"# Error\n\nFailed to extract text: {str(e)}"
+        }
+
+
 def get_image_path_from_url(image_url: str) -> Optional[str]:
     """
     Convert image URL to local file path
@@ -881,6 +1151,59 @@ def get_image_path_from_url(image_url: str) -> Optional[str]:
     return image_url
 
 
+async def classify_document_image(image_path: str) -> Dict[str, Any]:
+    """
+    Classify a document image as person, vehicle or general with a short
+    Gemini call (used to route pages to the right extractor)
+    
+    Args:
+        image_path: Path to a small (downscaled) page image
+        
+    Returns:
+        Dictionary with category, document_type and confidence, plus
+        "error" when the call or parsing failed
+    """
+    try:
+        prepared = await prepare_image_async(image_path)
+        
+        cache_key = make_cache_key(prepared.digest, DOCUMENT_CLASSIFICATION_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (classify): {cache_key[:12]}")
+            return cached_result
+        
+        response = await generate_content_async(
+            [
+                DOCUMENT_CLASSIFICATION_PROMPT,
+                prepared.as_part()
+            ],
+            max_output_tokens=128,
+            extractor="classify",
+            response_schema=DOCUMENT_CLASSIFICATION_SCHEMA
+        )
+        
+        response_text = response.text
+        try:
+            data, complete = parse_json_response(response_text, "classify", DOCUMENT_CLASSIFICATION_SCHEMA)
+        except json.JSONDecodeError as e:
+            print(f"JSON Parse Error (classify): {e}")
+            return {"error": f"Failed to parse JSON response: {str(e)}", "category": "general", "confidence": 0.0}
+        
+        category = str(data.get("category", "")).strip().lower()
+        result = {
+            "category": category if category in ("person", "vehicle", "general") else "general",
+            "document_type": data.get("document_type"),
+            "confidence": min(1.0, max(0.0, float(data.get("confidence", 0.0) or 0.0)))
+        }
+        if complete:
+            await store_result(cache_key, "classify", result_cache_model_name(), result)
+        return result
+        
+    except Exception as e:
+        print(f"Error in classify_document_image: {e}")
+        return {"error": str(e), "category": "general", "confidence": 0.0}
+
+
 async def extract_person_info(image_path: str) -> Dict[str, Any]:
     """
     Extract personal information from CCCD/ID/Driver License using Gemini
@@ -910,86 +1233,51 @@ async def extract_person_info(image_path: str) -> Dict[str, Any]:
                 "documentType": None
             }
         
-        # Open image with PIL
-        image = Image.open(image_path)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Optimize image
-        file_size = os.path.getsize(image_path) / (1024 * 1024)
-        max_dimension = max(image.size)
+        # Shared preprocessing: decoded and encoded once per page, reused by every extractor
+        prepared = await prepare_image_async(image_path)
         
-        if file_size > 2 or max_dimension > 4000:
-            max_size = 3000
-            if max_dimension > max_size:
-                ratio = max_size / max_dimension
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"   📐 Optimized image to {new_size}")
+        # Return cached result for identical image + prompt + model
+        cache_key = make_cache_key(prepared.digest, PERSON_INFO_EXTRACTION_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (person): {cache_key[:12]}")
+            return cached_result
         
-        # Convert to bytes for Gemini
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
-        
-        # Call Gemini API with retry logic for quota errors
-        max_retries = 3
-        retry_delay = 2  # seconds
-        response = None
-        
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(
-                    [
-                        PERSON_INFO_EXTRACTION_PROMPT,
-                        Image.open(img_byte_arr)
-                    ],
-                    generation_config=genai.GenerationConfig(
-                        temperature=0.1,
-                        top_p=0.95,
-                        top_k=40,
-                        max_output_tokens=2048
-                    )
-                )
-                break  # Success, exit retry loop
-                
-            except Exception as api_error:
-                error_msg = str(api_error)
-                
-                # Check if it's a quota error
-                if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
-                    print(f"   ⚠️  Quota exceeded (attempt {attempt + 1}/{max_retries})")
-                    
-                    if attempt < max_retries - 1:
-                        import time
-                        wait_time = retry_delay * (attempt + 1)
-                        print(f"   ⏳ Waiting {wait_time}s before retry...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        # All retries exhausted, return fallback data
-                        print(f"   ⚠️  API quota exhausted. Returning empty data for manual entry...")
-                        return {
-                            "fullName": None,
-                            "dateOfBirth": None,
-                            "gender": None,
-                            "idNumber": None,
-                            "address": None,
-                            "phone": None,
-                            "email": None,
-                            "placeOfOrigin": None,
-                            "nationality": "Việt Nam",
-                            "issueDate": None,
-                            "expiryDate": None,
-                            "documentType": "CCCD",
-                            "extractionStatus": "quota_exceeded",
-                            "message": "⚠️ API quota đã hết (50 requests/ngày). Vui lòng nhập thông tin thủ công hoặc thử lại sau 24h."
-                        }
-                else:
-                    # Other API errors, re-raise
-                    raise api_error
+        # Call Gemini API; quota errors re-queue on the rate limiter
+        try:
+            response = await generate_content_async(
+                [
+                    PERSON_INFO_EXTRACTION_PROMPT,
+                    prepared.as_part()
+                ],
+                max_output_tokens=2048,
+                max_retries=3,
+                extractor="person",
+                response_schema=PERSON_INFO_SCHEMA
+            )
+        except Exception as api_error:
+            if not is_quota_error(api_error):
+                # Other API errors, re-raise
+                raise
+            
+            # All retries exhausted, return fallback data
+            print(f"   ⚠️  API quota exhausted. Returning empty data for manual entry...")
+            return {
+                "fullName": None,
+                "dateOfBirth": None,
+                "gender": None,
+                "idNumber": None,
+                "address": None,
+                "phone": None,
+                "email": None,
+                "placeOfOrigin": None,
+                "nationality": "Việt Nam",
+                "issueDate": None,
+                "expiryDate": None,
+                "documentType": "CCCD",
+                "extractionStatus": "quota_exceeded",
+                "message": "⚠️ API quota đã hết (50 requests/ngày). Vui lòng nhập thông tin thủ công hoặc thử lại sau 24h."
+            }
         
         # If response is None after retries, return error
         if response is None:
@@ -1013,13 +1301,12 @@ async def extract_person_info(image_path: str) -> Dict[str, Any]:
         # Get response
         response_text = response.text
         
-        # Clean JSON
-        cleaned_json = clean_json_response(response_text)
-        
         # Parse JSON
         try:
-            result = json.loads(cleaned_json)
+            result, complete = parse_json_response(response_text, "person", PERSON_INFO_SCHEMA)
             print(f"✅ Extracted person info: {result.get('fullName', 'N/A')}")
+            if complete:
+                await store_result(cache_key, "person", result_cache_model_name(), result)
             return result
         except json.JSONDecodeError as e:
             print(f"❌ JSON Parse Error: {e}")
@@ -1093,56 +1380,36 @@ async def extract_vehicle_info(image_path: str) -> Dict[str, Any]:
                 "documentType": "Vehicle Registration"
             }
         
-        # Open image with PIL
-        image = Image.open(image_path)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Shared preprocessing: decoded and encoded once per page, reused by every extractor
+        prepared = await prepare_image_async(image_path)
         
-        # Optimize image
-        file_size = os.path.getsize(image_path) / (1024 * 1024)
-        max_dimension = max(image.size)
-        
-        if file_size > 2 or max_dimension > 4000:
-            max_size = 3000
-            if max_dimension > max_size:
-                ratio = max_size / max_dimension
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"   📐 Optimized image to {new_size}")
-        
-        # Convert to bytes for Gemini
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
+        # Return cached result for identical image + prompt + model
+        cache_key = make_cache_key(prepared.digest, VEHICLE_INFO_EXTRACTION_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (vehicle): {cache_key[:12]}")
+            return cached_result
         
         # Call Gemini API
-        response = model.generate_content(
+        response = await generate_content_async(
             [
                 VEHICLE_INFO_EXTRACTION_PROMPT,
-                Image.open(img_byte_arr)
+                prepared.as_part()
             ],
-            generation_config=genai.GenerationConfig(
-                temperature=0.1,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=2048
-            )
+            max_output_tokens=2048,
+            extractor="vehicle",
+            response_schema=VEHICLE_INFO_SCHEMA
         )
         
         # Extract JSON from response
-        response_text = response.text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith('```'):
-            response_text = re.sub(r'^```(?:json)?\n', '', response_text)
-            response_text = re.sub(r'\n```$', '', response_text)
+        response_text = response.text
         
         # Parse JSON
         try:
-            vehicle_data = json.loads(response_text)
+            vehicle_data, complete = parse_json_response(response_text, "vehicle", VEHICLE_INFO_SCHEMA)
             print(f"   ✅ Vehicle info extracted: {vehicle_data.get('licensePlate', 'N/A')}")
+            if complete:
+                await store_result(cache_key, "vehicle", result_cache_model_name(), vehicle_data)
             return vehicle_data
         except json.JSONDecodeError as json_err:
             print(f"   ⚠️  JSON parse error: {json_err}")
@@ -1232,57 +1499,39 @@ async def recommend_insurance_by_address(image_path: str) -> Dict[str, Any]:
                 "recommended_packages": []
             }
         
-        # Open image with PIL
-        image = Image.open(image_path)
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Optimize image
-        file_size = os.path.getsize(image_path) / (1024 * 1024)
-        max_dimension = max(image.size)
+        # Shared preprocessing: decoded and encoded once per page, reused by every extractor
+        prepared = await prepare_image_async(image_path)
         
-        if file_size > 2 or max_dimension > 4000:
-            max_size = 3000
-            if max_dimension > max_size:
-                ratio = max_size / max_dimension
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                print(f"   📐 Optimized image to {new_size}")
-        
-        # Convert to bytes for Gemini
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
+        # Return cached result for identical image + prompt + model
+        cache_key = make_cache_key(prepared.digest, INSURANCE_RECOMMENDATION_PROMPT, result_cache_model_name())
+        cached_result = get_cached_result(cache_key)
+        if cached_result is not None:
+            print(f"   ⚡ AI cache hit (recommendation): {cache_key[:12]}")
+            return cached_result
         
         # Call Gemini API
-        response = model.generate_content(
+        response = await generate_content_async(
             [
                 INSURANCE_RECOMMENDATION_PROMPT,
-                Image.open(img_byte_arr)
+                prepared.as_part()
             ],
-            generation_config=genai.GenerationConfig(
-                temperature=0.1,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=2048
-            )
+            max_output_tokens=2048,
+            extractor="recommendation",
+            response_schema=INSURANCE_RECOMMENDATION_SCHEMA
         )
         
         # Get response
         response_text = response.text
         
-        # Clean JSON
-        cleaned_json = clean_json_response(response_text)
-        
         # Parse JSON
         try:
-            result = json.loads(cleaned_json)
+            result, complete = parse_json_response(response_text, "recommendation", INSURANCE_RECOMMENDATION_SCHEMA)
             place_region = result.get('place_of_origin', {}).get('region', 'Unknown')
             addr_region = result.get('address', {}).get('region', 'Unknown')
             print(f"✅ Quê quán: {place_region}, Address: {addr_region}")
             print(f"   📦 {len(result.get('recommended_packages', []))} packages recommended")
+            if complete:
+                await store_result(cache_key, "recommendation", result_cache_model_name(), result)
             return result
         except json.JSONDecodeError as e:
             print(f"❌ JSON Parse Error: {e}")
@@ -2,18 +2,13 @@
 Chat Service for Insurance Advisor AI
 """
 
-from google import genai
-from google.genai import types
 from typing import Dict, Any, Optional, List
-from decouple import config
 
-# Use API key from environment variable
-GEMINI_API_KEY = config('GEMINI_API_KEY')
+from app.model_backend import get_model_backend
+from app.rate_limiter import PRIORITY_INTERACTIVE, RateLimitExceeded, get_rate_limiter, rate_limited, retry_after_seconds
 
-# ⚡ OPTIMIZED: Initialize client once at module import for fastest performance
-print("⚡ Initializing Gemini chat client at startup...")
-client = genai.Client(api_key=GEMINI_API_KEY)
-print("✅ Chat client ready")
+# Chat model (shares its rate limit budget with document analysis on the same model)
+CHAT_MODEL_NAME = 'gemini-2.5-flash-lite'
 
 # Insurance Chatbot Prompt
 INSURANCE_CHATBOT_PROMPT = """Bạn là AI Tư vấn viên bảo hiểm chuyên nghiệp của công ty ADE Insurance.
@@ -156,17 +151,25 @@ async def chat_with_insurance_advisor(
         if context:
             print(f"   📋 Context: Region={region}, Packages={len(recommended_packages)}")
         
-        # Call Gemini API with optimized configuration
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=full_prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.7,
-                top_p=0.9,
-                top_k=40,
-                max_output_tokens=1024
-            )
-        )
+        # Call Gemini through the model backend's async API so the event loop stays free;
+        # chat is admitted ahead of document analysis by the rate limiter
+        try:
+            async with rate_limited(CHAT_MODEL_NAME, full_prompt, 1024, priority=PRIORITY_INTERACTIVE) as call:
+                response = call["response"] = await get_model_backend().generate(
+                    CHAT_MODEL_NAME,
+                    full_prompt,
+                    max_output_tokens=1024,
+                    temperature=0.7,
+                    top_p=0.9,
+                    top_k=40,
+                    extractor="chat"
+                )
+        except RateLimitExceeded:
+            raise
+        except Exception as api_error:
+            if "429" in str(api_error) or "RESOURCE_EXHAUSTED" in str(api_error):
+                get_rate_limiter(CHAT_MODEL_NAME).report_quota_error(retry_after_seconds(api_error))
+            raise
         
         ai_reply = response.text.strip()
         
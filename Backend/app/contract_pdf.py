@@ -0,0 +1,512 @@
+"""
+Insurance contract PDF
+Builds the downloadable contract with ReportLab. The builder takes a plain
+ContractDetails snapshot instead of the ORM row so it can run on the CPU
+pool in a worker process.
+"""
+
+import os
+from datetime import datetime
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch, cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
+# InsurancePurchase columns printed on the contract
+_CONTRACT_FIELDS = (
+    "id", "policy_number", "insurance_company",
+    "package_name", "package_type", "coverage_amount", "premium_amount", "payment_frequency",
+    "start_date", "end_date",
+    "customer_name", "customer_phone", "customer_email", "customer_address", "customer_id_number",
+    "beneficiary_name", "beneficiary_relationship",
+    "vehicle_type", "license_plate",
+    "payment_method", "payment_status", "transaction_id",
+)
+
+
+class ContractDetails:
+    """
+    Picklable copy of the purchase fields used in the contract
+    """
+
+    def __init__(self, **fields):
+        for name in _CONTRACT_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_purchase(cls, purchase) -> "ContractDetails":
+        """Snapshot an InsurancePurchase row"""
+        return cls(**{name: getattr(purchase, name, None) for name in _CONTRACT_FIELDS})
+
+
+def format_date_vietnamese(date_str):
+    """
+    Format date to Vietnamese format DD/MM/YYYY
+    """
+    if not date_str:
+        return 'Chưa xác định'
+    
+    try:
+        # If already in DD/MM/YYYY format
+        if '/' in date_str and len(date_str.split('/')) == 3:
+            return date_str
+        
+        # If in YYYY-MM-DD format
+        if '-' in date_str and len(date_str.split('-')) == 3:
+            parts = date_str.split('-')
+            return f"{parts[2]}/{parts[1]}/{parts[0]}"
+        
+        return date_str
+    except:
+        return date_str
+
+
+def format_currency_for_pdf(amount):
+    """
+    Format currency for PDF display
+    """
+    if not amount:
+        return 'Chưa xác định'
+    
+    try:
+        # If it's already a formatted string with currency, return as-is
+        if isinstance(amount, str):
+            if 'VNĐ' in amount or 'VND' in amount:
+                return amount
+            
+            # Try to extract number from string
+            import re
+            numbers = re.findall(r'\d+\.?\d*', amount.replace('.', '').replace(',', ''))
+            if numbers:
+                amount = float(numbers[0])
+            else:
+                return amount  # Return original if can't parse
+        
+        # Format with Vietnamese locale (dot as thousand separator)
+        formatted = "{:,.0f}".format(float(amount)).replace(',', '.')
+        return f"{formatted} VNĐ"
+    except:
+        return str(amount)
+
+
+
+def safe_text(text, default='N/A'):
+    """Safely handle None/empty text for PDF - allows HTML tags"""
+    if text is None or text == '':
+        return default
+    return str(text)
+
+
+def build_contract_pdf(purchase: ContractDetails) -> bytes:
+    """
+    Build the contract PDF (blocking, run it on the CPU pool)
+
+    Args:
+        purchase: Contract fields from ContractDetails.from_purchase
+
+    Returns:
+        PDF file content
+    """
+    # Create PDF in memory
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, 
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+    story = []
+    styles = getSampleStyleSheet()
+
+    # Try to register Vietnamese font (fallback to default if not available)
+    default_font = 'Helvetica'
+    vietnamese_font_found = False
+    try:
+        # Try multiple Vietnamese-compatible fonts
+        font_paths = [
+            ("C:/Windows/Fonts/arial.ttf", 'ArialVN'),
+            ("C:/Windows/Fonts/arialuni.ttf", 'ArialUniVN'),
+            ("C:/Windows/Fonts/times.ttf", 'TimesVN'),
+            ("C:/Windows/Fonts/verdana.ttf", 'VerdanaVN'),
+        ]
+
+        for font_path, font_name in font_paths:
+            if os.path.exists(font_path):
+                try:
+                    pdfmetrics.registerFont(TTFont(font_name, font_path, 'UTF-8'))
+                    default_font = font_name
+                    vietnamese_font_found = True
+                    print(f"✅ Registered Vietnamese font: {font_name}")
+                    break
+                except Exception as font_error:
+                    print(f"⚠️ Failed to register {font_name}: {font_error}")
+                    continue
+    except Exception as e:
+        print(f"⚠️ Font registration error: {e}")
+
+    if not vietnamese_font_found:
+        print("⚠️ No Vietnamese font found, using ASCII-safe fallback")
+        default_font = 'Helvetica'
+
+    # Create professional custom styles
+    header_style = ParagraphStyle(
+        'Header',
+        parent=styles['Normal'],
+        fontName=default_font,
+        fontSize=26,
+        textColor=colors.HexColor('#1E40AF'),
+        spaceAfter=10,
+        alignment=TA_CENTER,
+        leading=32
+    )
+
+    subtitle_style = ParagraphStyle(
+        'Subtitle',
+        parent=styles['Normal'],
+        fontName=default_font,
+        fontSize=16,
+        textColor=colors.HexColor('#DC2626'),
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        leading=20
+    )
+
+    company_style = ParagraphStyle(
+        'Company',
+        parent=styles['Normal'],
+        fontName=default_font,
+        fontSize=18,
+        textColor=colors.HexColor('#059669'),
+        spaceAfter=8,
+        alignment=TA_CENTER,
+        leading=22
+    )
+
+    section_heading_style = ParagraphStyle(
+        'SectionHeading',
+        parent=styles['Normal'],
+        fontName=default_font,
+        fontSize=14,
+        textColor=colors.HexColor('#1F2937'),
+        spaceAfter=15,
+        spaceBefore=25,
+        alignment=TA_LEFT,
+        backColor=colors.HexColor('#F3F4F6'),
+        leading=18,
+        borderPadding=8
+    )
+
+    body_style = ParagraphStyle(
+        'Body',
+        parent=styles['Normal'],
+        fontName=default_font,
+        fontSize=11,
+        textColor=colors.black,
+        spaceAfter=6,
+        alignment=TA_LEFT,
+        leading=14
+    )
+
+    # === HEADER SECTION ===
+    story.append(Paragraph(safe_text("HỢP ĐỒNG BẢO HIỂM"), header_style))
+    story.append(Paragraph(safe_text(f"Số hợp đồng: BH{purchase.policy_number or str(purchase.id).zfill(8)}"), subtitle_style))
+
+    # Company header with border
+    story.append(Spacer(1, 0.3*inch))
+    story.append(Paragraph(safe_text("CÔNG TY BẢO HIỂM VAM"), company_style))
+
+    # Company details
+    company_info = [
+        f"<b>Công ty:</b> {safe_text(purchase.insurance_company or 'VAM Insurance')}",
+        f"<b>Địa chỉ:</b> {safe_text('TP. Hồ Chí Minh, Việt Nam')}",
+        "<b>Hotline:</b> 1900 xxxx",
+        f"<b>Ngày tạo hợp đồng:</b> {datetime.now().strftime('%d/%m/%Y')}"
+    ]
+
+    for info in company_info:
+        story.append(Paragraph(info, body_style))
+
+    story.append(Spacer(1, 0.4*inch))
+
+    # === PACKAGE INFORMATION SECTION ===
+    story.append(Paragraph(safe_text("I. THÔNG TIN GÓI BẢO HIỂM"), section_heading_style))
+
+    # Create separate styles for different types of information
+    label_style = ParagraphStyle(
+        'Label',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=11,
+        textColor=colors.black,
+        leftIndent=10
+    )
+
+    value_style = ParagraphStyle(
+        'Value',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=11,
+        textColor=colors.black,
+        leftIndent=10
+    )
+
+    coverage_style = ParagraphStyle(
+        'Coverage',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=11,
+        textColor=colors.HexColor('#059669'),
+        leftIndent=10
+    )
+
+    premium_style = ParagraphStyle(
+        'Premium',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=11,
+        textColor=colors.HexColor('#DC2626'),
+        leftIndent=10
+    )
+
+    # Format coverage amount properly
+    coverage_display = purchase.coverage_amount or '300.000.000 VNĐ/người/năm'
+    if not any(x in coverage_display for x in ['/', 'người', 'năm']):
+        coverage_display += '/người/năm'
+
+    # Format premium amount
+    premium_display = format_currency_for_pdf(purchase.premium_amount)
+
+    package_data = [
+        [Paragraph(safe_text('<b>Tên gói bảo hiểm</b>'), label_style), Paragraph(safe_text(purchase.package_name or 'N/A'), value_style)],
+        [Paragraph(safe_text('<b>Loại bảo hiểm</b>'), label_style), Paragraph(safe_text(purchase.package_type or 'N/A'), value_style)],
+        [Paragraph(safe_text('<b>Số tiền bảo hiểm<br/>(Mức bảo hiểm tối đa)</b>'), label_style), Paragraph(safe_text(f'<b>{coverage_display}</b>'), coverage_style)],
+        [Paragraph(safe_text('<b>Phí bảo hiểm<br/>(Số tiền phải trả)</b>'), label_style), Paragraph(safe_text(f'<b>{premium_display}</b>'), premium_style)],
+        [Paragraph(safe_text('<b>Tần suất thanh toán</b>'), label_style), Paragraph(safe_text(purchase.payment_frequency or 'Hàng năm'), value_style)],
+        [Paragraph(safe_text('<b>Ngày bắt đầu</b>'), label_style), Paragraph(safe_text(format_date_vietnamese(purchase.start_date)), value_style)],
+        [Paragraph(safe_text('<b>Ngày kết thúc</b>'), label_style), Paragraph(safe_text(format_date_vietnamese(purchase.end_date)), value_style)],
+    ]
+
+    package_table = Table(package_data, colWidths=[5*cm, 10*cm])
+    package_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#EBF8FF')),
+        ('BACKGROUND', (1, 0), (1, -1), colors.white),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), default_font),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#F8FAFC'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    story.append(package_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    # === CUSTOMER INFORMATION SECTION ===
+    story.append(Paragraph(safe_text("II. THÔNG TIN KHÁCH HÀNG"), section_heading_style))
+
+    customer_data = [
+        [Paragraph(safe_text('<b>Họ và tên</b>'), label_style), Paragraph(safe_text(purchase.customer_name or 'N/A'), value_style)],
+        [Paragraph(safe_text('<b>Số điện thoại</b>'), label_style), Paragraph(safe_text(purchase.customer_phone or 'N/A'), value_style)],
+        [Paragraph(safe_text('<b>Email</b>'), label_style), Paragraph(safe_text(purchase.customer_email or 'Chưa cung cấp'), value_style)],
+        [Paragraph(safe_text('<b>Địa chỉ</b>'), label_style), Paragraph(safe_text(getattr(purchase, 'customer_address', None) or 'Chưa cung cấp'), value_style)],
+        [Paragraph(safe_text('<b>Số CMND/CCCD</b>'), label_style), Paragraph(safe_text(getattr(purchase, 'customer_id_number', None) or 'Chưa cung cấp'), value_style)],
+    ]
+
+    # Add beneficiary info if available
+    beneficiary_name = getattr(purchase, 'beneficiary_name', None)
+    if beneficiary_name:
+        customer_data.extend([
+            [Paragraph(safe_text('<b>Người thụ hưởng</b>'), label_style), Paragraph(safe_text(beneficiary_name), value_style)],
+            [Paragraph(safe_text('<b>Mối quan hệ</b>'), label_style), Paragraph(safe_text(getattr(purchase, 'beneficiary_relationship', None) or 'N/A'), value_style)],
+        ])
+
+    customer_table = Table(customer_data, colWidths=[5*cm, 10*cm])
+    customer_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#FEF3F2')),
+        ('BACKGROUND', (1, 0), (1, -1), colors.white),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), default_font),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#FFFBFB'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    story.append(customer_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    # === VEHICLE INFORMATION (if applicable) ===
+    if purchase.vehicle_type:
+        story.append(Paragraph("III. THÔNG TIN PHƯƠNG TIỆN", section_heading_style))
+
+        vehicle_data = [
+            [Paragraph('<b>Loại phương tiện</b>', label_style), Paragraph(purchase.vehicle_type or 'N/A', value_style)],
+            [Paragraph('<b>Biển số đăng ký</b>', label_style), Paragraph(purchase.license_plate or 'Chưa cung cấp', value_style)],
+        ]
+
+        vehicle_table = Table(vehicle_data, colWidths=[5*cm, 10*cm])
+        vehicle_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F0F9FF')),
+            ('BACKGROUND', (1, 0), (1, -1), colors.white),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), default_font),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#F8FBFF'), colors.white]),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 10),
+        ]))
+        story.append(vehicle_table)
+        story.append(Spacer(1, 0.3*inch))
+
+    # === PAYMENT INFORMATION SECTION ===
+    next_section = "IV." if purchase.vehicle_type else "III."
+    story.append(Paragraph(f"{next_section} THÔNG TIN THANH TOÁN", section_heading_style))
+
+    payment_status_color = colors.HexColor("#059669") if purchase.payment_status == "PAID" else colors.HexColor("#DC2626") if purchase.payment_status == "FAILED" else colors.HexColor("#D97706")
+
+    payment_status_style = ParagraphStyle(
+        'PaymentStatus',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=11,
+        textColor=payment_status_color,
+        leftIndent=10
+    )
+
+    payment_data = [
+        [Paragraph('<b>Phương thức thanh toán</b>', label_style), Paragraph(purchase.payment_method or 'Chưa xác định', value_style)],
+        [Paragraph('<b>Trạng thái thanh toán</b>', label_style), Paragraph(f'<b>{purchase.payment_status or "PENDING"}</b>', payment_status_style)],
+        [Paragraph('<b>Mã giao dịch</b>', label_style), Paragraph(getattr(purchase, 'transaction_id', None) or f'TX{purchase.id}{datetime.now().strftime("%Y%m%d")}', value_style)],
+    ]
+
+    payment_table = Table(payment_data, colWidths=[5*cm, 10*cm])
+    payment_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F0FDF4')),
+        ('BACKGROUND', (1, 0), (1, -1), colors.white),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), default_font),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#F7FEF7'), colors.white]),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ]))
+    story.append(payment_table)
+    story.append(Spacer(1, 0.5*inch))
+
+    # === TERMS AND CONDITIONS ===
+    terms_section = "V." if purchase.vehicle_type else "IV."
+    story.append(Paragraph(f"{terms_section} ĐIỀU KHOẢN VÀ ĐIỀU KIỆN", section_heading_style))
+
+    terms_text = f"""
+    <b>GIẢI THÍCH CÁC KHOẢN TIỀN:</b><br/>
+    • <b>Số tiền bảo hiểm ({coverage_display}):</b> Đây là số tiền tối đa mà Công ty bảo hiểm sẽ chi trả khi xảy ra rủi ro được bảo hiểm.<br/>
+    • <b>Phí bảo hiểm ({premium_display}):</b> Đây là số tiền Bên mua bảo hiểm phải thanh toán để duy trì hợp đồng bảo hiểm.<br/><br/>
+
+    <b>ĐIỀU KHOẢN VÀ ĐIỀU KIỆN:</b><br/>
+    1. Hợp đồng này có hiệu lực kể từ ngày ký và thanh toán đầy đủ phí bảo hiểm.<br/>
+    2. Bên mua bảo hiểm có trách nhiệm cung cấp thông tin chính xác và đầy đủ.<br/>
+    3. Công ty bảo hiểm cam kết bồi thường theo đúng điều khoản đã thỏa thuận.<br/>
+    4. Mọi tranh chấp sẽ được giải quyết theo quy định của pháp luật Việt Nam.<br/>
+    5. Hợp đồng này được lập thành 02 bản có giá trị pháp lý như nhau.
+    """
+
+    story.append(Paragraph(terms_text, body_style))
+    story.append(Spacer(1, 0.5*inch))
+
+    # === SIGNATURE SECTION ===
+    story.append(Spacer(1, 0.3*inch))
+
+    signature_header = Paragraph(
+        f"<b>Ngày ký: {datetime.now().strftime('%d tháng %m năm %Y')}</b>",
+        ParagraphStyle('SignatureHeader', parent=body_style, alignment=TA_CENTER, fontSize=12)
+    )
+    story.append(signature_header)
+    story.append(Spacer(1, 0.2*inch))
+
+    signature_style = ParagraphStyle(
+        'Signature',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=11,
+        alignment=TA_CENTER
+    )
+
+    signature_small_style = ParagraphStyle(
+        'SignatureSmall',
+        parent=body_style,
+        fontName=default_font,
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#6B7280')
+    )
+
+    signature_data = [
+        [Paragraph('<b>BÊN MUA BẢO HIỂM</b>', signature_style), Paragraph('<b>ĐẠI DIỆN CÔNG TY</b>', signature_style)],
+        [Paragraph('', signature_style), Paragraph('', signature_style)],
+        [Paragraph('', signature_style), Paragraph('', signature_style)],
+        [Paragraph('', signature_style), Paragraph('', signature_style)],
+        [Paragraph(f'<b>{purchase.customer_name}</b>', signature_style), Paragraph('<b>Giám đốc</b>', signature_style)],
+        [Paragraph('<i>(Ký và ghi rõ họ tên)</i>', signature_small_style), Paragraph('<i>(Ký tên và đóng dấu)</i>', signature_small_style)],
+    ]
+
+    signature_table = Table(signature_data, colWidths=[7.5*cm, 7.5*cm])
+    signature_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), default_font),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('FONTSIZE', (0, 5), (-1, 5), 9),
+        ('BOTTOMPADDING', (0, 1), (-1, 3), 15),
+        ('TOPPADDING', (0, 4), (-1, 4), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    story.append(signature_table)
+
+    # === FOOTER ===
+    story.append(Spacer(1, 0.5*inch))
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=body_style,
+        fontSize=10,
+        textColor=colors.HexColor('#6B7280'),
+        alignment=TA_CENTER,
+        leading=12
+    )
+
+    footer_text = f"""
+    <b>HỢP ĐỒNG BẢO HIỂM - SỐ: BH{purchase.policy_number or str(purchase.id).zfill(8)}</b><br/>
+    Được tạo tự động bởi hệ thống VAM Insurance vào ngày {datetime.now().strftime('%d/%m/%Y lúc %H:%M')}<br/>
+    Để biết thêm thông tin, vui lòng liên hệ hotline: 1900 xxxx - website: www.vaminsurance.vn
+    """
+
+    story.append(Paragraph(footer_text, footer_style))
+
+    # Build PDF
+    doc.build(story)
+
+    return buffer.getvalue()
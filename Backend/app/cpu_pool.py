@@ -0,0 +1,68 @@
+"""
+Shared worker pool for CPU-bound stages
+PDF rendering, image resizing / encoding, DOCX previews and contract PDFs
+run in separate processes, so one large scan never blocks the event loop
+(or the GIL) for every other request.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from decouple import config
+
+# Worker processes for CPU-bound work; 0 runs it on threads in this process
+CPU_POOL_WORKERS = config('CPU_POOL_WORKERS', default=max(1, min(4, (os.cpu_count() or 2) - 1)), cast=int)
+
+_cpu_executor: Optional[Executor] = None
+
+
+def get_cpu_executor() -> Executor:
+    """Get the shared CPU pool (created on first use)"""
+    global _cpu_executor
+    if _cpu_executor is None:
+        if CPU_POOL_WORKERS > 0:
+            # "spawn" on every platform: forking a process with running
+            # threads and an event loop is unsafe
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=CPU_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            print(f"⚙️  CPU pool started with {CPU_POOL_WORKERS} worker processes")
+        else:
+            _cpu_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cpu-worker")
+    return _cpu_executor
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking function on the CPU pool and await its result
+
+    fn must be a module-level function and args must be picklable
+    (plain values, no ORM objects or open files).
+
+    Args:
+        fn: Function to run
+        *args: Positional arguments for fn
+
+    Returns:
+        fn's return value; exceptions raised by fn are re-raised here
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_cpu_executor(), fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool for later calls
+        print("⚠️  CPU pool worker crashed, restarting pool")
+        shutdown_cpu_pool(wait=False)
+        raise
+
+
+def shutdown_cpu_pool(wait: bool = True) -> None:
+    """Stop the CPU pool (called on application shutdown)"""
+    global _cpu_executor
+    if _cpu_executor is not None:
+        executor, _cpu_executor = _cpu_executor, None
+        executor.shutdown(wait=wait, cancel_futures=True)
@@ -3,7 +3,7 @@ Database configuration and connection
 SQLite database for document storage
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -40,8 +40,42 @@ async def init_db():
     Initialize database tables
     """
     # Import models to register them
-    from app.models import Document, Page, Job, User, InsurancePurchase, DisasterLocation
+    from app.models import (
+        Document, Page, Job, User, InsurancePurchase, DisasterLocation, AIResultCache,
+        StoredAsset, StorageCounter
+    )
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
-    print("Database initialized successfully")
\ No newline at end of file
+    
+    # Add columns introduced after the table was first created
+    add_missing_columns()
+    print("Database initialized successfully")
+
+def add_missing_columns():
+    """
+    Add model columns that are missing from existing tables
+    create_all() only creates new tables, so older ade.db files would
+    otherwise fail on queries that touch newly added nullable columns
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"   ➕ Added column {table.name}.{column.name}")
+                
+                if column.index:
+                    connection.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})'
+                    ))
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+Document classification router
+Decides per page whether it is a personal ID (CCCD, driver license,
+passport), a vehicle document or a general document, so only the matching
+extractor runs. Local heuristics (MRZ, keywords on the page text, image
+shape) come first; a cheap call on a downscaled image is the fallback.
+"""
+
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional
+from decouple import config
+from PIL import Image
+
+from app.ai_service import classify_document_image
+
+# Ask the model when the local heuristics are not conclusive
+CLASSIFIER_MODEL_ENABLED = config('CLASSIFIER_MODEL_ENABLED', default=True, cast=bool)
+
+# Keyword matches needed before the text alone decides the category
+CLASSIFIER_MIN_KEYWORD_HITS = config('CLASSIFIER_MIN_KEYWORD_HITS', default=2, cast=int)
+
+# Categories (one extractor each)
+CATEGORY_PERSON = "person"
+CATEGORY_VEHICLE = "vehicle"
+CATEGORY_GENERAL = "general"
+
+# Keywords in normalized form (lowercase, no diacritics)
+_PERSON_KEYWORDS = (
+    "can cuoc", "chung minh nhan dan", "giay phep lai xe", "ho chieu", "passport",
+    "identity card", "citizen identity", "driver's license", "driving licence",
+    "que quan", "place of origin", "noi thuong tru", "place of residence",
+    "ngay sinh", "date of birth", "gioi tinh", "quoc tich", "nationality",
+)
+_VEHICLE_KEYWORDS = (
+    "dang ky xe", "dang ky mo to", "dang ky o to", "vehicle registration",
+    "bien so", "number plate", "so khung", "chassis", "so may", "engine number",
+    "nhan hieu", "so loai", "dung tich", "mau son", "kiem dinh",
+)
+
+# Machine readable zone line (passports, chip-based CCCD)
+_MRZ_LINE = re.compile(r'^[A-Z0-9<]{28,44}$')
+
+# Long text without ID keywords is a general document (cards carry little text)
+_GENERAL_MIN_CHARS = 1500
+
+# Width / height of ID-1 cards (CCCD, driver license, vehicle registration) is 1.586
+_CARD_ASPECT_RANGE = (1.4, 1.8)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip Vietnamese diacritics and collapse whitespace"""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    stripped = "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+    return " ".join(stripped.lower().split())
+
+
+def has_mrz(text: str) -> bool:
+    """True if the text contains a machine readable zone line"""
+    for line in text.splitlines():
+        line = line.replace(" ", "").strip()
+        if "<<" in line and _MRZ_LINE.match(line):
+            return True
+    return False
+
+
+def classify_text(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Classify a page from its text (PDF text layer, DOCX content)
+
+    Returns:
+        Classification dict, or None when the text is not conclusive
+    """
+    if not text or not text.strip():
+        return None
+
+    if has_mrz(text):
+        return {"category": CATEGORY_PERSON, "confidence": 0.95, "source": "text", "reason": "MRZ detected"}
+
+    normalized = normalize_text(text)
+    person_hits = [k for k in _PERSON_KEYWORDS if k in normalized]
+    vehicle_hits = [k for k in _VEHICLE_KEYWORDS if k in normalized]
+
+    if len(vehicle_hits) >= CLASSIFIER_MIN_KEYWORD_HITS and len(vehicle_hits) > len(person_hits):
+        return {
+            "category": CATEGORY_VEHICLE,
+            "confidence": min(0.95, 0.6 + 0.1 * len(vehicle_hits)),
+            "source": "text",
+            "reason": f"keywords: {', '.join(vehicle_hits[:5])}"
+        }
+    if len(person_hits) >= CLASSIFIER_MIN_KEYWORD_HITS and len(person_hits) > len(vehicle_hits):
+        return {
+            "category": CATEGORY_PERSON,
+            "confidence": min(0.95, 0.6 + 0.1 * len(person_hits)),
+            "source": "text",
+            "reason": f"keywords: {', '.join(person_hits[:5])}"
+        }
+    if not person_hits and not vehicle_hits and len(normalized) >= _GENERAL_MIN_CHARS:
+        return {"category": CATEGORY_GENERAL, "confidence": 0.8, "source": "text", "reason": "long text, no ID keywords"}
+
+    return None
+
+
+def classify_shape(image_path: str) -> Optional[str]:
+    """
+    Rough page shape from the image header: "card" for ID-1 sized
+    landscape images, "page" for portrait pages, None otherwise
+    """
+    try:
+        with Image.open(image_path) as image:
+            width, height = image.size
+    except Exception:
+        return None
+
+    if not width or not height:
+        return None
+    if _CARD_ASPECT_RANGE[0] <= width / height <= _CARD_ASPECT_RANGE[1]:
+        return "card"
+    if height / width >= 1.25:
+        return "page"
+    return None
+
+
+async def classify_page(
+    text: Optional[str],
+    load_image: Callable[[], Awaitable[Optional[str]]],
+    run_model: Optional[Callable[[Callable[[], Awaitable[Dict[str, Any]]]], Awaitable[Dict[str, Any]]]] = None
+) -> Dict[str, Any]:
+    """
+    Classify one page, using the cheapest signal that is conclusive
+
+    Args:
+        text: Page text when available (None for scans and photos)
+        load_image: Coroutine function returning a downscaled page image
+            path; only called when the text is not conclusive
+        run_model: Optional wrapper for the model call, e.g. PageScheduler.run
+            (the local heuristics do not take a model-call slot)
+
+    Returns:
+        Dict with category (person, vehicle, general), confidence,
+        source (text, model, shape, default) and optional document_type / reason
+    """
+    result = classify_text(text)
+    if result is not None:
+        return result
+
+    image_path = await load_image()
+    if not image_path:
+        return {"category": CATEGORY_GENERAL, "confidence": 0.0, "source": "default", "reason": "no page image"}
+
+    if CLASSIFIER_MODEL_ENABLED:
+        call = lambda: classify_document_image(image_path)
+        model_result = await (run_model(call) if run_model else call())
+        if "error" not in model_result:
+            return dict(model_result, source="model")
+        print(f"   ⚠️  Classification call failed, using image shape: {model_result['error']}")
+
+    # Model disabled or failed: card-sized photos are most often ID cards
+    shape = classify_shape(image_path)
+    if shape == "card":
+        return {"category": CATEGORY_PERSON, "confidence": 0.5, "source": "shape", "reason": "card-sized image"}
+    return {"category": CATEGORY_GENERAL, "confidence": 0.4 if shape == "page" else 0.2, "source": "shape", "reason": f"{shape or 'unknown'} shape"}
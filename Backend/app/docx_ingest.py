@@ -0,0 +1,282 @@
+"""
+DOCX ingestion
+Extracts the full text, tables and embedded images of a Word document in
+body order, converts them to markdown for analysis and lays them out on
+A4-sized preview pages, so every page of a long document is kept
+"""
+
+import os
+from typing import List, Tuple
+from decouple import config
+from PIL import Image, ImageDraw, ImageFont
+
+from docx import Document as DocxDocument
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from app.cpu_pool import run_cpu
+
+# Preview page size (A4 at 150 DPI, same as rendered PDF pages)
+DOCX_PREVIEW_WIDTH = config('DOCX_PREVIEW_WIDTH', default=1240, cast=int)
+DOCX_PREVIEW_HEIGHT = config('DOCX_PREVIEW_HEIGHT', default=1754, cast=int)
+
+# TrueType font with Vietnamese glyphs; Pillow's bundled font is the fallback
+DOCX_PREVIEW_FONT = config('DOCX_PREVIEW_FONT', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+_MARGIN = 100
+_BODY_FONT_SIZE = 22
+_LINE_SPACING = 1.4
+_MAX_IMAGE_HEIGHT = 700
+
+# Block kinds, in document order
+HEADING, PARAGRAPH, LIST_ITEM, TABLE, IMAGE = "heading", "paragraph", "list", "table", "image"
+
+
+def _load_font(size: int):
+    """TrueType font at the given size (falls back to Pillow's default font)"""
+    try:
+        return ImageFont.truetype(DOCX_PREVIEW_FONT, size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _heading_level(paragraph: Paragraph) -> int:
+    """Heading level from the paragraph style (0 for body text)"""
+    style_name = (paragraph.style.name if paragraph.style is not None else "") or ""
+    if style_name == "Title":
+        return 1
+    if style_name.startswith("Heading"):
+        level = style_name.replace("Heading", "").strip()
+        return min(int(level), 6) if level.isdigit() else 1
+    return 0
+
+
+def _is_list_item(paragraph: Paragraph) -> bool:
+    """True for bulleted / numbered paragraphs"""
+    style_name = (paragraph.style.name if paragraph.style is not None else "") or ""
+    return "List" in style_name or paragraph._p.find(qn('w:pPr') + '/' + qn('w:numPr')) is not None
+
+
+def _save_paragraph_images(paragraph: Paragraph, document, document_id: str, output_dir: str, start_index: int) -> List[str]:
+    """Write the images embedded in a paragraph and return their paths"""
+    image_paths = []
+    for blip in paragraph._p.iter(qn('a:blip')):
+        relationship_id = blip.get(qn('r:embed'))
+        image_part = document.part.related_parts.get(relationship_id) if relationship_id else None
+        if image_part is None or not hasattr(image_part, "blob"):
+            continue
+
+        ext = os.path.splitext(str(image_part.partname))[1].lower() or ".png"
+        image_path = os.path.join(output_dir, f"{document_id}_docx_image_{start_index + len(image_paths) + 1}{ext}")
+        with open(image_path, "wb") as f:
+            f.write(image_part.blob)
+        image_paths.append(image_path)
+    return image_paths
+
+
+def extract_docx_blocks(docx_path: str, document_id: str, output_dir: str = "data/images") -> List[tuple]:
+    """
+    Read every paragraph, table and embedded image of a DOCX in body order
+
+    Args:
+        docx_path: Path to the DOCX file
+        document_id: Document ID used in extracted image filenames
+        output_dir: Directory for extracted images
+
+    Returns:
+        List of blocks: (HEADING, level, text), (PARAGRAPH, text),
+        (LIST_ITEM, text), (TABLE, rows) or (IMAGE, path)
+    """
+    document = DocxDocument(docx_path)
+    blocks = []
+    image_count = 0
+
+    for element in document.element.body.iterchildren():
+        if element.tag == qn('w:p'):
+            paragraph = Paragraph(element, document)
+            text = paragraph.text.strip()
+            if text:
+                level = _heading_level(paragraph)
+                if level:
+                    blocks.append((HEADING, level, text))
+                elif _is_list_item(paragraph):
+                    blocks.append((LIST_ITEM, text))
+                else:
+                    blocks.append((PARAGRAPH, text))
+
+            for image_path in _save_paragraph_images(paragraph, document, document_id, output_dir, image_count):
+                blocks.append((IMAGE, image_path))
+                image_count += 1
+
+        elif element.tag == qn('w:tbl'):
+            table = Table(element, document)
+            rows = []
+            for row in table.rows:
+                cells = []
+                previous = None
+                for cell in row.cells:
+                    # A horizontally merged cell repeats the same <w:tc>; keep one copy
+                    if cell._tc is previous:
+                        continue
+                    previous = cell._tc
+                    cells.append(" ".join(cell.text.split()))
+                rows.append(cells)
+            if rows:
+                blocks.append((TABLE, rows))
+
+    return blocks
+
+
+def block_to_markdown(block: tuple) -> str:
+    """Markdown for one DOCX block"""
+    kind = block[0]
+    if kind == HEADING:
+        return f"{'#' * block[1]} {block[2]}"
+    if kind == LIST_ITEM:
+        return f"- {block[1]}"
+    if kind == TABLE:
+        rows = block[1]
+        width = max(len(row) for row in rows)
+        rows = [[cell.replace("|", "\\|") for cell in row] + [""] * (width - len(row)) for row in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+        lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+        return "\n".join(lines)
+    if kind == IMAGE:
+        filename = os.path.basename(block[1])
+        return f"![{filename}](/data/images/{filename})"
+    return block[1]
+
+
+def _wrap_text(draw: ImageDraw.ImageDraw, text: str, font, max_width: int) -> List[str]:
+    """Greedy word wrap by rendered width"""
+    lines = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+def render_docx_pages(
+    blocks: List[tuple],
+    document_id: str,
+    output_dir: str = "data/images"
+) -> List[Tuple[str, str]]:
+    """
+    Lay the blocks out on A4 preview pages (blocking, run it on the CPU pool)
+
+    Args:
+        blocks: Blocks from extract_docx_blocks
+        document_id: Document ID used in the preview filenames
+        output_dir: Directory for preview images
+
+    Returns:
+        List of (image_url, page_markdown), one per preview page
+    """
+    width, height = DOCX_PREVIEW_WIDTH, DOCX_PREVIEW_HEIGHT
+    content_width = width - 2 * _MARGIN
+    body_font = _load_font(_BODY_FONT_SIZE)
+
+    pages = []
+    state = {"image": None, "draw": None, "y": 0, "markdown": []}
+
+    def new_page():
+        state["image"] = Image.new('RGB', (width, height), color='white')
+        state["draw"] = ImageDraw.Draw(state["image"])
+        state["y"] = _MARGIN
+        state["markdown"] = []
+
+    def flush_page():
+        if state["image"] is None:
+            return
+        page_number = len(pages) + 1
+        image_filename = f"{document_id}_page_{page_number}.png"
+        state["image"].save(os.path.join(output_dir, image_filename), "PNG")
+        pages.append((f"/data/images/{image_filename}", "\n\n".join(state["markdown"])))
+        state["image"] = None
+
+    def ensure_space(needed: int):
+        if state["image"] is None or state["y"] + needed > height - _MARGIN:
+            flush_page()
+            new_page()
+
+    def draw_lines(lines: List[str], font, indent: int = 0):
+        line_height = int(font.size * _LINE_SPACING)
+        for line in lines:
+            ensure_space(line_height)
+            state["draw"].text((_MARGIN + indent, state["y"]), line, fill='black', font=font)
+            state["y"] += line_height
+
+    new_page()
+    for block in blocks:
+        kind = block[0]
+
+        if kind == IMAGE:
+            try:
+                with Image.open(block[1]) as embedded:
+                    embedded = embedded.convert('RGB')
+                    embedded.thumbnail((content_width, _MAX_IMAGE_HEIGHT))
+                    ensure_space(embedded.height + 20)
+                    state["image"].paste(embedded, (_MARGIN, state["y"]))
+                    state["y"] += embedded.height + 20
+            except Exception as e:
+                print(f"   ⚠️  Skipping embedded image {block[1]}: {e}")
+                continue
+        elif kind == TABLE:
+            row_height = int(_BODY_FONT_SIZE * _LINE_SPACING)
+            for row in block[1]:
+                cell_width = content_width // max(1, len(row))
+                cell_lines = [_wrap_text(state["draw"], cell, body_font, cell_width - 12) or [""] for cell in row]
+                needed = row_height * max(len(lines) for lines in cell_lines) + 8
+                ensure_space(needed)
+                top = state["y"]
+                for col, lines in enumerate(cell_lines):
+                    x = _MARGIN + col * cell_width
+                    state["draw"].rectangle([x, top, x + cell_width, top + needed], outline='gray')
+                    for i, line in enumerate(lines):
+                        state["draw"].text((x + 6, top + 4 + i * row_height), line, fill='black', font=body_font)
+                state["y"] = top + needed
+            state["y"] += row_height // 2
+        elif kind == HEADING:
+            font = _load_font(_BODY_FONT_SIZE + max(2, 14 - 2 * block[1]))
+            state["y"] += _BODY_FONT_SIZE // 2
+            draw_lines(_wrap_text(state["draw"], block[2], font, content_width), font)
+        elif kind == LIST_ITEM:
+            draw_lines(_wrap_text(state["draw"], f"• {block[1]}", body_font, content_width - 30), body_font, indent=30)
+        else:
+            draw_lines(_wrap_text(state["draw"], block[1], body_font, content_width), body_font)
+            state["y"] += _BODY_FONT_SIZE // 2
+
+        # Markdown goes to the page the block ends on
+        state["markdown"].append(block_to_markdown(block))
+
+    flush_page()
+    return pages
+
+
+def ingest_docx(docx_path: str, document_id: str, output_dir: str = "data/images") -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Extract and paginate a DOCX (blocking)
+
+    Returns:
+        Tuple of (pages, embedded_image_paths) where pages is a list of
+        (preview image URL, page markdown); empty documents give a single
+        blank page
+    """
+    blocks = extract_docx_blocks(docx_path, document_id, output_dir)
+    image_paths = [block[1] for block in blocks if block[0] == IMAGE]
+    return render_docx_pages(blocks, document_id, output_dir), image_paths
+
+
+async def ingest_docx_async(docx_path: str, document_id: str, output_dir: str = "data/images") -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Extract and paginate a DOCX on the CPU pool, off the event loop
+    """
+    return await run_cpu(ingest_docx, docx_path, document_id, output_dir)
@@ -0,0 +1,174 @@
+"""
+Shared image preprocessing for Gemini extractors
+Decodes, normalizes and encodes each page image once and caches the
+model-ready JPEG payload so analyze/markdown/person/vehicle calls reuse it
+"""
+
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from decouple import config
+from PIL import Image
+
+from app.cpu_pool import run_cpu
+
+# Size / quality budget for images sent to the model
+AI_IMAGE_MAX_DIMENSION = config('AI_IMAGE_MAX_DIMENSION', default=3000, cast=int)
+AI_IMAGE_JPEG_QUALITY = config('AI_IMAGE_JPEG_QUALITY', default=85, cast=int)
+AI_IMAGE_MAX_BYTES = config('AI_IMAGE_MAX_BYTES', default=4 * 1024 * 1024, cast=int)
+
+# In-memory budget for cached payloads (all pages together)
+AI_IMAGE_CACHE_MB = config('AI_IMAGE_CACHE_MB', default=64, cast=int)
+
+# Lowest JPEG quality tried before the image is downscaled further
+_MIN_JPEG_QUALITY = 60
+
+
+class PreparedImage:
+    """
+    Model-ready encoded payload for one page image
+    """
+
+    def __init__(self, data: bytes, size: Tuple[int, int], mime_type: str = "image/jpeg"):
+        self.data = data
+        self.size = size
+        self.mime_type = mime_type
+        self.digest = hashlib.sha256(data).hexdigest()
+
+    def as_part(self) -> Dict[str, Any]:
+        """Inline blob part accepted by the Gemini SDK"""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+# (absolute path, mtime_ns, file size) -> PreparedImage, least recently used first
+_prepared_cache: "OrderedDict[Tuple[str, int, int], PreparedImage]" = OrderedDict()
+_prepared_cache_bytes = 0
+
+
+def _encode_within_budget(image: Image.Image) -> bytes:
+    """
+    Encode an RGB image as JPEG within AI_IMAGE_MAX_BYTES
+    Lowers quality first, then downscales, until the payload fits
+    """
+    quality = AI_IMAGE_JPEG_QUALITY
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        data = buffer.getvalue()
+
+        if len(data) <= AI_IMAGE_MAX_BYTES or max(image.size) <= 512:
+            return data
+
+        if quality > _MIN_JPEG_QUALITY:
+            quality = max(_MIN_JPEG_QUALITY, quality - 10)
+        else:
+            new_size = (int(image.size[0] * 0.8), int(image.size[1] * 0.8))
+            image = image.resize(new_size, Image.Resampling.LANCZOS)
+
+
+def encode_image_for_model(image_path: str) -> PreparedImage:
+    """
+    Decode, normalize and encode one image for the model (no caching)
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        PreparedImage with the JPEG payload
+    """
+    file_size = os.path.getsize(image_path)
+
+    with Image.open(image_path) as image:
+        # Fast path: JPEG that already fits the budget is sent as-is, no decode
+        if (
+            image.format == 'JPEG'
+            and image.mode == 'RGB'
+            and max(image.size) <= AI_IMAGE_MAX_DIMENSION
+            and file_size <= AI_IMAGE_MAX_BYTES
+        ):
+            with open(image_path, 'rb') as f:
+                return PreparedImage(f.read(), image.size)
+
+        # Convert to RGB if necessary
+        normalized = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+
+    # Downscale large scans while maintaining aspect ratio
+    max_dimension = max(normalized.size)
+    if max_dimension > AI_IMAGE_MAX_DIMENSION:
+        ratio = AI_IMAGE_MAX_DIMENSION / max_dimension
+        new_size = (int(normalized.size[0] * ratio), int(normalized.size[1] * ratio))
+        normalized = normalized.resize(new_size, Image.Resampling.LANCZOS)
+        print(f"   📐 Optimized image from {image_path} to {new_size} (original: {max_dimension}px, {file_size / (1024 * 1024):.1f}MB)")
+
+    return PreparedImage(_encode_within_budget(normalized), normalized.size)
+
+
+def _cache_key(image_path: str) -> Tuple[str, int, int]:
+    """Cache key: path, modification time and file size"""
+    stat = os.stat(image_path)
+    return (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+
+
+def _cache_get(key: Tuple[str, int, int]) -> Optional[PreparedImage]:
+    """Cached payload for a key (marked as recently used)"""
+    prepared = _prepared_cache.get(key)
+    if prepared is not None:
+        _prepared_cache.move_to_end(key)
+    return prepared
+
+
+def _cache_put(key: Tuple[str, int, int], prepared: PreparedImage) -> None:
+    """Store a payload, evicting least recently used ones over the memory budget"""
+    global _prepared_cache_bytes
+
+    if key in _prepared_cache:
+        return
+    _prepared_cache[key] = prepared
+    _prepared_cache_bytes += len(prepared.data)
+
+    max_bytes = AI_IMAGE_CACHE_MB * 1024 * 1024
+    while _prepared_cache_bytes > max_bytes and len(_prepared_cache) > 1:
+        _, evicted = _prepared_cache.popitem(last=False)
+        _prepared_cache_bytes -= len(evicted.data)
+
+
+def prepare_image(image_path: str) -> PreparedImage:
+    """
+    Get the cached model-ready payload for an image, preparing it on first use
+
+    The cache is keyed by path, modification time and file size, so a page
+    that is re-rendered gets a fresh payload.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        PreparedImage shared by every extractor
+    """
+    key = _cache_key(image_path)
+    prepared = _cache_get(key)
+    if prepared is None:
+        prepared = encode_image_for_model(image_path)
+        _cache_put(key, prepared)
+    return prepared
+
+
+async def prepare_image_async(image_path: str) -> PreparedImage:
+    """
+    Same as prepare_image, but a cache miss is decoded and encoded on the
+    CPU pool instead of the event loop
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        PreparedImage shared by every extractor
+    """
+    key = _cache_key(image_path)
+    prepared = _cache_get(key)
+    if prepared is None:
+        prepared = await run_cpu(encode_image_for_model, image_path)
+        _cache_put(key, prepared)
+    return prepared
@@ -0,0 +1,122 @@
+"""
+Tiered page images
+Derives a small WebP thumbnail, a screen-resolution WebP and a model-input
+JPEG from each page image, so the UI and Gemini never receive the full
+150-DPI PNG. Tiers are generated on first request and cached next to the
+source image.
+"""
+
+import asyncio
+import os
+from typing import Dict, Optional
+from decouple import config
+from PIL import Image
+
+from app.cpu_pool import run_cpu
+
+# Thumbnail (page lists, previews)
+PAGE_THUMBNAIL_MAX_DIMENSION = config('PAGE_THUMBNAIL_MAX_DIMENSION', default=256, cast=int)
+PAGE_THUMBNAIL_QUALITY = config('PAGE_THUMBNAIL_QUALITY', default=70, cast=int)
+
+# Screen image (document viewer)
+PAGE_SCREEN_MAX_DIMENSION = config('PAGE_SCREEN_MAX_DIMENSION', default=1600, cast=int)
+PAGE_SCREEN_QUALITY = config('PAGE_SCREEN_QUALITY', default=80, cast=int)
+
+# Model input (sent to Gemini; keeps small print legible)
+PAGE_MODEL_MAX_DIMENSION = config('PAGE_MODEL_MAX_DIMENSION', default=2048, cast=int)
+PAGE_MODEL_JPEG_QUALITY = config('PAGE_MODEL_JPEG_QUALITY', default=85, cast=int)
+
+# Classifier input (cheap document-type routing call)
+PAGE_CLASSIFY_MAX_DIMENSION = config('PAGE_CLASSIFY_MAX_DIMENSION', default=512, cast=int)
+
+# tier -> (filename suffix, PIL format, max dimension, quality, media type)
+IMAGE_TIERS: Dict[str, tuple] = {
+    "thumbnail": ("_thumb.webp", "WEBP", PAGE_THUMBNAIL_MAX_DIMENSION, PAGE_THUMBNAIL_QUALITY, "image/webp"),
+    "screen": ("_screen.webp", "WEBP", PAGE_SCREEN_MAX_DIMENSION, PAGE_SCREEN_QUALITY, "image/webp"),
+    "model": ("_model.jpg", "JPEG", PAGE_MODEL_MAX_DIMENSION, PAGE_MODEL_JPEG_QUALITY, "image/jpeg"),
+    "classify": ("_classify.jpg", "JPEG", PAGE_CLASSIFY_MAX_DIMENSION, 75, "image/jpeg"),
+}
+
+# tier path -> lock, so concurrent requests generate a tier only once
+_tier_locks: Dict[str, asyncio.Lock] = {}
+
+
+def tier_image_path(source_path: str, tier: str) -> str:
+    """Path of a tier image derived from source_path"""
+    suffix = IMAGE_TIERS[tier][0]
+    return f"{os.path.splitext(source_path)[0]}{suffix}"
+
+
+def tier_media_type(tier: str) -> str:
+    """Media type served for a tier"""
+    return IMAGE_TIERS[tier][4]
+
+
+def generate_tier_image(source_path: str, tier: str, output_path: Optional[str] = None) -> str:
+    """
+    Create one tier image from a page image (blocking, run it on the CPU pool)
+
+    Args:
+        source_path: Original page image
+        tier: "thumbnail", "screen", "model" or "classify"
+        output_path: Where to write the tier (defaults to tier_image_path)
+
+    Returns:
+        Path of the written tier image
+    """
+    _, image_format, max_dimension, quality, _ = IMAGE_TIERS[tier]
+    output_path = output_path or tier_image_path(source_path, tier)
+
+    with Image.open(source_path) as image:
+        # Decode at reduced size when the format supports it (JPEG draft mode)
+        image.draft('RGB', (max_dimension, max_dimension))
+        tier_image = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+
+    # thumbnail() keeps the aspect ratio and never upscales
+    tier_image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    if image_format == 'WEBP':
+        tier_image.save(output_path, format='WEBP', quality=quality, method=4)
+    else:
+        tier_image.save(output_path, format='JPEG', quality=quality, optimize=True)
+
+    return output_path
+
+
+async def ensure_tier_image(source_path: str, tier: str) -> str:
+    """
+    Get a tier image, generating it when missing or older than the source
+
+    Args:
+        source_path: Original page image
+        tier: "thumbnail", "screen", "model" or "classify"
+
+    Returns:
+        Local path of the tier image
+    """
+    if tier not in IMAGE_TIERS:
+        raise ValueError(f"Unknown image tier: {tier}")
+
+    output_path = tier_image_path(source_path, tier)
+
+    def is_fresh() -> bool:
+        return (
+            os.path.exists(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+        )
+
+    if is_fresh():
+        return output_path
+
+    lock = _tier_locks.setdefault(output_path, asyncio.Lock())
+    try:
+        async with lock:
+            if not is_fresh():
+                # Write to a temporary file so readers never see a partial image
+                partial_path = f"{output_path}.partial"
+                await run_cpu(generate_tier_image, source_path, tier, partial_path)
+                os.replace(partial_path, output_path)
+    finally:
+        _tier_locks.pop(output_path, None)
+
+    return output_path
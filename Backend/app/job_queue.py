@@ -0,0 +1,248 @@
+"""
+Background job queue for document analysis
+Jobs are tracked in the jobs table; they run on Redis/RQ workers when
+REDIS_URL is configured and reachable, otherwise on an in-process worker
+that uses the same table as its queue (so QUEUED jobs survive restarts)
+"""
+
+import asyncio
+import importlib
+import traceback
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from decouple import config
+
+from app.database import SessionLocal
+from app.models import Job
+from app.rate_limiter import PRIORITY_BATCH, ai_priority
+
+# Queue configuration
+REDIS_URL = config('REDIS_URL', default='')
+JOB_QUEUE_NAME = config('JOB_QUEUE_NAME', default='documents')
+JOB_WORKER_CONCURRENCY = config('JOB_WORKER_CONCURRENCY', default=2, cast=int)
+JOB_TIMEOUT_SECONDS = config('JOB_TIMEOUT_SECONDS', default=1800, cast=int)
+
+# Module that registers the job handlers (imported by RQ worker processes)
+JOB_HANDLERS_MODULE = config('JOB_HANDLERS_MODULE', default='main')
+
+# Called by handlers as progress_callback(completed, total)
+ProgressCallback = Callable[[int, int], None]
+
+# job_type -> async handler(document_id, progress_callback)
+JobHandler = Callable[[str, ProgressCallback], Awaitable[None]]
+
+_job_handlers: Dict[str, JobHandler] = {}
+_rq_queue = None
+_rq_checked = False
+_local_semaphore: Optional[asyncio.Semaphore] = None
+_local_tasks = set()
+
+
+def register_job_handler(job_type: str, handler: JobHandler) -> None:
+    """
+    Register the coroutine that runs jobs of the given type
+
+    Args:
+        job_type: Job type name stored in Job.job_type (e.g. "analyze-auto")
+        handler: async handler(document_id, progress_callback)
+    """
+    _job_handlers[job_type] = handler
+
+
+def get_rq_queue():
+    """
+    Get the RQ queue, or None when Redis is not configured or not reachable
+    """
+    global _rq_queue, _rq_checked
+
+    if _rq_checked:
+        return _rq_queue
+    _rq_checked = True
+
+    if not REDIS_URL:
+        print("ℹ️  REDIS_URL not set - using in-process job worker")
+        return None
+
+    try:
+        from redis import Redis
+        from rq import Queue
+
+        connection = Redis.from_url(REDIS_URL)
+        connection.ping()
+        _rq_queue = Queue(JOB_QUEUE_NAME, connection=connection, default_timeout=JOB_TIMEOUT_SECONDS)
+        print(f"✅ Job queue connected to Redis ({JOB_QUEUE_NAME})")
+    except Exception as e:
+        print(f"⚠️  Redis not available ({e}) - using in-process job worker")
+        _rq_queue = None
+
+    return _rq_queue
+
+
+def update_job(
+    job_id: str,
+    status: Optional[str] = None,
+    progress: Optional[int] = None,
+    error_message: Optional[str] = None
+) -> None:
+    """
+    Update job status / progress in the database
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            return
+
+        if status is not None:
+            job.status = status
+        if progress is not None:
+            job.progress = max(0, min(100, int(progress)))
+        if error_message is not None:
+            job.error_message = error_message
+        job.updated_at = datetime.utcnow()
+
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_job(job_id: str) -> None:
+    """
+    Run one job with its registered handler and record the outcome
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            print(f"⚠️  Job {job_id} not found")
+            return
+        document_id = job.document_id
+        job_type = job.job_type or "analyze-auto"
+    finally:
+        db.close()
+
+    handler = _job_handlers.get(job_type)
+    if handler is None:
+        update_job(job_id, status="ERROR", error_message=f"No handler registered for job type '{job_type}'")
+        return
+
+    print(f"\n⚙️  Running job {job_id} ({job_type}) for document {document_id}")
+    update_job(job_id, status="PROCESSING", progress=0)
+
+    def progress_callback(completed: int, total: int) -> None:
+        # Keep 100% for the DONE state
+        if total > 0:
+            update_job(job_id, progress=min(99, completed * 100 // total))
+
+    try:
+        # Background work yields model capacity to chat and interactive requests
+        with ai_priority(PRIORITY_BATCH):
+            await handler(document_id, progress_callback)
+        update_job(job_id, status="DONE", progress=100)
+        print(f"✅ Job {job_id} done")
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        print(f"❌ Job {job_id} failed: {detail}")
+        traceback.print_exc()
+        update_job(job_id, status="ERROR", error_message=str(detail))
+
+
+def run_job_sync(job_id: str) -> None:
+    """
+    Entry point for RQ worker processes
+    Imports the handler module so job types are registered, then runs the job
+    """
+    if not _job_handlers:
+        importlib.import_module(JOB_HANDLERS_MODULE)
+    asyncio.run(run_job(job_id))
+
+
+async def _run_local(job_id: str) -> None:
+    """Run a job on the in-process worker, bounded by JOB_WORKER_CONCURRENCY"""
+    global _local_semaphore
+
+    if _local_semaphore is None:
+        _local_semaphore = asyncio.Semaphore(max(1, JOB_WORKER_CONCURRENCY))
+
+    async with _local_semaphore:
+        await run_job(job_id)
+
+
+def _dispatch(job_id: str) -> None:
+    """Send a QUEUED job to Redis/RQ or the in-process worker"""
+    queue = get_rq_queue()
+    if queue is not None:
+        try:
+            queue.enqueue(run_job_sync, job_id, job_id=job_id)
+            return
+        except Exception as e:
+            print(f"⚠️  Failed to enqueue job {job_id} on Redis ({e}) - running in-process")
+
+    task = asyncio.create_task(_run_local(job_id))
+    # Keep a reference so the task is not garbage collected mid-run
+    _local_tasks.add(task)
+    task.add_done_callback(_local_tasks.discard)
+
+
+async def enqueue_job(document_id: str, job_type: str) -> str:
+    """
+    Create a QUEUED job and dispatch it
+
+    Args:
+        document_id: Document to process
+        job_type: Registered job type
+
+    Returns:
+        The new job id
+    """
+    if job_type not in _job_handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    job_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        db.add(Job(
+            id=job_id,
+            document_id=document_id,
+            job_type=job_type,
+            status="QUEUED",
+            progress=0,
+            created_at=datetime.utcnow()
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+    _dispatch(job_id)
+    print(f"📥 Queued job {job_id} ({job_type}) for document {document_id}")
+    return job_id
+
+
+async def resume_pending_jobs() -> int:
+    """
+    Re-dispatch jobs left QUEUED or PROCESSING by a previous in-process worker
+    Jobs owned by RQ are left to the RQ workers
+
+    Returns:
+        Number of resumed jobs
+    """
+    if get_rq_queue() is not None:
+        return 0
+
+    db = SessionLocal()
+    try:
+        pending = db.query(Job.id)\
+            .filter(Job.status.in_(["QUEUED", "PROCESSING"]), Job.job_type.isnot(None))\
+            .order_by(Job.created_at)\
+            .all()
+    finally:
+        db.close()
+
+    for (job_id,) in pending:
+        update_job(job_id, status="QUEUED", progress=0)
+        _dispatch(job_id)
+
+    if pending:
+        print(f"🔁 Resumed {len(pending)} pending jobs")
+    return len(pending)
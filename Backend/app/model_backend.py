@@ -0,0 +1,263 @@
+"""
+Model backends
+Every Gemini call goes through a backend: the real Gemini API, or a local
+fake that replays canned per-extractor responses from mock/responses/ with
+simulated latency, quota errors (429) and malformed JSON, so the analysis
+pipeline, concurrency limits and retry logic can be load-tested offline.
+"""
+
+import abc
+import asyncio
+import os
+import random
+from typing import Any, Dict, Optional
+from decouple import config
+
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    GEMINI_AVAILABLE = False
+    print("⚠️  Warning: google-generativeai not available. Using the fake model backend.")
+
+from app.rate_limiter import estimate_tokens
+
+# "gemini" (default) or "fake"
+MODEL_BACKEND = config('MODEL_BACKEND', default='gemini')
+
+# Fake backend: canned responses, one file per extractor (<extractor>.json or .md)
+FAKE_MODEL_RESPONSES_DIR = config('FAKE_MODEL_RESPONSES_DIR', default='mock/responses')
+
+# Fake backend: latency per call (uniform in latency ± jitter)
+FAKE_MODEL_LATENCY_MS = config('FAKE_MODEL_LATENCY_MS', default=800, cast=int)
+FAKE_MODEL_JITTER_MS = config('FAKE_MODEL_JITTER_MS', default=400, cast=int)
+
+# Fake backend: share of calls failing with a 429, and of responses cut off mid-JSON
+FAKE_MODEL_QUOTA_ERROR_RATE = config('FAKE_MODEL_QUOTA_ERROR_RATE', default=0.0, cast=float)
+FAKE_MODEL_MALFORMED_RATE = config('FAKE_MODEL_MALFORMED_RATE', default=0.0, cast=float)
+
+# Fake backend: server-suggested wait sent with simulated 429s
+FAKE_MODEL_RETRY_AFTER_SECONDS = config('FAKE_MODEL_RETRY_AFTER_SECONDS', default=1.0, cast=float)
+
+# Fake backend: random seed, so a load test replays the same errors and latencies
+FAKE_MODEL_SEED = config('FAKE_MODEL_SEED', default=0, cast=int)
+
+# Extractors that share a canned response
+_RESPONSE_ALIASES = {"text-analyze": "analyze"}
+
+
+class ModelBackend(abc.ABC):
+    """
+    Interface of a model backend
+
+    generate() returns a response object with .text and .usage_metadata
+    (prompt_token_count, candidates_token_count, total_token_count), like
+    the Gemini SDK, and raises the SDK's errors (a quota error mentions 429
+    / RESOURCE_EXHAUSTED).
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def generate(
+        self,
+        model_name: str,
+        contents: Any,
+        max_output_tokens: int = 8192,
+        temperature: float = 0.1,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        extractor: str = "analyze",
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        Run one model call
+
+        Args:
+            model_name: Model to call
+            contents: Prompt text, or a list of prompt parts (text and images)
+            max_output_tokens: Output token limit for the response
+            temperature / top_p / top_k: Sampling settings
+            extractor: Which prompt this is (analyze, markdown, person, chat...);
+                the fake backend picks its canned response by it
+            response_schema: JSON schema the response must follow (sent with
+                the JSON response MIME type); None for free-form text
+
+        Returns:
+            Response object
+        """
+
+    def cache_name(self, model_name: str) -> str:
+        """Model name used in AI result cache keys"""
+        return model_name
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini API through the google-generativeai SDK"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str):
+        genai.configure(api_key=api_key)
+        self._models: Dict[str, Any] = {}
+
+    async def generate(
+        self,
+        model_name: str,
+        contents: Any,
+        max_output_tokens: int = 8192,
+        temperature: float = 0.1,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        extractor: str = "analyze",
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = genai.GenerativeModel(model_name)
+
+        structured = {}
+        if response_schema is not None:
+            structured = {"response_mime_type": "application/json", "response_schema": response_schema}
+
+        return await model.generate_content_async(
+            contents,
+            generation_config=genai.GenerationConfig(
+                temperature=temperature,
+                top_p=top_p,
+                top_k=top_k,
+                max_output_tokens=max_output_tokens,
+                **structured
+            )
+        )
+
+
+class FakeUsageMetadata:
+    """Token counts of a fake response"""
+
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    """Response of the fake backend (same attributes the SDK response is read by)"""
+
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = FakeUsageMetadata(prompt_tokens, len(text) // 4 + 1)
+
+
+class FakeModelBackend(ModelBackend):
+    """
+    Local deterministic stand-in for Gemini
+
+    Replays the canned response of the extractor after a simulated latency.
+    With a fixed seed the sequence of latencies, 429s and malformed
+    responses is the same on every run.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        responses_dir: str = FAKE_MODEL_RESPONSES_DIR,
+        latency_ms: int = FAKE_MODEL_LATENCY_MS,
+        jitter_ms: int = FAKE_MODEL_JITTER_MS,
+        quota_error_rate: float = FAKE_MODEL_QUOTA_ERROR_RATE,
+        malformed_rate: float = FAKE_MODEL_MALFORMED_RATE,
+        retry_after_seconds: float = FAKE_MODEL_RETRY_AFTER_SECONDS,
+        seed: int = FAKE_MODEL_SEED
+    ):
+        self.responses_dir = responses_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.quota_error_rate = quota_error_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after_seconds = retry_after_seconds
+        self._random = random.Random(seed)
+        self._responses: Dict[str, str] = {}
+        self.calls: Dict[str, int] = {}
+
+    def load_response(self, extractor: str) -> str:
+        """Canned response text of an extractor (falls back to analyze)"""
+        name = _RESPONSE_ALIASES.get(extractor, extractor)
+        if name not in self._responses:
+            text = None
+            for ext in (".json", ".md"):
+                path = os.path.join(self.responses_dir, f"{name}{ext}")
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                    break
+            if text is None:
+                if name == "analyze":
+                    raise FileNotFoundError(f"No canned response for '{extractor}' in {self.responses_dir}")
+                text = self.load_response("analyze")
+            self._responses[name] = text
+        return self._responses[name]
+
+    async def generate(
+        self,
+        model_name: str,
+        contents: Any,
+        max_output_tokens: int = 8192,
+        temperature: float = 0.1,
+        top_p: float = 0.95,
+        top_k: int = 40,
+        extractor: str = "analyze",
+        response_schema: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        self.calls[extractor] = self.calls.get(extractor, 0) + 1
+
+        # Draw every value up front so the sequence does not depend on await order
+        latency_ms = max(0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+        quota_error = self._random.random() < self.quota_error_rate
+        malformed = self._random.random() < self.malformed_rate
+
+        await asyncio.sleep(latency_ms / 1000)
+
+        if quota_error:
+            raise Exception(
+                f"429 RESOURCE_EXHAUSTED: simulated quota exceeded for {model_name}, "
+                f"retry in {self.retry_after_seconds}s"
+            )
+
+        text = self.load_response(extractor)
+        if malformed:
+            # Cut off like a response that hit the output limit
+            text = text[:max(1, len(text) // 2)]
+
+        return FakeResponse(text, estimate_tokens(contents))
+
+    def cache_name(self, model_name: str) -> str:
+        # Canned results must never be served as real ones
+        return f"fake:{model_name}"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Calls per extractor"""
+        return {"backend": self.name, "calls": dict(self.calls)}
+
+
+_backend: Optional[ModelBackend] = None
+
+
+def get_model_backend() -> ModelBackend:
+    """Get the configured backend (created on first use)"""
+    global _backend
+    if _backend is None:
+        if MODEL_BACKEND == "fake" or not GEMINI_AVAILABLE:
+            _backend = FakeModelBackend()
+            print(f"🧪 Using fake model backend (latency {FAKE_MODEL_LATENCY_MS}±{FAKE_MODEL_JITTER_MS} ms)")
+        elif MODEL_BACKEND == "gemini":
+            _backend = GeminiBackend(config('GEMINI_API_KEY'))
+        else:
+            raise ValueError(f"Unknown MODEL_BACKEND: {MODEL_BACKEND}")
+    return _backend
+
+
+def set_model_backend(backend: ModelBackend) -> None:
+    """Replace the backend (load tests, local experiments)"""
+    global _backend
+    _backend = backend
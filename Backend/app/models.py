@@ -73,6 +73,9 @@ class Document(Base):
     markdown_content = Column(Text, nullable=True)  # Store full text as markdown
     person_data = Column(Text, nullable=True)  # Store extracted person info (JSON string)
     vehicle_data = Column(Text, nullable=True)  # Store extracted vehicle info (JSON string)
+    file_path = Column(String, nullable=True)  # Stored original upload (data/docs/...)
+    page_count = Column(Integer, nullable=True)  # Page count from file metadata
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 of the uploaded file
     
     # Relationship with pages
     pages = relationship("Page", back_populates="document")
@@ -88,6 +91,18 @@ class Page(Base):
     page_index = Column(Integer, nullable=False)
     image_url = Column(String, nullable=False)
     
+    # Per-page analysis result, so single pages can be retried without
+    # re-analyzing the whole document
+    analysis_status = Column(String, nullable=True)  # DONE, ERROR, SKIPPED (None = not analyzed)
+    ai_result_json = Column(Text, nullable=True)  # Structured result for this page
+    markdown_content = Column(Text, nullable=True)  # Markdown fragment (with page header)
+    analysis_error = Column(Text, nullable=True)
+    analyzed_at = Column(DateTime, nullable=True)
+    
+    # Native PDF text layer (born-digital pages skip rendering and OCR)
+    has_text_layer = Column(Boolean, nullable=True)  # None = not checked yet
+    text_content = Column(Text, nullable=True)  # Markdown built from the text layer
+    
     # Relationship with document
     document = relationship("Document", back_populates="pages")
 
@@ -99,9 +114,11 @@ class Job(Base):
     
     id = Column(String, primary_key=True, index=True)
     document_id = Column(String, ForeignKey("documents.id"))
-    status = Column(String, nullable=False, default="PROCESSING")  # PROCESSING, DONE, ERROR
+    job_type = Column(String, nullable=True, default="analyze-auto")  # analyze-auto, process
+    status = Column(String, nullable=False, default="PROCESSING")  # QUEUED, PROCESSING, DONE, ERROR
     progress = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     error_message = Column(Text, nullable=True)
 
 class InsurancePurchase(Base):
@@ -196,4 +213,51 @@ class DisasterLocation(Base):
     
     # Timestamps
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AIResultCache(Base):
+    """
+    Cached AI extraction results, keyed by a hash of the normalized image
+    bytes + prompt + model version so re-uploaded documents skip Gemini
+    """
+    __tablename__ = "ai_result_cache"
+    
+    cache_key = Column(String, primary_key=True, index=True)  # SHA-256 hex digest
+    extractor = Column(String, nullable=False, index=True)  # analyze, markdown, person, vehicle, ...
+    model_name = Column(String, nullable=False)  # Gemini model version
+    result_json = Column(Text, nullable=False)  # Cached result (JSON string)
+    size_bytes = Column(Integer, nullable=False, default=0)  # Size of result_json
+    hit_count = Column(Integer, default=0)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Used for TTL expiry
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)  # Used for LRU eviction
+
+
+class StoredAsset(Base):
+    """
+    File stored under data/ (uploads, page images, render cache), tracked so
+    storage budgets can be enforced without walking the filesystem
+    """
+    __tablename__ = "stored_assets"
+    
+    path = Column(String, primary_key=True, index=True)  # Relative path, e.g. data/images/x.png
+    kind = Column(String, nullable=False, index=True)  # upload, page, render
+    size_bytes = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0, index=True)  # Documents using this file
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)  # Used for LRU eviction
+
+
+class StorageCounter(Base):
+    """
+    Running totals per asset kind, so storage stats are a single lookup
+    """
+    __tablename__ = "storage_counters"
+    
+    kind = Column(String, primary_key=True)  # upload, page, render
+    asset_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(Integer, nullable=False, default=0)
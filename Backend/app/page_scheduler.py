@@ -0,0 +1,117 @@
+"""
+Bounded-concurrency scheduler for per-page Gemini calls
+Fans out model calls for every page of a document while capping
+in-flight requests per document and across the whole process
+"""
+
+import asyncio
+import heapq
+import itertools
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple, TypeVar
+from decouple import config
+
+from app.rate_limiter import current_priority
+
+T = TypeVar("T")
+
+# Maximum in-flight model calls across all documents in this process
+AI_MAX_CONCURRENT_CALLS = config('AI_MAX_CONCURRENT_CALLS', default=8, cast=int)
+
+# Maximum in-flight model calls for a single document
+AI_MAX_CONCURRENT_CALLS_PER_DOCUMENT = config('AI_MAX_CONCURRENT_CALLS_PER_DOCUMENT', default=4, cast=int)
+
+
+class PrioritySemaphore:
+    """
+    Semaphore that hands a freed slot to the waiter with the best priority
+    (the caller's rate-limit priority class, FIFO within a class)
+
+    Calls hold their slot while they queue in the rate limiter, so with a
+    plain FIFO semaphore background jobs could fill every slot and keep UI
+    requests from ever reaching the limiter's priority queue.
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        # (priority, sequence, future)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    async def acquire(self) -> None:
+        if self._value > 0 and not any(not entry[2].done() for entry in self._waiters):
+            self._value -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (current_priority(), next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled after the slot was handed over: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+# Shared by every PageScheduler so one large document cannot starve the others
+_global_semaphore = PrioritySemaphore(max(1, AI_MAX_CONCURRENT_CALLS))
+
+
+class PageScheduler:
+    """
+    Schedules model calls for the pages of one document
+
+    Each call first takes a per-document slot and then a global slot,
+    so a 50-page PDF queues behind its own limit instead of holding
+    every global slot while other uploads wait. Global slots go to the
+    highest priority class first (UI requests before background jobs).
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None):
+        limit = max_in_flight or AI_MAX_CONCURRENT_CALLS_PER_DOCUMENT
+        self._document_semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a single model call once both a document and a global slot are free
+
+        Args:
+            call: Zero-argument callable returning the coroutine to await
+
+        Returns:
+            Result of the awaited coroutine
+        """
+        async with self._document_semaphore:
+            async with _global_semaphore:
+                return await call()
+
+    async def map_pages(
+        self,
+        items: Sequence[Any],
+        page_fn: Callable[[int, Any], Awaitable[T]]
+    ) -> List[T]:
+        """
+        Run page_fn for every item concurrently and return results in input order
+
+        Args:
+            items: Per-page inputs (e.g. Page rows)
+            page_fn: Coroutine function called as page_fn(index, item)
+
+        Returns:
+            List of results, one per item, in the same order as items
+        """
+        return await asyncio.gather(*(page_fn(idx, item) for idx, item in enumerate(items)))
@@ -0,0 +1,221 @@
+"""
+Streaming PDF rasterizer
+Renders one page at a time on the shared CPU pool and writes each page
+image as soon as it is ready, so long PDFs are never held in memory at once.
+In lazy mode pages are only rendered when first viewed or analyzed.
+"""
+
+import asyncio
+import os
+import re
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from decouple import config
+
+from app.cpu_pool import run_cpu
+
+try:
+    import fitz  # PyMuPDF
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
+
+# Render resolution (150 DPI = 1.5x PDF points, good OCR quality at a reasonable size)
+PDF_RENDER_DPI = config('PDF_RENDER_DPI', default=150, cast=int)
+
+# Pages of one PDF rendered in parallel; also the number of page images held in memory
+PDF_RENDER_WORKERS = config('PDF_RENDER_WORKERS', default=2, cast=int)
+
+# Store only the PDF and page count at upload; render pages on first use
+PDF_LAZY_RENDERING = config('PDF_LAZY_RENDERING', default=True, cast=bool)
+
+# URL served by the on-demand page image endpoint
+_LAZY_PAGE_URL = re.compile(r'^/documents/([^/]+)/pages/(\d+)/image$')
+
+# output path -> lock, so concurrent requests render a page only once
+_render_locks: Dict[str, asyncio.Lock] = {}
+
+
+def page_image_filename(document_id: str, page_number: int) -> str:
+    """Filename of a rendered page image (shared by eager and lazy rendering)"""
+    return f"{document_id}_page_{page_number}.png"
+
+
+def lazy_page_url(document_id: str, page_number: int) -> str:
+    """Image URL of a page that is rendered on first request"""
+    return f"/documents/{document_id}/pages/{page_number}/image"
+
+
+def parse_lazy_page_url(image_url: str) -> Optional[Tuple[str, int]]:
+    """
+    Parse a lazy page URL
+
+    Returns:
+        (document_id, 1-based page number), or None for regular image URLs
+    """
+    match = _LAZY_PAGE_URL.match(image_url or "")
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def get_pdf_page_count(pdf_path: str, backend: Optional[str] = None) -> int:
+    """
+    Read the page count from PDF metadata without rendering anything
+
+    Args:
+        pdf_path: Path to the PDF file
+        backend: "fitz" or "pdf2image"; None picks PyMuPDF when installed
+    """
+    backend = backend or ("fitz" if FITZ_AVAILABLE else "pdf2image")
+
+    if backend == "fitz":
+        with fitz.open(pdf_path) as pdf_doc:
+            return pdf_doc.page_count
+
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def render_pdf_page(
+    pdf_path: str,
+    page_number: int,
+    output_path: str,
+    dpi: int = PDF_RENDER_DPI,
+    backend: Optional[str] = None
+) -> str:
+    """
+    Render a single PDF page to a PNG file (blocking, run it in a worker)
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_number: 1-based page number
+        output_path: Where to write the PNG
+        dpi: Render resolution
+        backend: "fitz" or "pdf2image"; None picks PyMuPDF when installed
+
+    Returns:
+        output_path
+    """
+    backend = backend or ("fitz" if FITZ_AVAILABLE else "pdf2image")
+
+    if backend == "fitz":
+        with fitz.open(pdf_path) as pdf_doc:
+            page = pdf_doc.load_page(page_number - 1)
+            zoom = dpi / 72
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            pix.save(output_path)
+    else:
+        # Only this page is converted, never the whole document
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+        images[0].save(output_path, "PNG")
+
+    return output_path
+
+
+async def iter_rendered_pages(
+    pdf_path: str,
+    document_id: str,
+    output_dir: str = "data/images",
+    backend: Optional[str] = None
+) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Render every page of a PDF, yielding pages in order as they are written
+
+    At most PDF_RENDER_WORKERS pages are rendered (and held in memory) at
+    any time, whatever the page count.
+
+    Args:
+        pdf_path: Path to the PDF file
+        document_id: Document ID used in the image filenames
+        output_dir: Directory for the page images
+        backend: "fitz" or "pdf2image"; None picks PyMuPDF when installed
+
+    Yields:
+        Tuples of (1-based page number, image URL relative to /data/)
+    """
+    page_count = await run_cpu(get_pdf_page_count, pdf_path, backend)
+    window = max(1, PDF_RENDER_WORKERS)
+    in_flight: List[Tuple[int, str, asyncio.Task]] = []
+    next_page = 1
+
+    try:
+        while next_page <= page_count or in_flight:
+            # Keep the worker pool full without running ahead of it
+            while next_page <= page_count and len(in_flight) < window:
+                image_filename = page_image_filename(document_id, next_page)
+                output_path = os.path.join(output_dir, image_filename)
+                future = asyncio.ensure_future(
+                    run_cpu(render_pdf_page, pdf_path, next_page, output_path, PDF_RENDER_DPI, backend)
+                )
+                in_flight.append((next_page, image_filename, future))
+                next_page += 1
+
+            page_number, image_filename, future = in_flight.pop(0)
+            await future
+            yield page_number, f"/data/images/{image_filename}"
+    finally:
+        # Don't leave renders running if the consumer stops early
+        for _, _, future in in_flight:
+            future.cancel()
+
+
+async def rasterize_pdf(
+    pdf_path: str,
+    document_id: str,
+    output_dir: str = "data/images",
+    backend: Optional[str] = None
+) -> List[str]:
+    """
+    Render every page of a PDF and return the image URLs in page order
+    """
+    return [image_url async for _, image_url in iter_rendered_pages(pdf_path, document_id, output_dir, backend)]
+
+
+async def count_pdf_pages(pdf_path: str) -> int:
+    """Read the PDF page count on the CPU pool"""
+    return await run_cpu(get_pdf_page_count, pdf_path)
+
+
+async def ensure_page_rendered(
+    pdf_path: str,
+    document_id: str,
+    page_number: int,
+    output_dir: str = "data/images"
+) -> str:
+    """
+    Get the rendered image of one PDF page, rendering it on a cache miss
+
+    Rendered pages stay in output_dir and are reused until they are
+    cleaned up, after which the next request renders them again.
+
+    Args:
+        pdf_path: Path to the PDF file
+        document_id: Document ID used in the image filename
+        page_number: 1-based page number
+        output_dir: Render cache directory
+
+    Returns:
+        Local path of the page image
+    """
+    output_path = os.path.join(output_dir, page_image_filename(document_id, page_number))
+    if os.path.exists(output_path):
+        return output_path
+
+    lock = _render_locks.setdefault(output_path, asyncio.Lock())
+    try:
+        async with lock:
+            if not os.path.exists(output_path):
+                # Render to a temporary file so readers never see a partial image
+                partial_path = f"{output_path}.partial.png"
+                await run_cpu(render_pdf_page, pdf_path, page_number, partial_path)
+                os.replace(partial_path, output_path)
+                print(f"   🖼️  Rendered page {page_number} of {document_id}")
+    finally:
+        _render_locks.pop(output_path, None)
+
+    return output_path
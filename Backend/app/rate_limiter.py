@@ -0,0 +1,357 @@
+"""
+Process-wide rate limiter for Gemini calls
+One token-bucket limiter per model enforces the requests-per-minute,
+tokens-per-minute and requests-per-day budgets. Callers wait in a priority
+queue for admission (interactive chat before document endpoints before
+background jobs) instead of hitting 429s and retrying blindly; when the
+queue is full or the wait too long the call is rejected right away.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from decouple import config
+
+# Default budgets per model (Gemini free tier for flash-lite)
+RATE_LIMIT_RPM = config('RATE_LIMIT_RPM', default=15, cast=int)
+RATE_LIMIT_TPM = config('RATE_LIMIT_TPM', default=250000, cast=int)
+RATE_LIMIT_RPD = config('RATE_LIMIT_RPD', default=1000, cast=int)
+
+# Per-model overrides: "model:rpm:tpm:rpd,model:rpm:tpm:rpd"
+RATE_LIMIT_MODELS = config('RATE_LIMIT_MODELS', default='')
+
+# Backpressure: waiting calls per model and longest wait before rejecting
+RATE_LIMIT_MAX_QUEUE = config('RATE_LIMIT_MAX_QUEUE', default=200, cast=int)
+RATE_LIMIT_MAX_WAIT_SECONDS = config('RATE_LIMIT_MAX_WAIT_SECONDS', default=120, cast=float)
+
+# Pause after a 429 when the error does not say how long to wait
+RATE_LIMIT_COOLDOWN_SECONDS = config('RATE_LIMIT_COOLDOWN_SECONDS', default=10, cast=float)
+
+# Priority classes (lower is admitted first)
+PRIORITY_INTERACTIVE = 0  # Chat
+PRIORITY_NORMAL = 1  # Document endpoints called by the UI
+PRIORITY_BATCH = 2  # Background jobs
+
+_PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_NORMAL: "normal", PRIORITY_BATCH: "batch"}
+
+# Rough input token cost of one image part (Gemini bills ~258 tokens per 768px tile)
+_IMAGE_TOKENS = 1290
+
+# Priority of model calls made from the current task (set by chat / job worker)
+_current_priority: contextvars.ContextVar[Any] = contextvars.ContextVar("ai_priority", default=PRIORITY_NORMAL)
+
+
+class RateLimitExceeded(Exception):
+    """
+    Model call refused by the rate limiter (queue full or wait too long)
+    The message contains "RESOURCE_EXHAUSTED" so existing quota handling applies.
+    """
+
+    def __init__(self, model_name: str, reason: str):
+        super().__init__(f"RESOURCE_EXHAUSTED: rate limit for {model_name} ({reason})")
+        self.model_name = model_name
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to capacity tokens, refilled
+    continuously at capacity / period per second
+    """
+
+    def __init__(self, capacity: int, period_seconds: float):
+        self.capacity = max(1, capacity)
+        self.rate = self.capacity / period_seconds
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount tokens are available (0 if they are now)"""
+        deficit = min(amount, self.capacity) - self.tokens
+        return 0.0 if deficit <= 0 else deficit / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelRateLimiter:
+    """
+    RPM / TPM / RPD budgets and the admission queue of one model
+    """
+
+    def __init__(self, model_name: str, rpm: int, tpm: int, rpd: int):
+        self.model_name = model_name
+        self.requests = TokenBucket(rpm, 60)
+        self.tokens = TokenBucket(tpm, 60)
+        self.daily = TokenBucket(rpd, 86400)
+        self.blocked_until = 0.0
+
+        # (priority, sequence, tokens, future)
+        self._queue: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.quota_errors = 0
+        self.tokens_used = 0
+        self.total_wait_seconds = 0.0
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        for bucket in (self.requests, self.tokens, self.daily):
+            bucket.refill(now)
+        return max(
+            self.blocked_until - now,
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+            self.daily.wait_time(1)
+        )
+
+    def _dispatch(self) -> None:
+        """Admit waiting calls in priority order while the budgets allow"""
+        self._timer = None
+        now = time.monotonic()
+
+        while self._queue:
+            priority, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            wait = self._wait_time(tokens, now)
+            if wait > 0:
+                # Strict priority: lower classes wait behind the head of the queue
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.daily.take(1)
+            future.set_result(None)
+
+    async def acquire(self, tokens: int, priority: int) -> None:
+        """
+        Wait for admission of one call estimated at `tokens` tokens
+
+        Raises:
+            RateLimitExceeded: Queue full, or not admitted within
+                RATE_LIMIT_MAX_WAIT_SECONDS
+        """
+        pending = sum(1 for entry in self._queue if not entry[3].done())
+        if pending >= RATE_LIMIT_MAX_QUEUE:
+            self._reject("queue_full")
+
+        # A daily budget that refills after the wait limit will not admit us in time
+        now = time.monotonic()
+        self.daily.refill(now)
+        if self.daily.wait_time(1 + pending) > RATE_LIMIT_MAX_WAIT_SECONDS:
+            self._reject("daily_quota")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), tokens, future))
+        if self._timer is not None:
+            # A new head of the queue may fit right away
+            self._timer.cancel()
+        self._dispatch()
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=RATE_LIMIT_MAX_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            self._reject("timeout")
+        finally:
+            if not future.done():
+                future.cancel()
+
+        self.admitted += 1
+        self.total_wait_seconds += time.monotonic() - started
+
+    def release(self, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        """Settle the token reservation with the usage reported by the API"""
+        if used_tokens is None:
+            self.tokens_used += reserved_tokens
+            return
+        self.tokens_used += used_tokens
+        if used_tokens < reserved_tokens:
+            self.tokens.give_back(reserved_tokens - used_tokens)
+            if self._queue and self._timer is not None:
+                self._timer.cancel()
+                self._dispatch()
+
+    def report_quota_error(self, retry_after: Optional[float] = None) -> None:
+        """Pause admissions after the API answered 429 despite the budgets"""
+        self.quota_errors += 1
+        delay = retry_after if retry_after is not None else RATE_LIMIT_COOLDOWN_SECONDS
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        print(f"   ⏸️  {self.model_name} paused for {delay:.1f}s after a quota error")
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise RateLimitExceeded(self.model_name, reason)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, budgets and counters for the metrics endpoint"""
+        now = time.monotonic()
+        self._wait_time(0, now)
+
+        depth = {name: 0 for name in _PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                depth[_PRIORITY_NAMES.get(priority, str(priority))] += 1
+
+        return {
+            "model": self.model_name,
+            "limits": {
+                "rpm": self.requests.capacity,
+                "tpm": self.tokens.capacity,
+                "rpd": self.daily.capacity
+            },
+            "available": {
+                "requests_per_minute": int(self.requests.tokens),
+                "tokens_per_minute": int(self.tokens.tokens),
+                "requests_per_day": int(self.daily.tokens)
+            },
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "quota_errors": self.quota_errors,
+            "tokens_used": self.tokens_used,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.admitted, 1) if self.admitted else 0.0,
+            "paused_for_seconds": round(max(0.0, self.blocked_until - now), 1)
+        }
+
+
+_limiters: Dict[str, ModelRateLimiter] = {}
+
+
+def _model_budgets() -> Dict[str, Tuple[int, int, int]]:
+    """Parse RATE_LIMIT_MODELS overrides"""
+    budgets = {}
+    for entry in RATE_LIMIT_MODELS.split(','):
+        parts = [part.strip() for part in entry.split(':')]
+        if len(parts) == 4 and all(part.isdigit() for part in parts[1:]):
+            budgets[parts[0]] = (int(parts[1]), int(parts[2]), int(parts[3]))
+        elif entry.strip():
+            print(f"⚠️  Ignoring invalid RATE_LIMIT_MODELS entry: {entry}")
+    return budgets
+
+
+def get_rate_limiter(model_name: str) -> ModelRateLimiter:
+    """Get the limiter of a model (created with its budgets on first use)"""
+    limiter = _limiters.get(model_name)
+    if limiter is None:
+        rpm, tpm, rpd = _model_budgets().get(model_name, (RATE_LIMIT_RPM, RATE_LIMIT_TPM, RATE_LIMIT_RPD))
+        limiter = _limiters[model_name] = ModelRateLimiter(model_name, rpm, tpm, rpd)
+    return limiter
+
+
+def estimate_tokens(contents: Any, max_output_tokens: int = 0) -> int:
+    """
+    Estimate the tokens a call will count against TPM before sending it
+    (about 4 characters per text token, a flat cost per image, plus the
+    output limit; the reservation is settled with the real usage afterwards)
+    """
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for part in parts:
+        if isinstance(part, str):
+            total += len(part) // 4 + 1
+        elif isinstance(part, dict) and "data" in part:
+            total += _IMAGE_TOKENS
+        else:
+            total += len(str(part)) // 4 + 1
+    return total + max_output_tokens
+
+
+def usage_tokens(response: Any) -> Optional[int]:
+    """Total tokens reported by a Gemini response, when available"""
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None) if usage is not None else None
+    return total if isinstance(total, int) else None
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-suggested wait from a 429 error message ("retry in 12.5s")"""
+    match = re.search(r'retry(?:_delay)?[^0-9]{0,20}(\d+(?:\.\d+)?)\s*s', str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+class SharedPriority:
+    """
+    Priority of work shared by several callers (e.g. a coalesced call):
+    the best priority of any caller, raised as more urgent callers join
+    """
+
+    def __init__(self, priority: int):
+        self.value = priority
+
+    def raise_to(self, priority: int) -> None:
+        self.value = min(self.value, priority)
+
+
+@contextmanager
+def ai_priority(priority: Union[int, SharedPriority]) -> Iterator[None]:
+    """Run the model calls of the enclosed code (and tasks it starts) at a priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    """Priority of model calls made from the current task"""
+    priority = _current_priority.get()
+    return priority.value if isinstance(priority, SharedPriority) else priority
+
+
+@asynccontextmanager
+async def rate_limited(
+    model_name: str,
+    contents: Any,
+    max_output_tokens: int = 0,
+    priority: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Hold a rate-limit admission for one model call
+
+    Usage:
+        async with rate_limited(model_name, contents, 1024) as call:
+            response = await ...
+            call["response"] = response  # settles the token estimate
+
+    Raises:
+        RateLimitExceeded: The call was not admitted
+    """
+    limiter = get_rate_limiter(model_name)
+    reserved = estimate_tokens(contents, max_output_tokens)
+    await limiter.acquire(reserved, current_priority() if priority is None else priority)
+
+    call: Dict[str, Any] = {"response": None}
+    try:
+        yield call
+    finally:
+        limiter.release(reserved, usage_tokens(call["response"]))
+
+
+def get_rate_limit_metrics() -> Dict[str, Any]:
+    """Metrics of every model limiter"""
+    return {
+        "models": [limiter.get_metrics() for limiter in _limiters.values()],
+        "max_queue": RATE_LIMIT_MAX_QUEUE,
+        "max_wait_seconds": RATE_LIMIT_MAX_WAIT_SECONDS
+    }
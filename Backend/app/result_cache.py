@@ -0,0 +1,189 @@
+"""
+Content-addressed cache for AI extraction results
+Persists Gemini results in the database, keyed by a hash of the normalized
+image bytes + prompt + model version, with TTL and size-bounded LRU eviction
+"""
+
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from decouple import config
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models import AIResultCache
+
+# Cache configuration
+AI_CACHE_ENABLED = config('AI_CACHE_ENABLED', default=True, cast=bool)
+AI_CACHE_TTL_HOURS = config('AI_CACHE_TTL_HOURS', default=720, cast=int)  # 30 days
+AI_CACHE_MAX_ENTRIES = config('AI_CACHE_MAX_ENTRIES', default=5000, cast=int)
+AI_CACHE_MAX_SIZE_MB = config('AI_CACHE_MAX_SIZE_MB', default=100, cast=int)
+
+# Run the eviction pass every N writes (the cache may exceed its budget by up to N entries meanwhile)
+AI_CACHE_EVICT_EVERY = config('AI_CACHE_EVICT_EVERY', default=50, cast=int)
+
+# Writes since the last eviction pass
+_writes_since_eviction = 0
+
+
+def make_cache_key(image_digest: str, prompt: str, model_name: str) -> str:
+    """
+    Build the cache key for one extraction
+    
+    Args:
+        image_digest: SHA-256 hex digest of the normalized (model-ready) image bytes
+        prompt: Prompt text sent with the image
+        model_name: Gemini model version
+        
+    Returns:
+        SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(hashlib.sha256(prompt.encode("utf-8")).digest())
+    digest.update(b"\0")
+    digest.update(image_digest.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cached_result(cache_key: str) -> Optional[Any]:
+    """
+    Look up a cached result
+    
+    Returns:
+        The cached result, or None on a miss or when the entry has expired
+    """
+    if not AI_CACHE_ENABLED:
+        return None
+    
+    db = SessionLocal()
+    try:
+        entry = db.query(AIResultCache).filter(AIResultCache.cache_key == cache_key).first()
+        if not entry:
+            return None
+        
+        # Expired entries are dropped on read
+        if entry.created_at and entry.created_at < datetime.utcnow() - timedelta(hours=AI_CACHE_TTL_HOURS):
+            db.delete(entry)
+            db.commit()
+            return None
+        
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_accessed_at = datetime.utcnow()
+        db.commit()
+        
+        return json.loads(entry.result_json)
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️  AI cache read failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+async def store_result(cache_key: str, extractor: str, model_name: str, result: Any) -> None:
+    """
+    Store a successful extraction result, enforcing the cache budget every
+    AI_CACHE_EVICT_EVERY writes
+    
+    The database work runs on a worker thread, off the event loop.
+    
+    Args:
+        cache_key: Key from make_cache_key
+        extractor: Extractor name (analyze, markdown, person, vehicle, ...)
+        model_name: Gemini model version
+        result: JSON-serializable result
+    """
+    global _writes_since_eviction
+    if not AI_CACHE_ENABLED:
+        return
+    
+    # Serialize here so later changes to result by the caller are not cached
+    try:
+        result_json = json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError) as e:
+        print(f"   ⚠️  AI cache write failed: {e}")
+        return
+    
+    _writes_since_eviction += 1
+    evict = _writes_since_eviction >= max(1, AI_CACHE_EVICT_EVERY)
+    if evict:
+        _writes_since_eviction = 0
+    
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, _store_result_sync, cache_key, extractor, model_name, result_json, evict)
+
+
+def _store_result_sync(cache_key: str, extractor: str, model_name: str, result_json: str, evict: bool) -> None:
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        
+        entry = db.query(AIResultCache).filter(AIResultCache.cache_key == cache_key).first()
+        if entry is None:
+            entry = AIResultCache(cache_key=cache_key)
+            db.add(entry)
+        
+        entry.extractor = extractor
+        entry.model_name = model_name
+        entry.result_json = result_json
+        entry.size_bytes = len(result_json.encode("utf-8"))
+        entry.created_at = now
+        entry.last_accessed_at = now
+        db.commit()
+        
+        if evict:
+            evict_entries(db)
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️  AI cache write failed: {e}")
+    finally:
+        db.close()
+
+
+def evict_entries(db) -> int:
+    """
+    Delete expired entries, then least recently used entries until the
+    cache is within AI_CACHE_MAX_ENTRIES and AI_CACHE_MAX_SIZE_MB
+    
+    Returns:
+        Number of deleted entries
+    """
+    deleted = db.query(AIResultCache).filter(
+        AIResultCache.created_at < datetime.utcnow() - timedelta(hours=AI_CACHE_TTL_HOURS)
+    ).delete(synchronize_session=False)
+    
+    count, total_size = db.query(
+        func.count(AIResultCache.cache_key),
+        func.coalesce(func.sum(AIResultCache.size_bytes), 0)
+    ).one()
+    max_bytes = AI_CACHE_MAX_SIZE_MB * 1024 * 1024
+    
+    if count > AI_CACHE_MAX_ENTRIES or total_size > max_bytes:
+        # Oldest access first
+        lru_entries = db.query(AIResultCache.cache_key, AIResultCache.size_bytes)\
+            .order_by(AIResultCache.last_accessed_at)\
+            .yield_per(200)
+        
+        to_delete = []
+        for cache_key, size_bytes in lru_entries:
+            if count <= AI_CACHE_MAX_ENTRIES and total_size <= max_bytes:
+                break
+            to_delete.append(cache_key)
+            count -= 1
+            total_size -= size_bytes or 0
+        
+        if to_delete:
+            deleted += db.query(AIResultCache)\
+                .filter(AIResultCache.cache_key.in_(to_delete))\
+                .delete(synchronize_session=False)
+    
+    db.commit()
+    
+    if deleted:
+        print(f"   🧹 AI cache evicted {deleted} entries")
+    
+    return deleted
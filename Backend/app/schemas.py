@@ -149,6 +149,24 @@ class TokenResponse(BaseModel):
 class UploadResponse(BaseModel):
     """Response for document upload"""
     document_id: str
+    duplicate_of: Optional[str] = None  # Earlier document whose pages/analysis were reused
+
+class BatchUploadItem(BaseModel):
+    """One file of a batch upload"""
+    filename: str
+    status: str  # UPLOADED, ERROR
+    document_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    error: Optional[str] = None
+    jobs: Dict[str, str] = {}  # analysis (person, vehicle, general, auto) -> job id
+    job_errors: Dict[str, str] = {}  # analysis -> why its job could not be queued
+
+class BatchUploadResponse(BaseModel):
+    """Manifest returned by the batch upload endpoint"""
+    total: int
+    succeeded: int
+    failed: int
+    items: List[BatchUploadItem]
 
 class ProcessingRequest(BaseModel):
     """Request for document processing"""
@@ -156,13 +174,28 @@ class ProcessingRequest(BaseModel):
 
 class JobResponse(BaseModel):
     """Response for job status"""
-    status: str  # PROCESSING, DONE, ERROR
+    status: str  # QUEUED, PROCESSING, DONE, ERROR
     progress: int  # 0-100
+    job_id: Optional[str] = None
+    document_id: Optional[str] = None
+    job_type: Optional[str] = None
+    error_message: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class JobEnqueueResponse(BaseModel):
+    """Response when a job is queued for background processing"""
+    job_id: str
+    document_id: str
+    status: str
 
 class PageResponse(BaseModel):
     """Response for document page"""
     page_index: int
-    image_url: str
+    image_url: str  # Original page image
+    thumbnail_url: Optional[str] = None  # Small WebP thumbnail
+    screen_url: Optional[str] = None  # Screen-resolution WebP for the viewer
+    analysis_image_url: Optional[str] = None  # JPEG sent to the model
 
 class DocumentResponse(BaseModel):
     """Response for document metadata"""
@@ -0,0 +1,93 @@
+"""
+Single-flight coalescing for in-progress model calls
+Concurrent requests for the same (document/page, extractor) await one
+shared call instead of each paying for their own. Only calls that are
+still running are shared; finished results live in the result cache and
+the database.
+
+The shared call runs at the best rate-limit priority of its callers: an
+interactive request joining a background job's call raises the priority
+of the model calls it makes from then on (calls already waiting in the
+rate limiter keep their place).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.rate_limiter import SharedPriority, ai_priority, current_priority
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time and hands its result (or
+    exception) to every caller that asked for the same key meanwhile
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._priorities: Dict[Hashable, SharedPriority] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run call() for key, or join the call already running for key
+
+        The shared call runs as its own task, so a caller that disconnects
+        does not cancel it for the others.
+
+        Args:
+            key: Identity of the work, e.g. (document_id, page_index, "person")
+            call: Zero-argument callable returning the coroutine to run
+
+        Returns:
+            Result of the shared call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            # The task copies this context; the shared priority lets later callers raise it
+            priority = SharedPriority(current_priority())
+            with ai_priority(priority):
+                task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            self._priorities[key] = priority
+            self.started += 1
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced += 1
+            self._priorities[key].raise_to(current_priority())
+            print(f"   🔗 Joined in-flight {self.name} call for {key}")
+
+        return await asyncio.shield(task)
+
+    async def join(self, key: Hashable) -> Optional[Any]:
+        """
+        Await the call running for key, if any
+
+        Returns:
+            Its result, or None when nothing is running for key
+        """
+        task = self._calls.get(key)
+        if task is None:
+            return None
+        self.coalesced += 1
+        self._priorities[key].raise_to(current_priority())
+        print(f"   🔗 Waiting for in-flight {self.name} call for {key}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._priorities[key]
+        # Retrieve the exception so an unjoined failure is not logged as "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """In-flight, started and coalesced call counts"""
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
+
+
+# Shared by the extraction endpoints, jobs and the extract-auto router
+extraction_flights = SingleFlight("extraction")
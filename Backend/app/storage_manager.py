@@ -0,0 +1,315 @@
+"""
+Indexed storage manager for files under data/
+Tracks every stored file in the stored_assets table with its size, last
+access time and reference count, keeps per-kind totals in storage_counters
+and evicts least recently used unreferenced files to stay within budget
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from decouple import config
+
+from app.database import SessionLocal
+from app.models import Document, Page, StorageCounter, StoredAsset
+
+# Storage budget (all tracked files together)
+STORAGE_MAX_SIZE_MB = config('STORAGE_MAX_SIZE_MB', default=2048, cast=int)
+STORAGE_MAX_ASSETS = config('STORAGE_MAX_ASSETS', default=10000, cast=int)
+
+# Asset kinds
+ASSET_UPLOAD = "upload"  # Original uploaded file
+ASSET_PAGE = "page"  # Page image created at upload (PDF pages, DOCX previews)
+ASSET_RENDER = "render"  # Lazily rendered page image (re-rendered after eviction)
+
+# Directories indexed on first start
+_INDEXED_DIRS = {"data/docs": ASSET_UPLOAD, "data/images": ASSET_PAGE}
+
+
+def normalize_asset_path(path: str) -> str:
+    """Canonical key for a stored file (relative, normalized separators)"""
+    return os.path.normpath(path).replace(os.sep, "/")
+
+
+def asset_path_from_url(url: Optional[str]) -> Optional[str]:
+    """
+    Map a /data/... URL to its stored file path (None for other URLs)
+    """
+    if not url or not url.startswith('/data/'):
+        return None
+    return normalize_asset_path(f"data/{url[6:]}")
+
+
+def _adjust_counter(db, kind: str, count_delta: int, bytes_delta: int) -> None:
+    """Add to the running totals of one asset kind"""
+    counter = db.query(StorageCounter).filter(StorageCounter.kind == kind).first()
+    if counter is None:
+        counter = StorageCounter(kind=kind, asset_count=0, total_bytes=0)
+        db.add(counter)
+        db.flush()
+    counter.asset_count = (counter.asset_count or 0) + count_delta
+    counter.total_bytes = (counter.total_bytes or 0) + bytes_delta
+
+
+def _upsert_asset(db, path: str, kind: str, references: int) -> Optional[StoredAsset]:
+    """
+    Track a file (or add references to an already tracked one)
+    Returns None when the file does not exist
+    """
+    path = normalize_asset_path(path)
+    now = datetime.utcnow()
+
+    asset = db.query(StoredAsset).filter(StoredAsset.path == path).first()
+    if asset is None:
+        if not os.path.exists(path):
+            return None
+        size = os.path.getsize(path)
+        asset = StoredAsset(
+            path=path,
+            kind=kind,
+            size_bytes=size,
+            ref_count=0,
+            created_at=now
+        )
+        db.add(asset)
+        db.flush()
+        _adjust_counter(db, kind, 1, size)
+
+    asset.ref_count = max(0, (asset.ref_count or 0) + references)
+    asset.last_accessed_at = now
+    return asset
+
+
+def register_assets(paths: Iterable[str], kind: str, references: int = 1) -> None:
+    """
+    Track stored files and add a reference to each, then enforce the budget
+
+    Each document holds one reference on every distinct file it uses.
+
+    Args:
+        paths: File paths (relative to the backend directory)
+        kind: Asset kind (upload, page, render)
+        references: References to add per file (0 for cache files)
+    """
+    db = SessionLocal()
+    try:
+        for path in dict.fromkeys(normalize_asset_path(p) for p in paths if p):
+            _upsert_asset(db, path, kind, references)
+        db.commit()
+
+        enforce_storage_budget(db)
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️  Storage index update failed: {e}")
+    finally:
+        db.close()
+
+
+def add_references(paths: Iterable[str], delta: int = 1) -> None:
+    """
+    Add (or with a negative delta, release) references on tracked files
+    Released files become eligible for eviction when no references remain
+    """
+    db = SessionLocal()
+    try:
+        keys = list(dict.fromkeys(normalize_asset_path(p) for p in paths if p))
+        if not keys:
+            return
+        for asset in db.query(StoredAsset).filter(StoredAsset.path.in_(keys)).all():
+            asset.ref_count = max(0, (asset.ref_count or 0) + delta)
+            asset.last_accessed_at = datetime.utcnow()
+        db.commit()
+
+        if delta < 0:
+            enforce_storage_budget(db)
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️  Storage reference update failed: {e}")
+    finally:
+        db.close()
+
+
+def touch_asset(path: str, kind: str = ASSET_RENDER) -> None:
+    """
+    Record an access to a file, tracking it (unreferenced) if it is new
+    """
+    db = SessionLocal()
+    try:
+        path = normalize_asset_path(path)
+        is_new = db.query(StoredAsset.path).filter(StoredAsset.path == path).first() is None
+
+        asset = _upsert_asset(db, path, kind, references=0)
+        db.commit()
+
+        if asset is not None and is_new:
+            # Newly tracked file may push storage over budget
+            enforce_storage_budget(db)
+    except Exception as e:
+        db.rollback()
+        print(f"   ⚠️  Storage access update failed: {e}")
+    finally:
+        db.close()
+
+
+def _remove_asset(db, asset: StoredAsset) -> None:
+    """Delete a tracked file and its index entry"""
+    try:
+        if os.path.exists(asset.path):
+            os.remove(asset.path)
+    except OSError as e:
+        print(f"  ⚠️  Failed to delete {asset.path}: {e}")
+    _adjust_counter(db, asset.kind, -1, -(asset.size_bytes or 0))
+    db.delete(asset)
+
+
+def enforce_storage_budget(db=None) -> int:
+    """
+    Evict least recently used unreferenced files until storage is within
+    STORAGE_MAX_ASSETS and STORAGE_MAX_SIZE_MB
+    Files still referenced by a document are never deleted.
+
+    Returns:
+        Number of evicted files
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        totals = get_storage_totals(db)
+        count, total_bytes = totals["asset_count"], totals["total_bytes"]
+        max_bytes = STORAGE_MAX_SIZE_MB * 1024 * 1024
+
+        if count <= STORAGE_MAX_ASSETS and total_bytes <= max_bytes:
+            return 0
+
+        # Oldest access first, only files no document uses
+        candidates = db.query(StoredAsset)\
+            .filter(StoredAsset.ref_count <= 0)\
+            .order_by(StoredAsset.last_accessed_at)\
+            .limit(500)\
+            .all()
+
+        evicted = 0
+        for asset in candidates:
+            if count <= STORAGE_MAX_ASSETS and total_bytes <= max_bytes:
+                break
+            count -= 1
+            total_bytes -= asset.size_bytes or 0
+            _remove_asset(db, asset)
+            evicted += 1
+
+        db.commit()
+
+        if evicted:
+            print(f"🧹 Storage evicted {evicted} unreferenced files")
+        if count > STORAGE_MAX_ASSETS or total_bytes > max_bytes:
+            print(f"⚠️  Storage still over budget ({count} files, {total_bytes / (1024 * 1024):.1f}MB)")
+
+        return evicted
+    finally:
+        if own_session:
+            db.close()
+
+
+def get_storage_totals(db) -> Dict[str, Any]:
+    """
+    Totals from the counters table (one row per kind, no filesystem access)
+    """
+    by_kind = {
+        counter.kind: {"asset_count": counter.asset_count or 0, "total_bytes": counter.total_bytes or 0}
+        for counter in db.query(StorageCounter).all()
+    }
+    return {
+        "asset_count": sum(k["asset_count"] for k in by_kind.values()),
+        "total_bytes": sum(k["total_bytes"] for k in by_kind.values()),
+        "by_kind": by_kind
+    }
+
+
+def get_storage_stats(recent_limit: int = 10) -> Dict[str, Any]:
+    """
+    Storage statistics for the stats endpoint
+    """
+    db = SessionLocal()
+    try:
+        totals = get_storage_totals(db)
+        max_bytes = STORAGE_MAX_SIZE_MB * 1024 * 1024
+
+        recent: List[StoredAsset] = db.query(StoredAsset)\
+            .order_by(StoredAsset.created_at.desc())\
+            .limit(recent_limit)\
+            .all()
+
+        return {
+            "total_assets": totals["asset_count"],
+            "total_size_mb": round(totals["total_bytes"] / (1024 * 1024), 2),
+            "by_kind": {
+                kind: {
+                    "count": info["asset_count"],
+                    "size_mb": round(info["total_bytes"] / (1024 * 1024), 2)
+                }
+                for kind, info in totals["by_kind"].items()
+            },
+            "max_assets": STORAGE_MAX_ASSETS,
+            "max_size_mb": STORAGE_MAX_SIZE_MB,
+            "over_budget": totals["asset_count"] > STORAGE_MAX_ASSETS or totals["total_bytes"] > max_bytes,
+            "recent_assets": [
+                {
+                    "path": asset.path,
+                    "kind": asset.kind,
+                    "size_mb": round((asset.size_bytes or 0) / (1024 * 1024), 2),
+                    "ref_count": asset.ref_count,
+                    "created": asset.created_at.isoformat() if asset.created_at else None,
+                    "last_accessed": asset.last_accessed_at.isoformat() if asset.last_accessed_at else None
+                }
+                for asset in recent
+            ]
+        }
+    finally:
+        db.close()
+
+
+def bootstrap_storage_index() -> int:
+    """
+    Index files already on disk the first time the storage manager runs
+    Reference counts are derived from Document.file_path and Page.image_url.
+
+    Returns:
+        Number of indexed files (0 when the index already exists)
+    """
+    db = SessionLocal()
+    try:
+        if db.query(StorageCounter).first() is not None:
+            return 0
+
+        # Count documents per referenced file
+        references: Dict[str, set] = {}
+        for document_id, file_path in db.query(Document.id, Document.file_path).all():
+            if file_path:
+                references.setdefault(normalize_asset_path(file_path), set()).add(document_id)
+        for document_id, image_url in db.query(Page.document_id, Page.image_url).all():
+            path = asset_path_from_url(image_url)
+            if path:
+                references.setdefault(path, set()).add(document_id)
+
+        indexed = 0
+        for directory, kind in _INDEXED_DIRS.items():
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if not entry.is_file() or entry.name.endswith('.part'):
+                    continue
+                path = normalize_asset_path(entry.path)
+                asset = _upsert_asset(db, path, kind, references=len(references.get(path, ())))
+                if asset is not None:
+                    indexed += 1
+
+        # Counter rows mark the index as built, even for an empty data/ dir
+        for kind in (ASSET_UPLOAD, ASSET_PAGE, ASSET_RENDER):
+            _adjust_counter(db, kind, 0, 0)
+        db.commit()
+
+        print(f"📦 Indexed {indexed} stored files")
+        enforce_storage_budget(db)
+        return indexed
+    finally:
+        db.close()
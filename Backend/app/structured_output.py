@@ -0,0 +1,249 @@
+"""
+Structured output for the JSON extractors
+Response schemas (built from the extractor field lists) make Gemini return
+schema-constrained JSON, so responses parse with a single json.loads. When
+that still fails (truncated output, a fence or prose around the object), a
+tolerant single-pass parser recovers the complete part of the object.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from decouple import config
+
+# Request schema-constrained JSON (response MIME type + response schema)
+AI_STRUCTURED_OUTPUT = config('AI_STRUCTURED_OUTPUT', default=True, cast=bool)
+
+# Extractor field lists (same order as the prompts' JSON formats)
+PERSON_INFO_FIELDS = (
+    "fullName", "dateOfBirth", "gender", "idNumber", "address", "phone", "email",
+    "placeOfOrigin", "nationality", "issueDate", "expiryDate", "documentType",
+)
+VEHICLE_INFO_FIELDS = (
+    "vehicleType", "licensePlate", "chassisNumber", "engineNumber", "brand", "model",
+    "manufacturingYear", "color", "engineCapacity", "registrationDate", "ownerName",
+    "ownerAddress", "documentType",
+)
+DOCUMENT_CATEGORIES = ("person", "vehicle", "general")
+REGIONS = ("Bac", "Trung", "Nam", "Unknown")
+ADDRESS_TYPES = ("thuong_tru", "tam_tru", "unknown")
+
+
+def _string(nullable: bool = False, enum: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    schema: Dict[str, Any] = {"type": "string"}
+    if nullable:
+        schema["nullable"] = True
+    if enum:
+        schema["enum"] = list(enum)
+    return schema
+
+
+def _object(properties: Dict[str, Any], required: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    return {"type": "object", "properties": properties, "required": list(required or properties)}
+
+
+def _array(items: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "array", "items": items}
+
+
+def _fields_schema(fields: Sequence[str]) -> Dict[str, Any]:
+    """Object of nullable strings, one per field (missing values come back as null)"""
+    return _object({field: _string(nullable=True) for field in fields})
+
+
+_LABEL_VALUE = _object({"label": _string(), "value": _string()})
+
+# analyze / text-analyze (same keys as validate_json_schema)
+DOCUMENT_ANALYSIS_SCHEMA = _object({
+    "document_type": _string(),
+    "confidence": {"type": "number"},
+    "title": _string(nullable=True),
+    "summary": _string(),
+    "people": _array(_object({"name": _string(), "role": _string(nullable=True)}, required=["name"])),
+    "organizations": _array(_object({"name": _string()})),
+    "locations": _array(_object({"name": _string()})),
+    "dates": _array(_LABEL_VALUE),
+    "numbers": _array(_LABEL_VALUE),
+    "signature_detected": {"type": "boolean"},
+})
+
+DOCUMENT_COMBINED_SCHEMA = _object({
+    "structured": DOCUMENT_ANALYSIS_SCHEMA,
+    "markdown": _string(),
+})
+
+DOCUMENT_CLASSIFICATION_SCHEMA = _object({
+    "category": _string(enum=DOCUMENT_CATEGORIES),
+    "document_type": _string(),
+    "confidence": {"type": "number"},
+})
+
+PERSON_INFO_SCHEMA = _fields_schema(PERSON_INFO_FIELDS)
+VEHICLE_INFO_SCHEMA = _fields_schema(VEHICLE_INFO_FIELDS)
+
+INSURANCE_RECOMMENDATION_SCHEMA = _object({
+    "address": _object({
+        "text": _string(),
+        "type": _string(enum=ADDRESS_TYPES),
+        "region": _string(enum=REGIONS),
+    }),
+    "place_of_origin": _object({
+        "text": _string(),
+        "region": _string(enum=REGIONS),
+    }),
+    "recommended_packages": _array(_object({
+        "name": _string(),
+        "reason": _string(),
+        "priority": {"type": "number"},
+    })),
+})
+
+
+class TolerantJSONParser:
+    """
+    Incremental parser for a JSON object embedded in model output
+
+    Text can be fed in chunks (e.g. from a streamed response); every
+    character is looked at once. Anything before the first "{" (code
+    fences, prose) and after the matching "}" is ignored. If the output
+    ends early, the object is cut back to its last complete member and the
+    open arrays / objects are closed; unfinished objects are dropped.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._started = False
+        self._complete = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        # Last position the object can be cut at, and the containers open there
+        self._safe_end = 0
+        self._safe_stack: List[str] = []
+        self.repaired = False
+
+    def feed(self, chunk: str) -> None:
+        """Consume the next piece of the response text"""
+        for char in chunk:
+            if self._complete:
+                return
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+                # An empty array can stand in for a cut-off one; a nested
+                # object cannot (it would come back as {} with no fields)
+                if char == "[" or len(self._stack) == 1:
+                    self._mark_safe(len(self._buffer))
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                self._mark_safe(len(self._buffer))
+                if not self._stack:
+                    self._complete = True
+            elif char == ",":
+                # Everything before a separator is a complete member
+                self._mark_safe(len(self._buffer) - 1)
+
+    def _mark_safe(self, end: int) -> None:
+        self._safe_end = end
+        self._safe_stack = list(self._stack)
+
+    def result(self) -> Any:
+        """
+        Parse what has been fed so far
+
+        Raises:
+            json.JSONDecodeError: No object could be recovered
+        """
+        text = "".join(self._buffer)
+        if not self._started:
+            raise json.JSONDecodeError("No JSON object in response", text, 0)
+
+        if not self._complete:
+            # Truncated: drop the unfinished member, close the open containers
+            self.repaired = True
+            text = text[:self._safe_end].rstrip().rstrip(",") + "".join(reversed(self._safe_stack))
+
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            # Trailing commas are the other common defect; only scanned on this path
+            self.repaired = True
+            return json.loads(_strip_trailing_commas(text))
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing bracket (outside strings)"""
+    output: List[str] = []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]":
+            while output and output[-1] in " \t\r\n":
+                output.pop()
+            if output and output[-1] == ",":
+                output.pop()
+        output.append(char)
+    return "".join(output)
+
+
+def parse_json_response(
+    response_text: str,
+    label: str = "",
+    schema: Optional[Dict[str, Any]] = None
+) -> Tuple[Any, bool]:
+    """
+    Parse a model response as JSON
+
+    Schema-constrained responses are plain JSON and take the fast path;
+    anything else goes through TolerantJSONParser.
+
+    Args:
+        response_text: Model response text
+        label: Extractor name for log messages
+        schema: Response schema; a repaired object missing any of its
+            required top-level keys counts as unparseable
+
+    Returns:
+        Tuple of (parsed value, complete); complete is False when a
+        truncated or malformed response was repaired (don't cache it)
+
+    Raises:
+        json.JSONDecodeError: Nothing usable could be recovered
+    """
+    try:
+        return json.loads(response_text), True
+    except json.JSONDecodeError:
+        pass
+
+    parser = TolerantJSONParser()
+    parser.feed(response_text)
+    result = parser.result()
+    if parser.repaired and schema is not None:
+        missing = [key for key in schema.get("required", []) if not isinstance(result, dict) or key not in result]
+        if missing:
+            raise json.JSONDecodeError(f"Incomplete response, missing {', '.join(missing)}", response_text, len(response_text))
+    if parser.repaired:
+        print(f"   ⚠️  Recovered incomplete JSON response{f' ({label})' if label else ''}")
+    return result, not parser.repaired
@@ -0,0 +1,150 @@
+"""
+Native PDF text-layer extraction
+Born-digital PDF pages (policy schedules, bank statements) already carry
+their text. For those pages the markdown is built locally from PyMuPDF
+text and layout, so the page never has to be rendered and OCR'd by Gemini.
+"""
+
+import statistics
+from typing import List, Optional
+from decouple import config
+
+try:
+    import fitz  # PyMuPDF
+    FITZ_AVAILABLE = True
+except ImportError:
+    FITZ_AVAILABLE = False
+
+from app.cpu_pool import run_cpu
+
+# Use the text layer instead of OCR when a page has one
+TEXT_LAYER_ENABLED = config('TEXT_LAYER_ENABLED', default=True, cast=bool)
+
+# Minimum non-whitespace characters for a text layer to count as usable
+TEXT_LAYER_MIN_CHARS = config('TEXT_LAYER_MIN_CHARS', default=200, cast=int)
+
+# Maximum share of undecodable characters (broken font encodings)
+_MAX_GARBAGE_RATIO = 0.02
+
+# Spans this much larger than the body text are treated as headings
+_HEADING_SIZE_RATIO = 1.3
+
+
+def _table_to_markdown(rows: List[List[Optional[str]]]) -> str:
+    """Format extracted table rows as a markdown table"""
+    rows = [[(cell or "").replace("\n", " ").replace("|", "\\|").strip() for cell in row] for row in rows if row]
+    if not rows:
+        return ""
+
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+def _inside_any(bbox, areas) -> bool:
+    """True if the center of bbox lies inside one of the areas"""
+    x = (bbox[0] + bbox[2]) / 2
+    y = (bbox[1] + bbox[3]) / 2
+    return any(area[0] <= x <= area[2] and area[1] <= y <= area[3] for area in areas)
+
+
+def is_usable_text(text: str) -> bool:
+    """
+    Check that extracted text is real content, not an empty or broken layer
+    """
+    content = "".join(text.split())
+    if len(content) < TEXT_LAYER_MIN_CHARS:
+        return False
+
+    garbage = content.count("�")
+    return garbage / len(content) <= _MAX_GARBAGE_RATIO
+
+
+def extract_page_markdown(pdf_path: str, page_number: int) -> Optional[str]:
+    """
+    Build markdown for one PDF page from its text layer (blocking)
+
+    Headings are detected from font size, tables with PyMuPDF's table
+    finder; everything else is kept as paragraphs in reading order.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_number: 1-based page number
+
+    Returns:
+        Markdown text, or None when the page has no usable text layer
+    """
+    if not FITZ_AVAILABLE:
+        return None
+
+    with fitz.open(pdf_path) as pdf_doc:
+        page = pdf_doc.load_page(page_number - 1)
+
+        # Cheap check first: scanned pages have little or no text
+        if not is_usable_text(page.get_text("text")):
+            return None
+
+        # Tables are emitted as markdown tables at their position on the page
+        table_areas = []
+        elements = []
+        try:
+            for table in page.find_tables().tables:
+                table_markdown = _table_to_markdown(table.extract())
+                if table_markdown:
+                    table_areas.append(tuple(table.bbox))
+                    elements.append((table.bbox[1], table.bbox[0], table_markdown))
+        except Exception as e:
+            print(f"   ⚠️  Table detection failed on page {page_number}: {e}")
+
+        blocks = [
+            block for block in page.get_text("dict", sort=True)["blocks"]
+            if block.get("type") == 0 and not _inside_any(block["bbox"], table_areas)
+        ]
+
+        span_sizes = [
+            round(span["size"], 1)
+            for block in blocks for line in block["lines"] for span in line["spans"]
+            if span["text"].strip()
+        ]
+        body_size = statistics.median(span_sizes) if span_sizes else 0
+
+        for block in blocks:
+            lines = []
+            block_size = 0
+            for line in block["lines"]:
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                if text:
+                    lines.append(text)
+                    block_size = max(block_size, max(span["size"] for span in line["spans"]))
+            if not lines:
+                continue
+
+            text = " ".join(lines)
+            if body_size and block_size >= body_size * _HEADING_SIZE_RATIO and len(text) <= 120:
+                text = f"## {text}"
+            elements.append((block["bbox"][1], block["bbox"][0], text))
+
+    # Reading order: top to bottom, then left to right
+    elements.sort(key=lambda element: (round(element[0]), element[1]))
+    return "\n\n".join(element[2] for element in elements)
+
+
+async def get_page_text_markdown(pdf_path: str, page_number: int) -> Optional[str]:
+    """
+    Extract the text-layer markdown of a PDF page on the CPU pool
+
+    Returns:
+        Markdown text, or None if the text layer is missing, unusable or
+        cannot be read
+    """
+    if not TEXT_LAYER_ENABLED or not FITZ_AVAILABLE:
+        return None
+
+    try:
+        return await run_cpu(extract_page_markdown, pdf_path, page_number)
+    except Exception as e:
+        print(f"   ⚠️  Text layer extraction failed for page {page_number}: {e}")
+        return None
@@ -0,0 +1,137 @@
+"""
+Streaming upload storage
+Writes uploads to disk in fixed-size chunks, enforcing the size limit,
+checking the file signature on the first chunk and hashing on the fly
+"""
+
+import hashlib
+import os
+from typing import Optional
+import aiofiles
+from decouple import config
+
+# Upload limits
+MAX_FILE_SIZE_MB = config('MAX_FILE_SIZE_MB', default=10, cast=int)
+UPLOAD_CHUNK_SIZE = config('UPLOAD_CHUNK_SIZE', default=1024 * 1024, cast=int)
+
+# Batch uploads: files per request and files ingested at the same time
+BATCH_UPLOAD_MAX_FILES = config('BATCH_UPLOAD_MAX_FILES', default=10, cast=int)
+BATCH_UPLOAD_CONCURRENCY = config('BATCH_UPLOAD_CONCURRENCY', default=3, cast=int)
+
+# Reuse stored pages and analysis when the same file is uploaded again
+UPLOAD_DEDUP_ENABLED = config('UPLOAD_DEDUP_ENABLED', default=True, cast=bool)
+
+# File extension -> accepted leading magic bytes
+_FILE_SIGNATURES = {
+    '.pdf': (b'%PDF-',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.docx': (b'PK\x03\x04',),  # DOCX is a ZIP container
+}
+
+
+class UploadRejected(Exception):
+    """
+    Upload refused while streaming (too large or content does not match)
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class StoredUpload:
+    """
+    Result of a streamed upload
+    """
+
+    def __init__(self, path: str, size: int, content_hash: str):
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+
+def sniff_file_extension(header: bytes) -> Optional[str]:
+    """
+    Detect the file type from its leading bytes
+
+    Returns:
+        Canonical extension ('.pdf', '.png', '.jpg', '.docx') or None if unknown
+    """
+    for ext in ('.pdf', '.png', '.jpg', '.docx'):
+        if any(header.startswith(signature) for signature in _FILE_SIGNATURES[ext]):
+            return ext
+    return None
+
+
+async def save_upload_stream(
+    upload,
+    destination: str,
+    file_ext: str,
+    max_bytes: Optional[int] = None
+) -> StoredUpload:
+    """
+    Stream an UploadFile to disk chunk by chunk
+
+    The file is written to a temporary ".part" path and only moved into
+    place once the whole upload passed the checks, so a rejected upload
+    never leaves a partial file behind.
+
+    Args:
+        upload: FastAPI UploadFile (anything with async read(size))
+        destination: Final file path
+        file_ext: Extension claimed by the filename (lowercase, with dot)
+        max_bytes: Size limit; defaults to MAX_FILE_SIZE_MB
+
+    Returns:
+        StoredUpload with the size and SHA-256 content hash
+
+    Raises:
+        UploadRejected: 413 when over the limit, 415 when the content does
+            not match file_ext, 400 for empty files
+    """
+    max_bytes = max_bytes or MAX_FILE_SIZE_MB * 1024 * 1024
+    partial_path = f"{destination}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(partial_path, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                if size == 0:
+                    # Reject mislabeled files before writing anything
+                    detected_ext = sniff_file_extension(chunk)
+                    expected_signatures = _FILE_SIGNATURES.get(file_ext, ())
+                    if not any(chunk.startswith(signature) for signature in expected_signatures):
+                        raise UploadRejected(
+                            f"File content does not match {file_ext} "
+                            f"(detected: {detected_ext or 'unknown'})",
+                            status_code=415
+                        )
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(
+                        f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB",
+                        status_code=413
+                    )
+
+                digest.update(chunk)
+                await f.write(chunk)
+
+        if size == 0:
+            raise UploadRejected("Empty file", status_code=400)
+
+        os.replace(partial_path, destination)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return StoredUpload(destination, size, digest.hexdigest())
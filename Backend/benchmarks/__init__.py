@@ -0,0 +1 @@
+# Document pipeline benchmarks
\ No newline at end of file
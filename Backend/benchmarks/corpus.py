@@ -0,0 +1,145 @@
+"""
+Synthetic benchmark corpus
+Born-digital and scanned PDFs, phone photos, card scans and DOCX files of
+varying page counts, generated from a fixed seed so every run (and every
+commit) measures the same inputs
+"""
+
+import io
+import os
+import random
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw
+from docx import Document as DocxDocument
+
+_WORDS = (
+    "hợp đồng bảo hiểm người được bảo hiểm quyền lợi nghĩa vụ số tiền phí thời hạn "
+    "điều khoản thiên tai bão lũ ngập lụt tài sản nhà ở phương tiện bồi thường "
+    "policy insured premium coverage claim effective date amount signature"
+).split()
+
+# Page / paragraph counts per corpus size
+PDF_TEXT_PAGES = {"quick": (1, 5), "full": (1, 5, 20, 50)}
+PDF_SCAN_PAGES = {"quick": (1, 3), "full": (1, 5, 20)}
+DOCX_PARAGRAPHS = {"quick": (20,), "full": (20, 200, 1000)}
+
+
+class CorpusFile:
+    """One generated input file"""
+
+    def __init__(self, name: str, path: str, kind: str, pages: int):
+        self.name = name
+        self.path = path
+        self.kind = kind  # pdf, scan, image, docx
+        self.pages = pages
+
+    @property
+    def content_type(self) -> str:
+        ext = os.path.splitext(self.path)[1].lower()
+        return {
+            ".pdf": "application/pdf",
+            ".png": "image/png",
+            ".jpg": "image/jpeg",
+            ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        }[ext]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"name": self.name, "kind": self.kind, "pages": self.pages, "bytes": os.path.getsize(self.path)}
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _scan_image(rng: random.Random, width: int, height: int) -> Image.Image:
+    """Page-like scan: off-white paper, text-line bars, a stamp, a little noise"""
+    image = Image.new("RGB", (width, height), (246, 244, 238))
+    draw = ImageDraw.Draw(image)
+    y = height // 12
+    while y < height - height // 12:
+        x = width // 12
+        while x < width - width // 12:
+            word = rng.randint(width // 40, width // 10)
+            draw.rectangle([x, y, x + word, y + height // 120], fill=(40, 40, 50))
+            x += word + width // 60
+        y += height // 40
+    cx, cy, r = int(width * 0.75), int(height * 0.85), width // 12
+    draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=(200, 30, 30), width=6)
+    for _ in range(width * height // 400):
+        draw.point((rng.randrange(width), rng.randrange(height)), fill=(rng.randint(150, 230),) * 3)
+    return image
+
+
+def _write_text_pdf(path: str, pages: int, rng: random.Random) -> None:
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 60), f"HỢP ĐỒNG BẢO HIỂM - Trang {number + 1}", fontsize=14)
+        text = "\n".join(_sentence(rng) for _ in range(40))
+        page.insert_textbox(fitz.Rect(72, 90, 540, 780), text, fontsize=9)
+    document.save(path)
+    document.close()
+
+
+def _write_scan_pdf(path: str, pages: int, rng: random.Random) -> None:
+    document = fitz.open()
+    for _ in range(pages):
+        buffer = io.BytesIO()
+        _scan_image(rng, 1240, 1754).save(buffer, "JPEG", quality=80)
+        page = document.new_page()
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    document.save(path)
+    document.close()
+
+
+def _write_docx(path: str, paragraphs: int, rng: random.Random) -> None:
+    document = DocxDocument()
+    document.add_heading("Hợp đồng bảo hiểm", level=1)
+    for number in range(paragraphs):
+        if number % 50 == 0:
+            document.add_heading(f"Điều {number // 50 + 1}", level=2)
+        document.add_paragraph(" ".join(_sentence(rng) for _ in range(3)))
+    table = document.add_table(rows=6, cols=3)
+    for row in table.rows:
+        for cell in row.cells:
+            cell.text = _sentence(rng, 3)
+    document.save(path)
+
+
+def build_corpus(output_dir: str, size: str = "full", seed: int = 42) -> List[CorpusFile]:
+    """
+    Generate the corpus (files already present are reused)
+
+    Args:
+        output_dir: Directory for the generated files
+        size: "quick" (small set for a smoke run) or "full"
+        seed: Random seed for the page content
+
+    Returns:
+        List of corpus files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    corpus = []
+
+    def add(name: str, kind: str, pages: int, writer) -> None:
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path):
+            # One generator per file, so reusing some files never shifts the content of others
+            writer(path, random.Random(f"{seed}:{name}"))
+        corpus.append(CorpusFile(name, path, kind, pages))
+
+    for pages in PDF_TEXT_PAGES[size]:
+        add(f"text_{pages}p.pdf", "pdf", pages, lambda p, rng, n=pages: _write_text_pdf(p, n, rng))
+    for pages in PDF_SCAN_PAGES[size]:
+        add(f"scan_{pages}p.pdf", "scan", pages, lambda p, rng, n=pages: _write_scan_pdf(p, n, rng))
+
+    add("card.png", "image", 1, lambda p, rng: _scan_image(rng, 1012, 638).save(p, "PNG"))
+    add("photo.jpg", "image", 1, lambda p, rng: _scan_image(rng, 3024, 4032).save(p, "JPEG", quality=90))
+
+    for paragraphs in DOCX_PARAGRAPHS[size]:
+        # Preview page count is only known after ingestion
+        add(f"docx_{paragraphs}.docx", "docx", 0, lambda p, rng, n=paragraphs: _write_docx(p, n, rng))
+
+    return corpus
@@ -0,0 +1,399 @@
+"""
+Document pipeline benchmarks
+Measures upload, PDF rasterization (fitz vs pdf2image), model-input image
+preprocessing, merge_page_results and the full analyze-auto endpoint
+against the fake model backend, on a synthetic corpus. Reports throughput,
+p50 / p95 / p99 latency and peak RSS, and writes the results as JSON so
+runs on different commits can be compared.
+
+Usage (from Backend/):
+    python -m benchmarks.run_benchmarks --quick
+    python -m benchmarks.run_benchmarks --iterations 10
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<earlier run>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# The benchmark runs in a scratch directory, so app modules must import from Backend/
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Defaults for a run; variables already set in the environment win
+BENCHMARK_ENV = {
+    "MODEL_BACKEND": "fake",
+    "FAKE_MODEL_RESPONSES_DIR": os.path.join(BACKEND_DIR, "mock", "responses"),
+    "FAKE_MODEL_LATENCY_MS": "200",
+    "FAKE_MODEL_JITTER_MS": "50",
+    "GEMINI_API_KEY": "benchmark",
+    # Every iteration must do the work: no result cache hits, no upload dedup
+    "AI_CACHE_ENABLED": "false",
+    "UPLOAD_DEDUP_ENABLED": "false",
+    # Measure the pipeline, not the free-tier quota
+    "RATE_LIMIT_RPM": "100000",
+    "RATE_LIMIT_TPM": "1000000000",
+    "RATE_LIMIT_RPD": "10000000",
+}
+
+# Settings recorded with the results (they change what is measured)
+_RECORDED_SETTINGS = tuple(key for key in BENCHMARK_ENV if key != "GEMINI_API_KEY") + (
+    "CPU_POOL_WORKERS", "PDF_RENDER_WORKERS", "PDF_RENDER_DPI",
+    "AI_MAX_CONCURRENT_CALLS", "AI_MAX_CONCURRENT_CALLS_PER_DOCUMENT", "AI_COMBINED_ANALYSIS",
+)
+
+# merge_page_results inputs (pages per document)
+MERGE_PAGE_COUNTS = {"quick": (1, 10, 100), "full": (1, 10, 100, 500)}
+
+# Cases slower than this (p50 or p95) are flagged by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Percentile with linear interpolation between the closest ranks"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(name: str, samples: List[float], pages: Optional[int] = None, **extra: Any) -> Dict[str, Any]:
+    """
+    Latency and throughput of one case
+
+    Args:
+        name: Case name (unique within its stage)
+        samples: Duration of each iteration in seconds
+        pages: Pages processed per iteration, for pages/s
+
+    Returns:
+        Case result dict (milliseconds, operations / pages per second)
+    """
+    total = sum(samples)
+    result = {
+        "name": name,
+        "iterations": len(samples),
+        "mean_ms": round(total / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "ops_per_s": round(len(samples) / total, 3) if total else None,
+    }
+    if pages:
+        result["pages"] = pages
+        result["pages_per_s"] = round(pages * len(samples) / total, 3) if total else None
+    result.update(extra)
+    print(f"   {name:<32} p50 {result['p50_ms']:>10.1f} ms   p95 {result['p95_ms']:>10.1f} ms   p99 {result['p99_ms']:>10.1f} ms")
+    return result
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Peak resident set size so far (of this process, or of the worker
+    processes that have exited when children=True)
+    """
+    if not RESOURCE_AVAILABLE:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def git_commit() -> Optional[str]:
+    """Current commit of the checkout, when run from a git working tree"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+async def time_async(call: Callable[[], Any], iterations: int) -> List[float]:
+    """Durations of iterations sequential awaits of call()"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def time_sync(call: Callable[[], Any], iterations: int) -> List[float]:
+    """Durations of iterations sequential calls of call()"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def bench_upload(client, corpus, iterations: int) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """POST /documents/upload per corpus file; returns the cases and a document per file"""
+    cases = []
+    documents = {}
+    for item in corpus:
+        with open(item.path, "rb") as f:
+            content = f.read()
+
+        async def upload():
+            response = await client.post("/documents/upload", files={"file": (item.name, content, item.content_type)})
+            response.raise_for_status()
+            documents[item.name] = response.json()["document_id"]
+
+        samples = await time_async(upload, iterations)
+        cases.append(summarize(item.name, samples, pages=item.pages or None, bytes=len(content)))
+    return cases, documents
+
+
+async def bench_rasterization(corpus, iterations: int) -> List[Dict[str, Any]]:
+    """process_pdf_to_images (fitz) vs process_pdf_alternative (pdf2image) per PDF"""
+    from main import process_pdf_alternative, process_pdf_to_images
+
+    # Without poppler, process_pdf_alternative silently falls back to fitz
+    pdf2image_ready = shutil.which("pdftoppm") is not None
+    if not pdf2image_ready:
+        print("   ⚠️  poppler (pdftoppm) not found, skipping the pdf2image cases")
+
+    cases = []
+    for item in corpus:
+        if item.kind not in ("pdf", "scan"):
+            continue
+        variants = [("fitz", process_pdf_to_images)]
+        if pdf2image_ready:
+            variants.append(("pdf2image", process_pdf_alternative))
+        for label, process in variants:
+            samples = await time_async(lambda: process(item.path, f"bench-{uuid.uuid4()}"), iterations)
+            cases.append(summarize(f"{item.name} [{label}]", samples, pages=item.pages))
+    return cases
+
+
+def bench_preprocessing(corpus, work_dir: str, iterations: int) -> List[Dict[str, Any]]:
+    """Model-input encoding and tier generation per image (in-process, no cache)"""
+    import fitz
+    from app.image_pipeline import encode_image_for_model
+    from app.image_tiers import IMAGE_TIERS, generate_tier_image
+
+    sources = [(item.name, item.path) for item in corpus if item.kind == "image"]
+
+    # A rendered scan page, as produced by rasterization
+    scans = [item for item in corpus if item.kind == "scan"]
+    if scans:
+        rendered = os.path.join(work_dir, "rendered_scan_page.png")
+        with fitz.open(scans[0].path) as document:
+            document[0].get_pixmap(dpi=150).save(rendered)
+        sources.append(("rendered_scan_page.png", rendered))
+
+    cases = []
+    for name, path in sources:
+        samples = time_sync(lambda: encode_image_for_model(path), iterations)
+        cases.append(summarize(f"{name} [model input]", samples, pages=1))
+        for tier in IMAGE_TIERS:
+            output_path = os.path.join(work_dir, f"tier_{tier}{IMAGE_TIERS[tier][0]}")
+            samples = time_sync(lambda: generate_tier_image(path, tier, output_path), iterations)
+            cases.append(summarize(f"{name} [{tier}]", samples, pages=1))
+    return cases
+
+
+def bench_merge(size: str, iterations: int) -> List[Dict[str, Any]]:
+    """merge_page_results over synthetic page results with overlapping entities"""
+    from main import merge_page_results
+
+    with open(os.path.join(BACKEND_DIR, "mock", "responses", "analyze.json"), encoding="utf-8") as f:
+        template = json.load(f)
+
+    rng = random.Random(7)
+    cases = []
+    for page_count in MERGE_PAGE_COUNTS[size]:
+        pages = []
+        for number in range(page_count):
+            page = json.loads(json.dumps(template))
+            # About a third of the entities repeat across pages, the rest are new
+            for key, field in (("people", "name"), ("organizations", "name"), ("locations", "name")):
+                page[key] = [{field: f"{entity[field]} {rng.randint(0, page_count * 2)}"} for entity in page[key] * 3]
+            page["numbers"] = [{"label": f"Row {number}-{i}", "value": str(rng.randint(0, 10 ** 6))} for i in range(20)]
+            pages.append(page)
+        # Fast case: more iterations for stable percentiles
+        samples = time_sync(lambda: merge_page_results(pages), iterations * 10)
+        cases.append(summarize(f"{page_count} pages", samples, pages=page_count))
+    return cases
+
+
+async def bench_analysis(client, corpus, documents: Dict[str, str], iterations: int) -> List[Dict[str, Any]]:
+    """POST /documents/{id}/analyze-auto per uploaded document (fake model backend)"""
+    cases = []
+    for item in corpus:
+        document_id = documents.get(item.name)
+        if not document_id:
+            continue
+        result = {}
+
+        async def analyze():
+            response = await client.post(f"/documents/{document_id}/analyze-auto", timeout=None)
+            response.raise_for_status()
+            result.update(response.json())
+
+        samples = await time_async(analyze, iterations)
+        cases.append(summarize(item.name, samples, pages=result.get("total_pages") or item.pages or None))
+    return cases
+
+
+async def run_benchmarks(corpus, work_dir: str, size: str, iterations: int) -> Dict[str, Any]:
+    """Run every stage inside one application lifespan"""
+    import httpx
+    import main
+    from app.cpu_pool import shutdown_cpu_pool
+
+    stages = {}
+    peak_rss = {}
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            print("\n📤 Upload")
+            stages["upload"], documents = await bench_upload(client, corpus, iterations)
+            peak_rss["upload"] = peak_rss_mb()
+
+            print("\n🖨️  Rasterization")
+            stages["rasterization"] = await bench_rasterization(corpus, iterations)
+            peak_rss["rasterization"] = peak_rss_mb()
+
+            print("\n🖼️  Image preprocessing")
+            stages["preprocessing"] = bench_preprocessing(corpus, work_dir, iterations)
+            peak_rss["preprocessing"] = peak_rss_mb()
+
+            print("\n🔀 merge_page_results")
+            stages["merge"] = bench_merge(size, iterations)
+            peak_rss["merge"] = peak_rss_mb()
+
+            print("\n🤖 analyze-auto (fake model backend)")
+            stages["analysis"] = await bench_analysis(client, corpus, documents, iterations)
+            peak_rss["analysis"] = peak_rss_mb()
+
+    # Worker processes only count towards RUSAGE_CHILDREN once they have exited
+    shutdown_cpu_pool()
+    peak_rss["cpu_pool_workers"] = peak_rss_mb(children=True)
+
+    return {"stages": stages, "peak_rss_mb": peak_rss}
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = REGRESSION_THRESHOLD) -> int:
+    """
+    Print p50 / p95 changes against an earlier run
+
+    Returns:
+        Number of cases that got slower than the threshold
+    """
+    print(f"\n📊 Compared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')})")
+    regressions = 0
+    for stage, cases in current["stages"].items():
+        earlier = {case["name"]: case for case in baseline.get("stages", {}).get(stage, [])}
+        for case in cases:
+            before = earlier.get(case["name"])
+            if not before:
+                continue
+            changes = []
+            slower = False
+            for key in ("p50_ms", "p95_ms"):
+                if before[key]:
+                    change = (case[key] - before[key]) / before[key]
+                    slower = slower or change > threshold
+                    changes.append(f"{key[:3]} {before[key]:.1f} → {case[key]:.1f} ms ({change:+.0%})")
+            regressions += slower
+            print(f"   {'⚠️ ' if slower else '  '} {stage}/{case['name']}: {', '.join(changes)}")
+    print(f"\n{'⚠️ ' if regressions else '✅'} {regressions} case(s) slower than {threshold:.0%}")
+    return regressions
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the document pipeline")
+    parser.add_argument("--quick", action="store_true", help="Small corpus (smoke run)")
+    parser.add_argument("--iterations", type=int, default=5, help="Iterations per case (default 5)")
+    parser.add_argument("--output", help="Result file (default benchmarks/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "ade-benchmark-corpus"),
+                        help="Where the synthetic corpus is generated (reused between runs)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory (database, rendered pages)")
+    args = parser.parse_args()
+
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+
+    from benchmarks.corpus import build_corpus
+
+    size = "quick" if args.quick else "full"
+    print(f"📚 Building {size} corpus in {args.corpus_dir}")
+    corpus = build_corpus(args.corpus_dir, size)
+
+    # The app keeps its database and files relative to the working directory
+    work_dir = tempfile.mkdtemp(prefix="ade-benchmark-")
+    for subdir in ("data/docs", "data/images"):
+        os.makedirs(os.path.join(work_dir, subdir))
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        measured = asyncio.run(run_benchmarks(corpus, work_dir, size, args.iterations))
+    finally:
+        os.chdir(previous_dir)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    results = {
+        "timestamp": timestamp,
+        "commit": commit,
+        "corpus_size": size,
+        "iterations": args.iterations,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: os.environ[key] for key in _RECORDED_SETTINGS if key in os.environ},
+        "corpus": [item.to_dict() for item in corpus],
+        **measured,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{timestamp.replace(':', '').replace('-', '')}_{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Results written to {output}")
+    print(f"   Peak RSS (MB): {results['peak_rss_mb']}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 1 if compare_results(results, json.load(f)) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -3,25 +3,25 @@ ADE Insurance Document Intelligence Backend API
 FastAPI server with mock AI processing capabilities
 """
 
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, Form, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from contextlib import asynccontextmanager
 import os
 import uuid
-import aiofiles
+import asyncio
 import time
 from datetime import datetime
-from typing import Optional, List
+from typing import Callable, Optional, List
+import importlib.util
 import json
+import unicodedata
 
-# PDF and Image processing imports
-try:
-    import fitz  # PyMuPDF
-    PDF_PROCESSING_AVAILABLE = True
-except ImportError:
-    PDF_PROCESSING_AVAILABLE = False
+# PDF and Image processing imports (PDF libraries are used by app.rasterizer;
+# only probe that they are installed)
+PDF_PROCESSING_AVAILABLE = importlib.util.find_spec("fitz") is not None  # PyMuPDF
+if not PDF_PROCESSING_AVAILABLE:
     print("Warning: PyMuPDF not installed. PDF processing will be limited.")
 
 try:
@@ -32,18 +32,14 @@ except ImportError:
     print("Warning: Pillow not installed. Image processing will be limited.")
 
 try:
-    from docx import Document as DocxDocument
     from docx.shared import Inches
     DOCX_PROCESSING_AVAILABLE = True
 except ImportError:
     DOCX_PROCESSING_AVAILABLE = False
     print("Warning: python-docx not installed. DOCX processing will be limited.")
 
-try:
-    from pdf2image import convert_from_path
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
-    PDF2IMAGE_AVAILABLE = False
+PDF2IMAGE_AVAILABLE = importlib.util.find_spec("pdf2image") is not None
+if not PDF2IMAGE_AVAILABLE:
     print("Warning: pdf2image not installed. Alternative PDF processing will be used.")
 
 from app.database import init_db, get_db
@@ -51,7 +47,10 @@ from app.models import Document, Job, Page, User, DisasterLocation
 from app.schemas import (
     DocumentResponse,
     JobResponse,
+    JobEnqueueResponse,
     UploadResponse,
+    BatchUploadItem,
+    BatchUploadResponse,
     RegionResponse,
     ProcessingRequest,
     UserRegister,
@@ -65,7 +64,50 @@ from app.schemas import (
     DisasterLocationUpdate
 )
 from app.weather_service import WeatherService
-from app.ai_service import analyze_auto_document, extract_markdown_content, get_image_path_from_url
+from app.ai_service import (
+    analyze_auto_document,
+    analyze_document_combined,
+    analyze_document_text,
+    extract_markdown_content,
+    get_image_path_from_url,
+    AI_COMBINED_ANALYSIS
+)
+from app.cpu_pool import run_cpu, shutdown_cpu_pool
+from app.page_scheduler import PageScheduler
+from app.rate_limiter import get_rate_limit_metrics
+from app.single_flight import extraction_flights
+from app.model_backend import get_model_backend
+from app.rasterizer import (
+    PDF_LAZY_RENDERING,
+    count_pdf_pages,
+    ensure_page_rendered,
+    lazy_page_url,
+    parse_lazy_page_url,
+    rasterize_pdf
+)
+from app.image_tiers import IMAGE_TIERS, ensure_tier_image, tier_media_type
+from app.job_queue import enqueue_job, register_job_handler, resume_pending_jobs
+from app.storage_manager import (
+    ASSET_PAGE,
+    ASSET_RENDER,
+    ASSET_UPLOAD,
+    add_references,
+    asset_path_from_url,
+    bootstrap_storage_index,
+    enforce_storage_budget,
+    get_storage_stats,
+    normalize_asset_path,
+    register_assets,
+    touch_asset
+)
+from app.text_layer import TEXT_LAYER_ENABLED, get_page_text_markdown
+from app.upload_storage import (
+    BATCH_UPLOAD_CONCURRENCY,
+    BATCH_UPLOAD_MAX_FILES,
+    UPLOAD_DEDUP_ENABLED,
+    UploadRejected,
+    save_upload_stream
+)
 from app.geo_analyst import GeoAnalyst, generate_gemini_prompt
 
 # JWT Configuration
@@ -91,6 +133,40 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 # Utility Functions
+def normalize_entity_text(text: str) -> str:
+    """
+    Normalize entity text for duplicate detection
+    Case-insensitive, whitespace-collapsed and without Vietnamese diacritics,
+    so "Nguyễn Văn  A" and "NGUYEN VAN A" are treated as the same entity
+    """
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+    stripped = stripped.replace('đ', 'd').replace('Đ', 'D')
+    return ' '.join(stripped.casefold().split())
+
+
+def entity_dedup_key(entity, fields) -> Optional[str]:
+    """
+    Get the normalized dedup key of an extracted entity
+    
+    Args:
+        entity: Entity string or dict from a page result
+        fields: Dict fields to try in order (e.g. ('name', 'label'))
+        
+    Returns:
+        Normalized key, or None for empty / unsupported entities
+    """
+    if isinstance(entity, dict):
+        value = next((entity.get(field) for field in fields if entity.get(field)), None)
+        text = str(value) if value is not None else json.dumps(entity, ensure_ascii=False, sort_keys=True)
+    elif isinstance(entity, str):
+        text = entity
+    else:
+        return None
+    
+    return normalize_entity_text(text) or None
+
+
 def merge_page_results(page_results: List[dict]) -> dict:
     """
     Merge analysis results from multiple pages into a single result
@@ -140,57 +216,50 @@ def merge_page_results(page_results: List[dict]) -> dict:
     titles = []
     summaries = []
     
+    # Normalized keys already collected, one set per entity kind (O(1) lookups)
+    seen_people = set()
+    seen_organizations = set()
+    seen_locations = set()
+    seen_dates = set()
+    seen_numbers = set()
+    
     for page_result in page_results:
         # Collect people (can be strings or dicts)
-        if 'people' in page_result and page_result['people']:
-            for person in page_result['people']:
-                if isinstance(person, dict):
-                    # If dict, try to get name field
-                    person_str = person.get('name') or person.get('label') or str(person)
-                    if person_str and person_str not in [p if isinstance(p, str) else p.get('name', '') for p in all_people]:
-                        all_people.append(person)
-                elif isinstance(person, str) and person not in [p if isinstance(p, str) else p.get('name', '') for p in all_people]:
-                    all_people.append(person)
+        for person in page_result.get('people') or []:
+            key = entity_dedup_key(person, ('name', 'label'))
+            if key and key not in seen_people:
+                seen_people.add(key)
+                all_people.append(person)
         
         # Collect organizations (can be strings or dicts)
-        if 'organizations' in page_result and page_result['organizations']:
-            for org in page_result['organizations']:
-                if isinstance(org, dict):
-                    org_str = org.get('name') or org.get('label') or str(org)
-                    if org_str and org_str not in [o if isinstance(o, str) else o.get('name', '') for o in all_organizations]:
-                        all_organizations.append(org)
-                elif isinstance(org, str) and org not in [o if isinstance(o, str) else o.get('name', '') for o in all_organizations]:
-                    all_organizations.append(org)
-        
-        # Collect locations
-        if 'locations' in page_result and page_result['locations']:
-            for loc in page_result['locations']:
-                if isinstance(loc, str) and loc not in all_locations:
-                    all_locations.append(loc)
-                elif isinstance(loc, dict):
-                    loc_str = loc.get('name') or loc.get('label') or str(loc)
-                    if loc_str not in all_locations:
-                        all_locations.append(loc_str)
+        for org in page_result.get('organizations') or []:
+            key = entity_dedup_key(org, ('name', 'label'))
+            if key and key not in seen_organizations:
+                seen_organizations.add(key)
+                all_organizations.append(org)
+        
+        # Collect locations (dicts are flattened to their name)
+        for loc in page_result.get('locations') or []:
+            if isinstance(loc, dict):
+                loc = loc.get('name') or loc.get('label') or str(loc)
+            key = entity_dedup_key(loc, ())
+            if key and key not in seen_locations:
+                seen_locations.add(key)
+                all_locations.append(loc)
         
         # Collect dates
-        if 'dates' in page_result and page_result['dates']:
-            for date in page_result['dates']:
-                if isinstance(date, dict):
-                    date_str = date.get('value') or date.get('label') or str(date)
-                    if date_str and date_str not in [d if isinstance(d, str) else d.get('value', '') for d in all_dates]:
-                        all_dates.append(date)
-                elif isinstance(date, str) and date not in [d if isinstance(d, str) else d.get('value', '') for d in all_dates]:
-                    all_dates.append(date)
+        for date in page_result.get('dates') or []:
+            key = entity_dedup_key(date, ('value', 'label'))
+            if key and key not in seen_dates:
+                seen_dates.add(key)
+                all_dates.append(date)
         
         # Collect numbers
-        if 'numbers' in page_result and page_result['numbers']:
-            for num in page_result['numbers']:
-                if isinstance(num, dict):
-                    num_str = num.get('value') or num.get('label') or str(num)
-                    if num_str and num_str not in [n if isinstance(n, str) else n.get('value', '') for n in all_numbers]:
-                        all_numbers.append(num)
-                elif isinstance(num, str) and num not in [n if isinstance(n, str) else n.get('value', '') for n in all_numbers]:
-                    all_numbers.append(num)
+        for num in page_result.get('numbers') or []:
+            key = entity_dedup_key(num, ('value', 'label'))
+            if key and key not in seen_numbers:
+                seen_numbers.add(key)
+                all_numbers.append(num)
         
         # Check for signatures
         if page_result.get('signature_detected', False):
@@ -254,35 +323,15 @@ def merge_page_results(page_results: List[dict]) -> dict:
 async def process_pdf_to_images(pdf_path: str, document_id: str) -> List[str]:
     """
     Convert PDF pages to individual images
+    Pages are rendered one at a time on the render pool (no page limit)
     Returns list of image URLs (relative to /data/)
     """
     if not PDF_PROCESSING_AVAILABLE:
         # Fallback: return original PDF path
         return [f"/data/docs/{document_id}.pdf"]
     
-    image_urls = []
-    
     try:
-        # Open PDF
-        pdf_doc = fitz.open(pdf_path)
-        
-        for page_num in range(len(pdf_doc)):
-            # Get page
-            page = pdf_doc.load_page(page_num)
-            
-            # Convert to image (150 DPI for good quality and reasonable file size)
-            mat = fitz.Matrix(1.5, 1.5)  # 1.5x zoom = ~150 DPI
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Save as PNG in images folder
-            image_filename = f"{document_id}_page_{page_num + 1}.png"
-            image_path = f"data/images/{image_filename}"
-            pix.save(image_path)
-            
-            # Return URL path
-            image_urls.append(f"/data/images/{image_filename}")
-            
-        pdf_doc.close()
+        image_urls = await rasterize_pdf(pdf_path, document_id, backend="fitz")
         
         # If no pages were processed, return fallback
         if not image_urls:
@@ -305,100 +354,43 @@ async def process_image_file(image_path: str, document_id: str, page_index: int
     file_ext = os.path.splitext(image_path)[1]
     return f"/data/images/{document_id}{file_ext}"
 
-async def process_docx_to_images(docx_path: str, document_id: str) -> List[str]:
+async def process_docx_document(docx_path: str, document_id: str):
     """
-    Convert DOCX pages to individual images
-    Returns list of image URLs (relative to /data/)
+    Convert a DOCX into paginated preview images with per-page markdown
+    Text, tables and embedded images are extracted in full on the worker pool
+    
+    Returns:
+        Tuple of (pages, embedded_image_paths); pages is a list of
+        (image_url, page_markdown). Falls back to a single page pointing at
+        the DOCX file with no markdown.
     """
-    if not DOCX_PROCESSING_AVAILABLE:
-        # Fallback: return original DOCX path
-        return [f"/data/docs/{document_id}.docx"]
+    fallback = ([(f"/data/docs/{document_id}.docx", None)], [])
     
-    image_urls = []
+    if not DOCX_PROCESSING_AVAILABLE or not IMAGE_PROCESSING_AVAILABLE:
+        return fallback
     
     try:
-        # For DOCX, we'll create a preview image of the first page
-        # This is a simplified approach - in production you might want to use more sophisticated methods
+        from app.docx_ingest import ingest_docx_async
         
-        # Load DOCX document
-        doc = DocxDocument(docx_path)
-        
-        # Create a simple preview by extracting text and creating an image
-        # For now, we'll just create one preview image
-        preview_filename = f"{document_id}_preview.png"
-        preview_path = f"data/images/{preview_filename}"
-        
-        # Create a simple text-based preview image
-        if IMAGE_PROCESSING_AVAILABLE:
-            from PIL import Image, ImageDraw, ImageFont
-            
-            # Get document text (first few paragraphs)
-            text_content = ""
-            paragraph_count = 0
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip() and paragraph_count < 10:  # First 10 paragraphs
-                    text_content += paragraph.text.strip() + "\n\n"
-                    paragraph_count += 1
-            
-            if not text_content:
-                text_content = "DOCX Document Preview\n\nDocument contains formatted content."
-            
-            # Create image with text
-            img_width, img_height = 800, 1000
-            img = Image.new('RGB', (img_width, img_height), color='white')
-            draw = ImageDraw.Draw(img)
-            
-            try:
-                # Try to use a system font
-                font = ImageFont.load_default()
-            except:
-                font = None
-            
-            # Draw text with word wrapping
-            y_position = 50
-            lines = text_content.split('\n')
-            for line in lines[:30]:  # Limit to 30 lines
-                if y_position > img_height - 50:
-                    break
-                draw.text((50, y_position), line[:80], fill='black', font=font)  # Limit line length
-                y_position += 25
-            
-            # Save preview image
-            img.save(preview_path, "PNG")
-            image_urls.append(f"/data/images/{preview_filename}")
-        else:
-            # If PIL not available, return DOCX file path
-            return [f"/data/docs/{document_id}.docx"]
+        pages, image_paths = await ingest_docx_async(docx_path, document_id)
+        return (pages, image_paths) if pages else fallback
         
     except Exception as e:
         print(f"Error processing DOCX: {e}")
-        # Fallback: return original DOCX path
-        return [f"/data/docs/{document_id}.docx"]
-    
-    return image_urls if image_urls else [f"/data/docs/{document_id}.docx"]
+        return fallback
 
 async def process_pdf_alternative(pdf_path: str, document_id: str) -> List[str]:
     """
     Alternative PDF processing using pdf2image
+    Pages are converted one at a time (first_page == last_page), no page limit
     Returns list of image URLs (relative to /data/)
     """
     if not PDF2IMAGE_AVAILABLE:
         return await process_pdf_to_images(pdf_path, document_id)
     
-    image_urls = []
-    
     try:
-        # Convert PDF pages to images using pdf2image
-        images = convert_from_path(pdf_path, dpi=150, first_page=1, last_page=10)  # Limit to first 10 pages
+        image_urls = await rasterize_pdf(pdf_path, document_id, backend="pdf2image")
         
-        for i, image in enumerate(images):
-            image_filename = f"{document_id}_page_{i + 1}.png"
-            image_path = f"data/images/{image_filename}"
-            
-            # Save image
-            image.save(image_path, "PNG")
-            image_urls.append(f"/data/images/{image_filename}")
-            
         # If no pages were processed, fallback
         if not image_urls:
             return [f"/data/docs/{document_id}.pdf"]
@@ -410,6 +402,64 @@ async def process_pdf_alternative(pdf_path: str, document_id: str) -> List[str]:
     
     return image_urls
 
+async def resolve_page_image_path(page: Page, tier: Optional[str] = None) -> Optional[str]:
+    """
+    Get the local image path of a page, rendering lazy PDF pages on first use
+    
+    Args:
+        page: Page row (its document must be loadable from the session)
+        tier: Optional image tier ("thumbnail", "screen", "model", "classify"); None for
+            the original page image. Falls back to the original if the tier
+            cannot be generated.
+        
+    Returns:
+        Local file path, or None if the image is unavailable
+    """
+    lazy_page = parse_lazy_page_url(page.image_url)
+    if lazy_page is None:
+        image_path = get_image_path_from_url(page.image_url)
+        if not image_path or not os.path.exists(image_path):
+            return image_path
+        touch_asset(image_path, ASSET_PAGE)
+    else:
+        document_id, page_number = lazy_page
+        pdf_path = page.document.file_path if page.document else None
+        pdf_path = pdf_path or f"data/docs/{document_id}.pdf"
+        
+        try:
+            image_path = await ensure_page_rendered(pdf_path, document_id, page_number)
+        except Exception as e:
+            print(f"   ❌ Failed to render page {page_number} of {document_id}: {e}")
+            return None
+        
+        # Rendered pages are unreferenced cache entries, evicted LRU over budget
+        touch_asset(image_path, ASSET_RENDER)
+    
+    if tier is None:
+        return image_path
+    
+    try:
+        tier_path = await ensure_tier_image(image_path, tier)
+    except Exception as e:
+        print(f"   ⚠️  Failed to create {tier} image for {image_path}: {e}")
+        return image_path
+    
+    # Tiers are derived cache files, regenerated after eviction
+    touch_asset(tier_path, ASSET_RENDER)
+    return tier_path
+
+
+def page_tier_urls(document_id: str, page: Page) -> dict:
+    """
+    Image URLs of every tier of a page (served by the page image endpoint)
+    """
+    base_url = lazy_page_url(document_id, page.page_index + 1)
+    return {
+        "thumbnail_url": f"{base_url}?tier=thumbnail",
+        "screen_url": f"{base_url}?tier=screen",
+        "analysis_image_url": f"{base_url}?tier=model"
+    }
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -417,8 +467,13 @@ async def lifespan(app: FastAPI):
     # Create data directories if they don't exist
     os.makedirs("data/docs", exist_ok=True)
     os.makedirs("data/images", exist_ok=True)
+    # Index files stored before the storage manager existed (first start only)
+    bootstrap_storage_index()
+    # Pick up jobs queued before a restart (in-process worker only)
+    await resume_pending_jobs()
     yield
     # Shutdown (cleanup if needed)
+    shutdown_cpu_pool()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -856,66 +911,131 @@ async def get_profile_completion(token: str):
 
 # ==================== Document Endpoints ====================
 
-def cleanup_old_images(max_images: int = 30):
+def page_assets_available(document: Document, pages: List[Page]) -> bool:
     """
-    Cleanup old images when exceeding max_images limit
-    Deletes oldest images first to keep storage under control
+    Check that the stored file and page images of a document still exist
+    (lazy PDF pages only need the PDF, they are re-rendered on demand)
     """
-    try:
-        image_dir = "data/images"
-        
-        # Get all image files with their modification time
-        image_files = []
-        for filename in os.listdir(image_dir):
-            file_path = os.path.join(image_dir, filename)
-            if os.path.isfile(file_path) and filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                mod_time = os.path.getmtime(file_path)
-                image_files.append((file_path, mod_time, filename))
-        
-        # Check if cleanup is needed
-        total_images = len(image_files)
-        if total_images <= max_images:
-            print(f"📊 Image count: {total_images}/{max_images} - No cleanup needed")
-            return
-        
-        # Sort by modification time (oldest first)
-        image_files.sort(key=lambda x: x[1])
-        
-        # Calculate how many to delete
-        images_to_delete = total_images - max_images
-        
-        print(f"🧹 Starting cleanup: {total_images} images found, deleting {images_to_delete} oldest images...")
-        
-        # Delete oldest images
-        deleted_count = 0
-        for file_path, mod_time, filename in image_files[:images_to_delete]:
-            try:
-                os.remove(file_path)
-                deleted_count += 1
-                print(f"  🗑️  Deleted: {filename}")
-            except Exception as e:
-                print(f"  ⚠️  Failed to delete {filename}: {e}")
+    if not document.file_path or not os.path.exists(document.file_path):
+        return False
+    
+    for page in pages:
+        if parse_lazy_page_url(page.image_url):
+            continue
+        image_path = get_image_path_from_url(page.image_url)
+        if not image_path or not os.path.exists(image_path):
+            return False
+    
+    return bool(pages)
+
+
+def get_document_asset_paths(db, document: Document, include_file: bool = True) -> List[str]:
+    """
+    Stored files a document uses: its uploaded file and eagerly created
+    page images (lazy PDF pages are render cache, not references)
+    """
+    paths = [document.file_path] if include_file and document.file_path else []
+    for (image_url,) in db.query(Page.image_url).filter(Page.document_id == document.id).all():
+        path = asset_path_from_url(image_url)
+        if path and path != normalize_asset_path(document.file_path or ""):
+            paths.append(path)
+    return paths
+
+
+def find_reusable_document(db, content_hash: str) -> Optional[Document]:
+    """
+    Find an earlier upload of the same file whose assets can be shared
+    Prefers already analyzed documents, then the most recent upload
+    
+    Args:
+        db: Database session
+        content_hash: SHA-256 of the uploaded file
         
-        remaining = total_images - deleted_count
-        print(f"✅ Cleanup complete: Deleted {deleted_count} images, {remaining} remaining")
+    Returns:
+        Source document, or None if there is no usable duplicate
+    """
+    candidates = db.query(Document)\
+        .filter(Document.content_hash == content_hash)\
+        .order_by(Document.created_at.desc())\
+        .all()
+    
+    # Analyzed documents first (stable sort keeps most recent first)
+    candidates.sort(key=lambda d: d.status != "DONE")
+    
+    for candidate in candidates:
+        pages = db.query(Page).filter(Page.document_id == candidate.id).order_by(Page.page_index).all()
+        if page_assets_available(candidate, pages):
+            return candidate
+    
+    return None
+
+
+def clone_document(db, source: Document, document_id: str, filename: str) -> Document:
+    """
+    Create a new document that shares the stored file and page images of
+    source and starts with a copy of its analysis results
+    
+    Args:
+        db: Database session
+        source: Earlier upload of the same file
+        document_id: ID of the new document
+        filename: Filename of the new upload
         
-    except Exception as e:
-        print(f"❌ Cleanup error: {e}")
-        import traceback
-        traceback.print_exc()
+    Returns:
+        The new (uncommitted) document
+    """
+    analyzed = source.status == "DONE"
+    document = Document(
+        id=document_id,
+        filename=filename,
+        status="DONE" if analyzed else "NOT_STARTED",
+        created_at=datetime.utcnow(),
+        file_path=source.file_path,
+        page_count=source.page_count,
+        content_hash=source.content_hash,
+        ai_result_json=source.ai_result_json if analyzed else None,
+        markdown_content=source.markdown_content if analyzed else None,
+        person_data=source.person_data,
+        vehicle_data=source.vehicle_data
+    )
+    db.add(document)
+    
+    source_pages = db.query(Page).filter(Page.document_id == source.id).order_by(Page.page_index).all()
+    for source_page in source_pages:
+        # Page images are shared: image_url keeps pointing at the source assets
+        db.add(Page(
+            document_id=document_id,
+            page_index=source_page.page_index,
+            image_url=source_page.image_url,
+            analysis_status=source_page.analysis_status,
+            ai_result_json=source_page.ai_result_json,
+            markdown_content=source_page.markdown_content,
+            analysis_error=source_page.analysis_error,
+            analyzed_at=source_page.analyzed_at,
+            has_text_layer=source_page.has_text_layer,
+            text_content=source_page.text_content
+        ))
+    
+    return document
 
 @app.post("/documents/upload", response_model=UploadResponse)
 async def upload_document(file: UploadFile = File(...)):
     """
     Upload a document file and create a new document record
     """
+    return await ingest_uploaded_file(file)
+
+
+async def ingest_uploaded_file(file: UploadFile) -> UploadResponse:
+    """
+    Store one uploaded file and create its document and page records
+    Shared by the single and batch upload endpoints
+    
+    Raises:
+        HTTPException: 400/413/415 for rejected files, 500 on failure
+    """
     db = get_db()
     try:
-        # 🧹 Cleanup old images if exceeding limit (only for image uploads)
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        if file_ext in ['.png', '.jpg', '.jpeg']:
-            cleanup_old_images(max_images=30)
-        
         # Generate unique document ID
         document_id = str(uuid.uuid4())
         
@@ -932,25 +1052,66 @@ async def upload_document(file: UploadFile = File(...)):
         else:
             file_path = f"data/images/{document_id}{file_ext}"
         
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        # Stream to disk in chunks (size limit, signature check, content hash)
+        try:
+            stored = await save_upload_stream(file, file_path, file_ext)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        
+        print(f"File saved to: {file_path} ({stored.size / 1024:.0f} KB, sha256 {stored.content_hash[:12]})")
         
-        print(f"File saved to: {file_path}")
+        # Same file uploaded before: reuse its stored file, pages and analysis
+        if UPLOAD_DEDUP_ENABLED:
+            source = find_reusable_document(db, stored.content_hash)
+            if source is not None:
+                os.remove(file_path)
+                clone_document(db, source, document_id, file.filename)
+                db.commit()
+                
+                # The new document holds its own reference on the shared files
+                add_references(get_document_asset_paths(db, source))
+                print(f"♻️  Duplicate of document {source.id} - reused stored pages and analysis")
+                return UploadResponse(document_id=document_id, duplicate_of=source.id)
         
         # Create document record in database
         document = Document(
             id=document_id,
             filename=file.filename,
             status="NOT_STARTED",
-            created_at=datetime.utcnow()
+            created_at=datetime.utcnow(),
+            file_path=file_path,
+            content_hash=stored.content_hash
         )
         db.add(document)
         
         print(f"Creating document record in database...")
         
         # Create page records based on file type
-        if file_ext == '.pdf':
+        if file_ext == '.pdf' and PDF_LAZY_RENDERING and PDF_PROCESSING_AVAILABLE:
+            # Lazy mode: store page count only, pages render on first view/analysis
+            try:
+                page_count = await count_pdf_pages(file_path)
+            except Exception as e:
+                print(f"PDF page count failed: {e}")
+                page_count = 0
+            
+            if page_count > 0:
+                document.page_count = page_count
+                for i in range(page_count):
+                    db.add(Page(
+                        document_id=document_id,
+                        page_index=i,
+                        image_url=lazy_page_url(document_id, i + 1)
+                    ))
+                print(f"PDF registered with {page_count} pages (rendered on demand)")
+            else:
+                # Fallback: single page pointing to PDF
+                db.add(Page(
+                    document_id=document_id,
+                    page_index=0,
+                    image_url=f"/data/docs/{document_id}{file_ext}"
+                ))
+        elif file_ext == '.pdf':
             # For PDF: try to extract pages, fallback to single page if failed
             try:
                 print(f"Processing PDF...")
@@ -980,28 +1141,19 @@ async def upload_document(file: UploadFile = File(...)):
                 )
                 db.add(page)
         elif file_ext == '.docx':
-            # For DOCX: try to create preview images
-            try:
-                print(f"Processing DOCX...")
-                image_urls = await process_docx_to_images(file_path, document_id)
-                print(f"DOCX processed into {len(image_urls)} pages")
-                # Create page for each preview image
-                for i, image_url in enumerate(image_urls):
-                    page = Page(
-                        document_id=document_id,
-                        page_index=i,
-                        image_url=image_url
-                    )
-                    db.add(page)
-            except Exception as e:
-                print(f"DOCX processing failed: {e}")
-                # Fallback: single page pointing to DOCX
-                page = Page(
+            # For DOCX: paginated previews, each page carrying its extracted markdown
+            print(f"Processing DOCX...")
+            docx_pages, docx_image_paths = await process_docx_document(file_path, document_id)
+            print(f"DOCX processed into {len(docx_pages)} pages")
+            for i, (image_url, page_markdown) in enumerate(docx_pages):
+                db.add(Page(
                     document_id=document_id,
-                    page_index=0,
-                    image_url=f"/data/docs/{document_id}{file_ext}"
-                )
-                db.add(page)
+                    page_index=i,
+                    image_url=image_url,
+                    # Analysis uses this text directly, like a PDF text layer
+                    has_text_layer=page_markdown is not None and bool(page_markdown.strip()),
+                    text_content=page_markdown
+                ))
         else:
             # For images: single page pointing to the image
             print(f"Processing image file...")
@@ -1013,6 +1165,13 @@ async def upload_document(file: UploadFile = File(...)):
             db.add(page)
         
         db.commit()
+        
+        # Track the stored files (evicts unreferenced files over budget)
+        register_assets([file_path], ASSET_UPLOAD)
+        register_assets(get_document_asset_paths(db, document, include_file=False), ASSET_PAGE)
+        if file_ext == '.docx':
+            register_assets(docx_image_paths, ASSET_PAGE)
+        
         print(f"✅ Document uploaded successfully: {document_id}")
         
         return UploadResponse(document_id=document_id)
@@ -1028,71 +1187,219 @@ async def upload_document(file: UploadFile = File(...)):
     finally:
         db.close()
 
-@app.get("/documents/images/stats")
-async def get_image_stats():
+# Analyses that can be queued per file of a batch upload -> job type
+BATCH_ANALYSIS_JOBS = {
+    "person": "extract-person",
+    "vehicle": "extract-vehicle",
+    "general": "analyze-auto",
+    "auto": "extract-auto",
+}
+
+
+def parse_batch_analyses(analyses: Optional[List[str]], file_count: int) -> List[List[str]]:
+    """
+    Resolve the analyses form field to one list of analyses per file
+    
+    A single value applies to every file; otherwise there must be one value
+    per file, in upload order. Each value is a comma-separated list of
+    person, vehicle, general and auto (empty for upload only).
+    """
+    values = analyses or []
+    if len(values) == 1:
+        values = values * file_count
+    elif values and len(values) != file_count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Got {len(values)} analyses values for {file_count} files; send one value or one per file"
+        )
+    
+    per_file = []
+    for value in values or [""] * file_count:
+        names = [name.strip().lower() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in BATCH_ANALYSIS_JOBS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown analysis '{unknown[0]}'. Use: {', '.join(BATCH_ANALYSIS_JOBS)}"
+            )
+        per_file.append(list(dict.fromkeys(names)))
+    return per_file
+
+
+@app.post("/documents/upload-batch", response_model=BatchUploadResponse)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    analyses: List[str] = Form([])
+):
+    """
+    Upload several documents in one request (e.g. CCCD, driver licence and
+    vehicle registration of one customer)
+    
+    Files are ingested concurrently (BATCH_UPLOAD_CONCURRENCY at a time) and
+    a failed file does not fail the batch. analyses optionally queues
+    background jobs per file: person, vehicle, general and/or auto
+    (classify pages and run only the matching extractor), either one
+    value for all files or one value per file, e.g. "person", "vehicle",
+    "person,general". Poll GET /jobs/{job_id} for each queued job.
+    """
+    if len(files) > BATCH_UPLOAD_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {BATCH_UPLOAD_MAX_FILES} per batch")
+    
+    file_analyses = parse_batch_analyses(analyses, len(files))
+    if AI_COMBINED_ANALYSIS:
+        job_types = dict(BATCH_ANALYSIS_JOBS, general="analyze-auto-combined")
+    else:
+        job_types = BATCH_ANALYSIS_JOBS
+    
+    print(f"📦 Batch upload of {len(files)} files")
+    semaphore = asyncio.Semaphore(max(1, BATCH_UPLOAD_CONCURRENCY))
+    
+    async def ingest(file: UploadFile, names: List[str]) -> BatchUploadItem:
+        filename = file.filename or "unnamed"
+        try:
+            async with semaphore:
+                uploaded = await ingest_uploaded_file(file)
+        except HTTPException as e:
+            return BatchUploadItem(filename=filename, status="ERROR", error=str(e.detail))
+        
+        # The file is stored already; a job that cannot be queued is reported on its item
+        jobs = {}
+        job_errors = {}
+        for name in names:
+            try:
+                jobs[name] = await enqueue_job(uploaded.document_id, job_types[name])
+            except Exception as e:
+                print(f"❌ Could not queue {name} analysis for {filename}: {str(e)}")
+                job_errors[name] = str(e)
+        
+        return BatchUploadItem(
+            filename=filename,
+            status="UPLOADED",
+            document_id=uploaded.document_id,
+            duplicate_of=uploaded.duplicate_of,
+            jobs=jobs,
+            job_errors=job_errors
+        )
+    
+    items = await asyncio.gather(*(ingest(file, names) for file, names in zip(files, file_analyses)))
+    succeeded = sum(1 for item in items if item.status == "UPLOADED")
+    print(f"✅ Batch upload done: {succeeded}/{len(items)} files uploaded")
+    
+    return BatchUploadResponse(
+        total=len(items),
+        succeeded=succeeded,
+        failed=len(items) - succeeded,
+        items=list(items)
+    )
+
+@app.get("/documents/{document_id}/pages/{page_number}/image")
+async def get_page_image(document_id: str, page_number: int, tier: Optional[str] = None):
     """
-    Get statistics about stored images
+    Serve a page image, rendering lazy PDF pages on first request
+    
+    tier: thumbnail (small WebP), screen (viewer WebP) or model (JPEG sent
+    to Gemini); omit for the original page image
     """
+    if tier is not None and tier not in IMAGE_TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown tier '{tier}'. Use one of: {', '.join(IMAGE_TIERS)}")
+    
+    db = get_db()
     try:
-        image_dir = "data/images"
-        
-        # Get all image files
-        image_files = []
-        total_size = 0
-        
-        for filename in os.listdir(image_dir):
-            file_path = os.path.join(image_dir, filename)
-            if os.path.isfile(file_path) and filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                size = os.path.getsize(file_path)
-                mod_time = os.path.getmtime(file_path)
-                image_files.append({
-                    "filename": filename,
-                    "size_mb": round(size / (1024 * 1024), 2),
-                    "modified": datetime.fromtimestamp(mod_time).isoformat()
-                })
-                total_size += size
+        page = db.query(Page)\
+            .filter(Page.document_id == document_id, Page.page_index == page_number - 1)\
+            .first()
         
-        # Sort by modification time (newest first)
-        image_files.sort(key=lambda x: x['modified'], reverse=True)
+        if not page:
+            raise HTTPException(status_code=404, detail="Page not found")
         
-        return {
-            "total_images": len(image_files),
-            "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "limit": 30,
-            "cleanup_needed": len(image_files) > 30,
-            "images_to_delete": max(0, len(image_files) - 30),
-            "recent_images": image_files[:10]  # Show 10 most recent
-        }
+        image_path = await resolve_page_image_path(page, tier=tier)
+        
+        if not image_path or not os.path.exists(image_path):
+            raise HTTPException(status_code=404, detail="Page image not available")
+        
+        # Tier images are immutable for a given page; let browsers cache them
+        if tier and image_path.endswith(IMAGE_TIERS[tier][0]):
+            return FileResponse(
+                image_path,
+                media_type=tier_media_type(tier),
+                headers={"Cache-Control": "public, max-age=86400"}
+            )
+        return FileResponse(image_path)
+    finally:
+        db.close()
+
+@app.get("/ai/rate-limits")
+async def get_rate_limit_status():
+    """
+    Rate limiter metrics per model: budgets, available capacity, queue
+    depth by priority, admitted / rejected calls and quota errors, plus
+    extraction calls shared between concurrent requests
+    """
+    metrics = get_rate_limit_metrics()
+    metrics["coalescing"] = extraction_flights.get_stats()
+    metrics["model_backend"] = get_model_backend().name
+    return metrics
+
+@app.get("/documents/images/stats")
+async def get_image_stats():
+    """
+    Get statistics about stored files (from the storage index, no directory scan)
+    """
+    try:
+        return get_storage_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
 @app.post("/documents/images/cleanup")
 async def trigger_cleanup():
     """
-    Manually trigger image cleanup
+    Manually enforce the storage budget
+    Only files no document references are evicted (least recently used first)
     """
     try:
-        cleanup_old_images(max_images=30)
-        
-        # Get updated stats
-        image_dir = "data/images"
-        remaining = len([f for f in os.listdir(image_dir) 
-                        if os.path.isfile(os.path.join(image_dir, f)) 
-                        and f.lower().endswith(('.jpg', '.jpeg', '.png'))])
+        evicted = enforce_storage_budget()
+        stats = get_storage_stats(recent_limit=0)
         
         return {
             "status": "success",
-            "remaining_images": remaining,
-            "limit": 30
+            "evicted_files": evicted,
+            "remaining_files": stats["total_assets"],
+            "total_size_mb": stats["total_size_mb"],
+            "max_assets": stats["max_assets"],
+            "max_size_mb": stats["max_size_mb"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cleanup failed: {str(e)}")
 
+def ensure_document_exists(document_id: str) -> None:
+    """
+    Raise 404 if the document does not exist (used before queueing jobs)
+    """
+    db = get_db()
+    try:
+        if not db.query(Document.id).filter(Document.id == document_id).first():
+            raise HTTPException(status_code=404, detail="Document not found")
+    finally:
+        db.close()
+
 @app.post("/documents/{document_id}/process")
-async def process_document(document_id: str):
+async def process_document(document_id: str, background: bool = False):
     """
     Process document using Gemini auto-analysis
     This replaces the old mock processing system
+    
+    Set background=true to queue processing and return a job id immediately
+    """
+    if background:
+        ensure_document_exists(document_id)
+        job_id = await enqueue_job(document_id, "process")
+        return JobEnqueueResponse(job_id=job_id, document_id=document_id, status="QUEUED")
+    
+    return await run_document_processing(document_id)
+
+async def run_document_processing(document_id: str) -> dict:
+    """
+    Analyze the first page of a document and save the result
     """
     db = get_db()
     try:
@@ -1107,12 +1414,9 @@ async def process_document(document_id: str):
         if not pages:
             raise HTTPException(status_code=404, detail="No pages found for this document")
         
-        # Get first page image URL
+        # Get first page image (rendered on demand for lazy PDF pages)
         first_page = pages[0]
-        image_url = first_page.image_url
-        
-        # Convert URL to local file path
-        image_path = get_image_path_from_url(image_url)
+        image_path = await resolve_page_image_path(first_page, tier="model")
         
         if not image_path:
             raise HTTPException(status_code=400, detail="Invalid image path")
@@ -1165,7 +1469,8 @@ async def get_document(document_id: str):
         pages_data = [
             {
                 "page_index": page.page_index,
-                "image_url": page.image_url
+                "image_url": page.image_url,
+                **page_tier_urls(document_id, page)
             }
             for page in pages
         ]
@@ -1261,111 +1566,242 @@ async def update_document_json(document_id: str, json_data: dict):
     finally:
         db.close()
 
-@app.post("/documents/{document_id}/analyze-auto")
-async def analyze_document_auto(document_id: str):
+async def analyze_page_image(scheduler: PageScheduler, image_path: str, page_num: int, combined: bool = False):
     """
-    Analyze document automatically using Gemini 2.5 Flash
-    For multi-page PDFs: analyzes each page separately and merges results
-    Extracts structured information and full text markdown
+    Run structured analysis and markdown extraction on one page image
+    
+    Returns:
+        Tuple of (page_result, page_markdown); either may be an Exception
     """
-    db = get_db()
-    try:
-        document = db.query(Document).filter(Document.id == document_id).first()
+    print(f"   🤖 Extracting structured data and markdown for page {page_num}...")
+    if combined:
+        # One model call returns both halves
+        try:
+            combined_result = await scheduler.run(lambda: analyze_document_combined(image_path))
+            return combined_result["structured"], combined_result["markdown"]
+        except Exception as e:
+            return e, e
+    
+    page_result, page_markdown = await asyncio.gather(
+        scheduler.run(lambda: analyze_auto_document(image_path)),
+        scheduler.run(lambda: extract_markdown_content(image_path)),
+        return_exceptions=True
+    )
+    return page_result, page_markdown
+
+async def get_page_text_layer(page: Page) -> Optional[str]:
+    """
+    Get the text-layer markdown of a PDF page, extracting it on first use
+    The result (or the absence of a usable text layer) is stored on the page
+    
+    Returns:
+        Markdown text, or None for scanned pages and non-PDF documents
+    """
+    if not TEXT_LAYER_ENABLED or page.has_text_layer is False:
+        return None
+    
+    if page.has_text_layer and page.text_content:
+        return page.text_content
+    
+    document = page.document
+    if not document or not document.file_path or not document.file_path.lower().endswith('.pdf'):
+        return None
+    
+    page_text = await get_page_text_markdown(document.file_path, page.page_index + 1)
+    page.has_text_layer = page_text is not None
+    page.text_content = page_text
+    return page_text
+
+async def analyze_page_concurrently(
+    scheduler: PageScheduler,
+    page: Page,
+    page_num: int,
+    total_pages: int,
+    combined: bool = False
+):
+    """
+    Run structured analysis and markdown extraction for one page concurrently
+    
+    Args:
+        scheduler: PageScheduler bounding in-flight model calls
+        page: Page row to analyze
+        page_num: 1-based page number
+        total_pages: Number of pages in the document
+        combined: Use a single combined structured + markdown model call
         
-        if not document:
-            raise HTTPException(status_code=404, detail="Document not found")
+    Returns:
+        Tuple of (page_result, markdown_with_header, error_message), or None if
+        the page image is missing; error_message is None when both calls succeed
+    """
+    print(f"\n📑 Processing page {page_num}/{total_pages}...")
+    print(f"   Image URL: {page.image_url}")
+    
+    # Born-digital PDF pages: markdown straight from the text layer, and a
+    # text-only model call for structured data (page is never rendered)
+    page_text = await get_page_text_layer(page)
+    
+    if page_text is not None:
+        print(f"   📝 Using PDF text layer for page {page_num} ({len(page_text)} chars)")
+        try:
+            page_result = await scheduler.run(lambda: analyze_document_text(page_text))
+        except Exception as e:
+            page_result = e
+        page_markdown = page_text
+    else:
+        # Convert URL to local file path (renders lazy PDF pages, model-input tier)
+        image_path = await resolve_page_image_path(page, tier="model")
         
-        # Get ALL pages for this document
-        pages = db.query(Page).filter(Page.document_id == document_id).order_by(Page.page_index).all()
+        if not image_path:
+            print(f"   ⚠️  Warning: Invalid image path for page {page_num}, skipping...")
+            return None
         
-        if not pages:
-            raise HTTPException(status_code=404, detail="No pages found for this document")
+        if not os.path.exists(image_path):
+            print(f"   ⚠️  Warning: Image file not found: {image_path}, skipping...")
+            return None
         
-        try:
-            # Update document status to processing
-            document.status = "PROCESSING"
-            db.commit()
-            
-            print(f"\n{'='*80}")
-            print(f"📄 Analyzing document: {document_id}")
+        page_result, page_markdown = await analyze_page_image(scheduler, image_path, page_num, combined)
+    
+    if isinstance(page_result, Exception):
+        print(f"   ❌ Error analyzing page {page_num}: {page_result}")
+        # Keep a placeholder so the page still shows up in the merged result
+        page_result = {
+            "page_number": page_num,
+            "error": str(page_result),
+            "document_type": "Error",
+            "confidence": 0.0,
+            "title": None,
+            "summary": f"Page {page_num} analysis failed",
+            "people": [],
+            "organizations": [],
+            "locations": [],
+            "dates": [],
+            "numbers": [],
+            "signature_detected": False
+        }
+        return page_result, f"\n\n---\n## Page {page_num}\n\n*Error extracting content from this page*\n", page_result["error"]
+    
+    # Add page number to result
+    page_result['page_number'] = page_num
+    
+    # The extractors report model, quota and parse failures in their result instead of raising
+    if page_result.get("error"):
+        print(f"   ❌ Error analyzing page {page_num}: {page_result['error']}")
+        return page_result, f"\n\n---\n## Page {page_num}\n\n*Error extracting content from this page*\n", str(page_result["error"])
+    print(f"   ✅ Structured data extracted for page {page_num}")
+    
+    if isinstance(page_markdown, str) and page_markdown.startswith("# Error"):
+        page_markdown = Exception(page_markdown[len("# Error"):].strip())
+    if isinstance(page_markdown, Exception):
+        print(f"   ❌ Error extracting markdown for page {page_num}: {page_markdown}")
+        return page_result, f"\n\n---\n## Page {page_num}\n\n*Error extracting content from this page*\n", str(page_markdown)
+    
+    # Add page separator and page number to markdown
+    if total_pages > 1:
+        markdown_with_header = f"\n\n---\n## Page {page_num}\n\n{page_markdown}"
+    else:
+        markdown_with_header = page_markdown
+    
+    print(f"   ✅ Markdown extracted for page {page_num} ({len(page_markdown)} chars)")
+    return page_result, markdown_with_header, None
+
+async def run_document_analysis(
+    document_id: str,
+    combined: bool = False,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    page_callback: Optional[Callable[[int, int, dict, str], None]] = None,
+    page_numbers: Optional[List[int]] = None
+) -> dict:
+    """
+    Analyze the pages of a document, merge the results and save them
+    Shared by the analyze-auto endpoint, the streaming endpoint, page retries
+    and background analysis jobs
+    
+    Each page result is stored on its Page row; the document result is
+    always re-merged from the stored results of every page.
+    
+    Args:
+        document_id: Document to analyze
+        combined: Use one combined structured + markdown call per page
+        progress_callback: Optional callback(completed_pages, total_pages)
+        page_callback: Optional callback(page_number, total_pages, page_result, page_markdown)
+            called as soon as each page finishes (in completion order)
+        page_numbers: 1-based page numbers to (re-)analyze; None analyzes all pages
+        
+    Returns:
+        Merged analysis result
+    """
+    db = get_db()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        # Get ALL pages for this document
+        pages = db.query(Page).filter(Page.document_id == document_id).order_by(Page.page_index).all()
+        
+        if not pages:
+            raise HTTPException(status_code=404, detail="No pages found for this document")
+        
+        if page_numbers is None:
+            selected = list(range(1, len(pages) + 1))
+        else:
+            selected = sorted(set(page_numbers))
+            invalid = [n for n in selected if n < 1 or n > len(pages)]
+            if invalid:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid page numbers {invalid} (document has {len(pages)} pages)"
+                )
+        
+        try:
+            # Update document status to processing
+            document.status = "PROCESSING"
+            db.commit()
+            
+            print(f"\n{'='*80}")
+            print(f"📄 Analyzing document: {document_id}")
             print(f"   Filename: {document.filename}")
             print(f"   Total pages: {len(pages)}")
+            if len(selected) < len(pages):
+                print(f"   Re-analyzing pages: {selected}")
+            print(f"   Mode: {'combined' if combined else 'separate'}")
             print(f"{'='*80}\n")
             
-            # Lists to collect results from all pages
-            all_page_results = []
-            all_markdown_parts = []
+            # Fan out structured + markdown extraction for the selected pages,
+            # bounded by the per-document and global in-flight limits
+            scheduler = PageScheduler()
+            completed_pages = 0
             
-            # Process each page
-            for idx, page in enumerate(pages):
-                page_num = idx + 1
-                print(f"\n📑 Processing page {page_num}/{len(pages)}...")
-                print(f"   Image URL: {page.image_url}")
-                
-                # Convert URL to local file path
-                image_path = get_image_path_from_url(page.image_url)
+            async def analyze_and_report(idx: int, page_num: int):
+                nonlocal completed_pages
+                page = pages[page_num - 1]
+                page_output = await analyze_page_concurrently(scheduler, page, page_num, len(pages), combined)
                 
-                if not image_path:
-                    print(f"   ⚠️  Warning: Invalid image path for page {page_num}, skipping...")
-                    continue
-                
-                if not os.path.exists(image_path):
-                    print(f"   ⚠️  Warning: Image file not found: {image_path}, skipping...")
-                    continue
+                # Persist the page result as soon as it is available
+                if page_output is None:
+                    page.analysis_status = "SKIPPED"
+                    page.ai_result_json = None
+                    page.markdown_content = None
+                    page.analysis_error = "Page image not found"
+                else:
+                    page_result, markdown_with_header, page_error = page_output
+                    page.analysis_status = "ERROR" if page_error else "DONE"
+                    page.ai_result_json = json.dumps(page_result, ensure_ascii=False)
+                    page.markdown_content = markdown_with_header
+                    page.analysis_error = page_error
+                page.analyzed_at = datetime.utcnow()
+                db.commit()
                 
-                try:
-                    # Analyze this page with Gemini (structured data)
-                    print(f"   🤖 Extracting structured data...")
-                    page_result = await analyze_auto_document(image_path)
-                    
-                    # Add page number to result
-                    page_result['page_number'] = page_num
-                    all_page_results.append(page_result)
-                    print(f"   ✅ Structured data extracted")
-                    
-                    # Extract markdown content (full text)
-                    print(f"   📝 Extracting markdown content...")
-                    page_markdown = await extract_markdown_content(image_path)
-                    
-                    # Add page separator and page number to markdown
-                    if len(pages) > 1:
-                        markdown_with_header = f"\n\n---\n## Page {page_num}\n\n{page_markdown}"
-                    else:
-                        markdown_with_header = page_markdown
-                    
-                    all_markdown_parts.append(markdown_with_header)
-                    print(f"   ✅ Markdown extracted ({len(page_markdown)} chars)")
-                    
-                except Exception as page_error:
-                    print(f"   ❌ Error analyzing page {page_num}: {page_error}")
-                    # Continue with next page even if this one fails
-                    all_page_results.append({
-                        "page_number": page_num,
-                        "error": str(page_error),
-                        "document_type": "Error",
-                        "confidence": 0.0,
-                        "title": None,
-                        "summary": f"Page {page_num} analysis failed",
-                        "people": [],
-                        "organizations": [],
-                        "locations": [],
-                        "dates": [],
-                        "numbers": [],
-                        "signature_detected": False
-                    })
-                    all_markdown_parts.append(f"\n\n---\n## Page {page_num}\n\n*Error extracting content from this page*\n")
+                completed_pages += 1
+                if page_callback and page_output is not None:
+                    page_callback(page_num, len(pages), page_output[0], page_output[1])
+                if progress_callback:
+                    progress_callback(completed_pages, len(selected))
             
-            # Merge results from all pages
-            print(f"\n📊 Merging results from {len(all_page_results)} pages...")
-            merged_result = merge_page_results(all_page_results)
+            await scheduler.map_pages(selected, analyze_and_report)
             
-            # Combine all markdown parts
-            full_markdown = "\n".join(all_markdown_parts).strip()
-            
-            # Add document summary at the top of markdown
-            if len(pages) > 1:
-                markdown_header = f"# {document.filename}\n\n**Total Pages:** {len(pages)}\n**Document Type:** {merged_result.get('document_type', 'Unknown')}\n"
-                full_markdown = markdown_header + full_markdown
+            merged_result, full_markdown = merge_stored_page_results(document, pages)
             
             print(f"   ✅ Merged result - Document type: {merged_result.get('document_type')}")
             print(f"   ✅ Total markdown length: {len(full_markdown)} chars")
@@ -1398,6 +1834,297 @@ async def analyze_document_auto(document_id: str):
         db.close()
 
 
+def merge_stored_page_results(document: Document, pages: List[Page]):
+    """
+    Merge the stored per-page results of a document in page order
+    
+    Args:
+        document: Document row
+        pages: All pages of the document, ordered by page_index
+        
+    Returns:
+        Tuple of (merged_result, full_markdown)
+    """
+    all_page_results = []
+    all_markdown_parts = []
+    
+    for page in pages:
+        # Skipped and not yet analyzed pages have no stored result
+        if not page.ai_result_json:
+            continue
+        all_page_results.append(json.loads(page.ai_result_json))
+        all_markdown_parts.append(page.markdown_content or "")
+    
+    # Merge results from all pages
+    print(f"\n📊 Merging results from {len(all_page_results)} pages...")
+    merged_result = merge_page_results(all_page_results)
+    
+    # Combine all markdown parts
+    full_markdown = "\n".join(all_markdown_parts).strip()
+    
+    # Add document summary at the top of markdown
+    if len(pages) > 1:
+        markdown_header = f"# {document.filename}\n\n**Total Pages:** {len(pages)}\n**Document Type:** {merged_result.get('document_type', 'Unknown')}\n"
+        full_markdown = markdown_header + full_markdown
+    
+    return merged_result, full_markdown
+
+
+@app.post("/documents/{document_id}/analyze-auto")
+async def analyze_document_auto(document_id: str, combined: Optional[bool] = None, background: bool = False):
+    """
+    Analyze document automatically using Gemini 2.5 Flash
+    For multi-page PDFs: analyzes each page separately and merges results
+    Extracts structured information and full text markdown
+    
+    Set combined=true (or AI_COMBINED_ANALYSIS=true) to get structured data
+    and markdown from a single model call per page
+    
+    Set background=true to queue the analysis and return a job id
+    immediately; poll GET /jobs/{job_id} for progress
+    """
+    if combined is None:
+        combined = AI_COMBINED_ANALYSIS
+    
+    if background:
+        ensure_document_exists(document_id)
+        job_id = await enqueue_job(document_id, "analyze-auto-combined" if combined else "analyze-auto")
+        return JobEnqueueResponse(job_id=job_id, document_id=document_id, status="QUEUED")
+    
+    return await run_document_analysis(document_id, combined)
+
+
+@app.get("/documents/{document_id}/pages/status")
+async def get_page_analysis_status(document_id: str):
+    """
+    Get the stored analysis status of every page
+    """
+    db = get_db()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        pages = db.query(Page).filter(Page.document_id == document_id).order_by(Page.page_index).all()
+        
+        return {
+            "document_id": document_id,
+            "status": document.status,
+            "pages": [
+                {
+                    "page_number": idx + 1,
+                    "page_index": page.page_index,
+                    "analysis_status": page.analysis_status or "NOT_STARTED",
+                    "error_message": page.analysis_error,
+                    "analyzed_at": page.analyzed_at.isoformat() if page.analyzed_at else None
+                }
+                for idx, page in enumerate(pages)
+            ]
+        }
+    finally:
+        db.close()
+
+
+@app.post("/documents/{document_id}/pages/retry-failed")
+async def retry_failed_pages(document_id: str, combined: Optional[bool] = None):
+    """
+    Re-analyze only the pages that failed (or were never analyzed),
+    then re-merge the document result from all stored page results
+    """
+    if combined is None:
+        combined = AI_COMBINED_ANALYSIS
+    
+    db = get_db()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        pages = db.query(Page).filter(Page.document_id == document_id).order_by(Page.page_index).all()
+        failed_pages = [
+            idx + 1 for idx, page in enumerate(pages)
+            if page.analysis_status in (None, "ERROR", "SKIPPED")
+        ]
+    finally:
+        db.close()
+    
+    if not failed_pages:
+        return {"retried_pages": [], "message": "No failed pages to retry"}
+    
+    merged_result = await run_document_analysis(document_id, combined, page_numbers=failed_pages)
+    return {"retried_pages": failed_pages, "result": merged_result}
+
+
+@app.post("/documents/{document_id}/pages/{page_number}/analyze")
+async def reanalyze_page(document_id: str, page_number: int, combined: Optional[bool] = None):
+    """
+    Re-analyze a single page (1-based page number) and re-merge the
+    document result from all stored page results
+    """
+    if combined is None:
+        combined = AI_COMBINED_ANALYSIS
+    
+    merged_result = await run_document_analysis(document_id, combined, page_numbers=[page_number])
+    return {"retried_pages": [page_number], "result": merged_result}
+
+
+def format_sse_event(event: str, data: dict) -> str:
+    """
+    Format one Server-Sent Events message
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Streamed analyses outliving their client (the event loop only keeps weak task references)
+_stream_analysis_tasks = set()
+
+
+@app.get("/documents/{document_id}/analyze-auto/stream")
+async def stream_document_analysis(document_id: str, combined: Optional[bool] = None):
+    """
+    Analyze document like /analyze-auto, streaming progress as Server-Sent Events
+    
+    Events:
+        page  - one per finished page (in completion order): page structured
+                result, markdown fragment and the running merged summary
+        done  - final merged result (same as /analyze-auto)
+        error - analysis failed
+    
+    The analysis keeps running and is saved even if the client disconnects.
+    """
+    if combined is None:
+        combined = AI_COMBINED_ANALYSIS
+    
+    ensure_document_exists(document_id)
+    
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_page(page_num: int, total_pages: int, page_result: dict, page_markdown: str):
+        events.put_nowait(("page", page_num, total_pages, page_result, page_markdown))
+    
+    async def run_analysis():
+        try:
+            merged_result = await run_document_analysis(document_id, combined, page_callback=on_page)
+            events.put_nowait(("done", merged_result))
+        except HTTPException as e:
+            events.put_nowait(("error", {"detail": e.detail}))
+        except Exception as e:
+            events.put_nowait(("error", {"detail": f"Analysis failed: {str(e)}"}))
+    
+    async def event_stream():
+        analysis_task = asyncio.create_task(run_analysis())
+        _stream_analysis_tasks.add(analysis_task)
+        analysis_task.add_done_callback(_stream_analysis_tasks.discard)
+        completed_results = []
+        
+        while True:
+            event = await events.get()
+            
+            if event[0] == "page":
+                _, page_num, total_pages, page_result, page_markdown = event
+                completed_results.append(page_result)
+                
+                # Running merge over the pages finished so far, in page order
+                running = merge_page_results(sorted(completed_results, key=lambda r: r.get('page_number', 0)))
+                running.pop('pages', None)
+                
+                yield format_sse_event("page", {
+                    "page_number": page_num,
+                    "total_pages": total_pages,
+                    "completed_pages": len(completed_results),
+                    "page_result": page_result,
+                    "markdown": page_markdown,
+                    "merged_summary": running
+                })
+            else:
+                yield format_sse_event(event[0], event[1])
+                break
+        
+        await analysis_task
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job_status(job_id: str):
+    """
+    Get background job status and progress (0-100)
+    """
+    db = get_db()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        return JobResponse(
+            job_id=job.id,
+            document_id=job.document_id,
+            job_type=job.job_type,
+            status=job.status,
+            progress=job.progress or 0,
+            error_message=job.error_message,
+            created_at=job.created_at,
+            updated_at=job.updated_at
+        )
+    finally:
+        db.close()
+
+
+async def _analyze_auto_job(document_id: str, progress_callback: Callable[[int, int], None]):
+    """Background job: full multi-page analysis"""
+    await run_document_analysis(document_id, combined=False, progress_callback=progress_callback)
+
+
+async def _analyze_auto_combined_job(document_id: str, progress_callback: Callable[[int, int], None]):
+    """Background job: full multi-page analysis with combined calls"""
+    await run_document_analysis(document_id, combined=True, progress_callback=progress_callback)
+
+
+async def _process_job(document_id: str, progress_callback: Callable[[int, int], None]):
+    """Background job: first-page analysis (/process)"""
+    await run_document_processing(document_id)
+    progress_callback(1, 1)
+
+
+async def _extract_person_job(document_id: str, progress_callback: Callable[[int, int], None]):
+    """Background job: person info extraction (batch uploads)"""
+    result = await extract_person_info_endpoint(document_id)
+    if "error" in result["person_info"]:
+        raise RuntimeError(result["person_info"]["error"])
+    progress_callback(1, 1)
+
+
+async def _extract_vehicle_job(document_id: str, progress_callback: Callable[[int, int], None]):
+    """Background job: vehicle info extraction (batch uploads)"""
+    result = await extract_vehicle_info_endpoint(document_id)
+    if "error" in result["vehicle_info"]:
+        raise RuntimeError(result["vehicle_info"]["error"])
+    progress_callback(1, 1)
+
+
+async def _extract_auto_job(document_id: str, progress_callback: Callable[[int, int], None]):
+    """Background job: classify pages and run the matching extractors"""
+    result = await extract_auto_endpoint(document_id)
+    for key in ("person_info", "vehicle_info"):
+        if result[key] and "error" in result[key]:
+            raise RuntimeError(result[key]["error"])
+    progress_callback(1, 1)
+
+
+register_job_handler("analyze-auto", _analyze_auto_job)
+register_job_handler("analyze-auto-combined", _analyze_auto_combined_job)
+register_job_handler("process", _process_job)
+register_job_handler("extract-person", _extract_person_job)
+register_job_handler("extract-vehicle", _extract_vehicle_job)
+register_job_handler("extract-auto", _extract_auto_job)
+
 @app.post("/documents/{document_id}/extract-person-info")
 async def extract_person_info_endpoint(document_id: str):
     """
@@ -1420,16 +2147,19 @@ async def extract_person_info_endpoint(document_id: str):
             raise HTTPException(status_code=400, detail="No image found for this document")
         
         # Get image path
-        from app.ai_service import get_image_path_from_url, extract_person_info
-        image_path = get_image_path_from_url(pages[0].image_url)
+        from app.ai_service import extract_person_info
+        image_path = await resolve_page_image_path(pages[0], tier="model")
         
         if not image_path or not os.path.exists(image_path):
             raise HTTPException(status_code=400, detail=f"Image file not found: {image_path}")
         
         print(f"   📷 Processing image: {image_path}")
         
-        # Extract person info using Gemini
-        person_info = await extract_person_info(image_path)
+        # Extract person info using Gemini (shared with concurrent requests for this page)
+        person_info = await extraction_flights.do(
+            (pages[0].id, "person"),
+            lambda: extract_person_info(image_path)
+        )
         
         if "error" in person_info:
             print(f"   ❌ Extraction error: {person_info['error']}")
@@ -1481,16 +2211,19 @@ async def extract_vehicle_info_endpoint(document_id: str):
             raise HTTPException(status_code=400, detail="No image found for this document")
         
         # Get image path
-        from app.ai_service import get_image_path_from_url, extract_vehicle_info
-        image_path = get_image_path_from_url(pages[0].image_url)
+        from app.ai_service import extract_vehicle_info
+        image_path = await resolve_page_image_path(pages[0], tier="model")
         
         if not image_path or not os.path.exists(image_path):
             raise HTTPException(status_code=400, detail=f"Image file not found: {image_path}")
         
         print(f"   📷 Processing image: {image_path}")
         
-        # Extract vehicle info using Gemini
-        vehicle_info = await extract_vehicle_info(image_path)
+        # Extract vehicle info using Gemini (shared with concurrent requests for this page)
+        vehicle_info = await extraction_flights.do(
+            (pages[0].id, "vehicle"),
+            lambda: extract_vehicle_info(image_path)
+        )
         
         if "error" in vehicle_info:
             print(f"   ❌ Extraction error: {vehicle_info['error']}")
@@ -1520,6 +2253,138 @@ async def extract_vehicle_info_endpoint(document_id: str):
         db.close()
 
 
+def merge_extracted_fields(results: List[dict]) -> Optional[dict]:
+    """
+    Merge person / vehicle extractions of several pages (e.g. front and
+    back of an ID card): the first non-null value of each field wins
+    """
+    valid = [result for result in results if "error" not in result]
+    if not valid:
+        return results[0] if results else None
+    
+    merged = {}
+    for result in valid:
+        for key, value in result.items():
+            if merged.get(key) in (None, "") and value not in (None, ""):
+                merged[key] = value
+            merged.setdefault(key, value)
+    return merged
+
+
+@app.post("/documents/{document_id}/extract-auto")
+async def extract_auto_endpoint(document_id: str, combined: Optional[bool] = None):
+    """
+    Classify every page and run only the matching extractor
+    
+    Pages are classified as person (CCCD / driver license / passport),
+    vehicle (registration) or general from their text layer (keywords,
+    MRZ) when they have one, otherwise with a small call on a downscaled
+    image. Person and vehicle pages go to the person / vehicle extractors,
+    general pages to the full analysis.
+    """
+    from app.ai_service import extract_person_info, extract_vehicle_info
+    from app.document_classifier import CATEGORY_GENERAL, CATEGORY_PERSON, CATEGORY_VEHICLE, classify_page
+    
+    db = get_db()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        pages = db.query(Page).filter(Page.document_id == document_id).order_by(Page.page_index).all()
+        if not pages:
+            raise HTTPException(status_code=400, detail="No pages found for this document")
+        
+        print(f"\n🧭 Classifying {len(pages)} pages of document {document_id}")
+        scheduler = PageScheduler()
+        
+        async def classify(idx: int, page: Page) -> dict:
+            page_text = await get_page_text_layer(page)
+            
+            async def load_image():
+                return await resolve_page_image_path(page, tier="classify")
+            
+            result = await classify_page(page_text, load_image, run_model=scheduler.run)
+            print(f"   Page {idx + 1}: {result['category']} ({result['source']}, {result.get('confidence', 0):.2f})")
+            return result
+        
+        classifications = await scheduler.map_pages(pages, classify)
+        db.commit()  # Keep text-layer detection for later analysis
+        
+        page_numbers = {CATEGORY_PERSON: [], CATEGORY_VEHICLE: [], CATEGORY_GENERAL: []}
+        for idx, result in enumerate(classifications):
+            page_numbers[result["category"]].append(idx + 1)
+        
+        async def extract(extractor, category: str, page_number: int) -> dict:
+            page = pages[page_number - 1]
+            image_path = await resolve_page_image_path(page, tier="model")
+            if not image_path or not os.path.exists(image_path):
+                return {"error": f"Image file not found for page {page_number}"}
+            # Callers joining an in-flight call do not take a scheduler slot
+            return await extraction_flights.do(
+                (page.id, category),
+                lambda: scheduler.run(lambda: extractor(image_path))
+            )
+        
+        person_results, vehicle_results = await asyncio.gather(
+            asyncio.gather(*(extract(extract_person_info, CATEGORY_PERSON, n) for n in page_numbers[CATEGORY_PERSON])),
+            asyncio.gather(*(extract(extract_vehicle_info, CATEGORY_VEHICLE, n) for n in page_numbers[CATEGORY_VEHICLE]))
+        )
+        
+        person_info = merge_extracted_fields(list(person_results))
+        vehicle_info = merge_extracted_fields(list(vehicle_results))
+        
+        import json
+        if person_info and "error" not in person_info:
+            document.person_data = json.dumps(person_info, ensure_ascii=False)
+        if vehicle_info and "error" not in vehicle_info:
+            document.vehicle_data = json.dumps(vehicle_info, ensure_ascii=False)
+        db.commit()
+        
+        analysis = None
+        if page_numbers[CATEGORY_GENERAL]:
+            if combined is None:
+                combined = AI_COMBINED_ANALYSIS
+            analysis = await run_document_analysis(
+                document_id,
+                combined,
+                page_numbers=page_numbers[CATEGORY_GENERAL]
+            )
+        
+        extractors = [category for category, numbers in page_numbers.items() if numbers]
+        print(f"   ✅ Routed pages to: {', '.join(extractors)}")
+        
+        return {
+            "document_id": document_id,
+            "pages": [
+                {
+                    "page_number": idx + 1,
+                    "category": result["category"],
+                    "document_type": result.get("document_type"),
+                    "confidence": result.get("confidence"),
+                    "source": result["source"],
+                    "reason": result.get("reason")
+                }
+                for idx, result in enumerate(classifications)
+            ],
+            "extractors": extractors,
+            "person_info": person_info,
+            "vehicle_info": vehicle_info,
+            "analysis": analysis,
+            "message": "Document classified and extracted successfully"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"\n❌ Automatic extraction failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+    finally:
+        db.close()
+
+
 @app.post("/documents/{document_id}/recommend-insurance")
 async def recommend_insurance_endpoint(document_id: str):
     """
@@ -1543,8 +2408,8 @@ async def recommend_insurance_endpoint(document_id: str):
             raise HTTPException(status_code=400, detail="No image found for this document")
         
         # Get image path
-        from app.ai_service import get_image_path_from_url, recommend_insurance_by_address, recommend_insurance_by_person_info
-        image_path = get_image_path_from_url(pages[0].image_url)
+        from app.ai_service import recommend_insurance_by_address, recommend_insurance_by_person_info
+        image_path = await resolve_page_image_path(pages[0], tier="model")
         
         if not image_path or not os.path.exists(image_path):
             raise HTTPException(status_code=400, detail=f"Image file not found: {image_path}")
@@ -1556,6 +2421,12 @@ async def recommend_insurance_endpoint(document_id: str):
         if document.person_data:
             import json
             person_data = json.loads(document.person_data)
+        else:
+            # A person extraction still running for this page (e.g. sent
+            # together with this request) gives placeOfOrigin without a second image call
+            person_data = await extraction_flights.join((pages[0].id, "person"))
+            if person_data and "error" in person_data:
+                person_data = None
         
         if person_data and person_data.get('placeOfOrigin'):
             # Use extracted person info
@@ -1565,7 +2436,10 @@ async def recommend_insurance_endpoint(document_id: str):
         else:
             # Fallback to image analysis
             print(f"   ⚠️  No person info found, analyzing image directly")
-            recommendation = await recommend_insurance_by_address(image_path)
+            recommendation = await extraction_flights.do(
+                (pages[0].id, "recommend"),
+                lambda: recommend_insurance_by_address(image_path)
+            )
         
         if "error" in recommendation:
             print(f"   ❌ Analysis error: {recommendation['error']}")
@@ -1903,82 +2777,6 @@ async def update_insurance_purchase(purchase_id: int, request: dict):
         db.close()
 
 
-def format_currency_for_pdf(amount_str):
-    """
-    Format currency string for PDF display
-    Handles both plain numbers and formatted strings like "500.000.000 VNĐ"
-    """
-    if not amount_str:
-        return 'N/A'
-    
-    try:
-        # If it's already a formatted string with VNĐ, return as is
-        if isinstance(amount_str, str) and ('VNĐ' in amount_str.upper() or 'VND' in amount_str.upper()):
-            return amount_str
-        
-        # Try to convert to int and format
-        # Remove any existing formatting first
-        clean_str = str(amount_str).replace('.', '').replace(',', '').replace('VNĐ', '').replace('VND', '').replace('đ', '').strip()
-        amount = int(clean_str)
-        
-        # Format with Vietnamese style (dots as thousand separators)
-        formatted = f"{amount:,}".replace(',', '.')
-        return f"{formatted} VNĐ"
-    except (ValueError, AttributeError):
-        # If conversion fails, return the original string
-        return str(amount_str)
-
-
-def format_date_vietnamese(date_str):
-    """
-    Format date to Vietnamese format DD/MM/YYYY
-    """
-    if not date_str:
-        return 'Chưa xác định'
-    
-    try:
-        # If already in DD/MM/YYYY format
-        if '/' in date_str and len(date_str.split('/')) == 3:
-            return date_str
-        
-        # If in YYYY-MM-DD format
-        if '-' in date_str and len(date_str.split('-')) == 3:
-            parts = date_str.split('-')
-            return f"{parts[2]}/{parts[1]}/{parts[0]}"
-        
-        return date_str
-    except:
-        return date_str
-
-
-def format_currency_for_pdf(amount):
-    """
-    Format currency for PDF display
-    """
-    if not amount:
-        return 'Chưa xác định'
-    
-    try:
-        # If it's already a formatted string with currency, return as-is
-        if isinstance(amount, str):
-            if 'VNĐ' in amount or 'VND' in amount:
-                return amount
-            
-            # Try to extract number from string
-            import re
-            numbers = re.findall(r'\d+\.?\d*', amount.replace('.', '').replace(',', ''))
-            if numbers:
-                amount = float(numbers[0])
-            else:
-                return amount  # Return original if can't parse
-        
-        # Format with Vietnamese locale (dot as thousand separator)
-        formatted = "{:,.0f}".format(float(amount)).replace(',', '.')
-        return f"{formatted} VNĐ"
-    except:
-        return str(amount)
-
-
 @app.get("/insurance-purchases/{purchase_id}/download-contract")
 async def download_insurance_contract(purchase_id: int):
     """
@@ -1986,23 +2784,7 @@ async def download_insurance_contract(purchase_id: int):
     Generates a professional PDF contract document with Vietnamese support
     """
     from app.models import InsurancePurchase
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch, cm
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    from io import BytesIO
-    import os
-    from urllib.parse import quote
-    
-    def safe_text(text, default='N/A'):
-        """Safely handle None/empty text for PDF - allows HTML tags"""
-        if text is None or text == '':
-            return default
-        return str(text)
+    from app.contract_pdf import ContractDetails, build_contract_pdf
     
     db = get_db()
     
@@ -2014,406 +2796,8 @@ async def download_insurance_contract(purchase_id: int):
         if not purchase:
             raise HTTPException(status_code=404, detail="Purchase not found")
         
-        # Create PDF in memory
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer, 
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
-        )
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Try to register Vietnamese font (fallback to default if not available)
-        default_font = 'Helvetica'
-        vietnamese_font_found = False
-        try:
-            # Try multiple Vietnamese-compatible fonts
-            font_paths = [
-                ("C:/Windows/Fonts/arial.ttf", 'ArialVN'),
-                ("C:/Windows/Fonts/arialuni.ttf", 'ArialUniVN'),
-                ("C:/Windows/Fonts/times.ttf", 'TimesVN'),
-                ("C:/Windows/Fonts/verdana.ttf", 'VerdanaVN'),
-            ]
-            
-            for font_path, font_name in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        pdfmetrics.registerFont(TTFont(font_name, font_path, 'UTF-8'))
-                        default_font = font_name
-                        vietnamese_font_found = True
-                        print(f"✅ Registered Vietnamese font: {font_name}")
-                        break
-                    except Exception as font_error:
-                        print(f"⚠️ Failed to register {font_name}: {font_error}")
-                        continue
-        except Exception as e:
-            print(f"⚠️ Font registration error: {e}")
-        
-        if not vietnamese_font_found:
-            print("⚠️ No Vietnamese font found, using ASCII-safe fallback")
-            default_font = 'Helvetica'
-        
-        # Create professional custom styles
-        header_style = ParagraphStyle(
-            'Header',
-            parent=styles['Normal'],
-            fontName=default_font,
-            fontSize=26,
-            textColor=colors.HexColor('#1E40AF'),
-            spaceAfter=10,
-            alignment=TA_CENTER,
-            leading=32
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'Subtitle',
-            parent=styles['Normal'],
-            fontName=default_font,
-            fontSize=16,
-            textColor=colors.HexColor('#DC2626'),
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            leading=20
-        )
-        
-        company_style = ParagraphStyle(
-            'Company',
-            parent=styles['Normal'],
-            fontName=default_font,
-            fontSize=18,
-            textColor=colors.HexColor('#059669'),
-            spaceAfter=8,
-            alignment=TA_CENTER,
-            leading=22
-        )
-        
-        section_heading_style = ParagraphStyle(
-            'SectionHeading',
-            parent=styles['Normal'],
-            fontName=default_font,
-            fontSize=14,
-            textColor=colors.HexColor('#1F2937'),
-            spaceAfter=15,
-            spaceBefore=25,
-            alignment=TA_LEFT,
-            backColor=colors.HexColor('#F3F4F6'),
-            leading=18,
-            borderPadding=8
-        )
-        
-        body_style = ParagraphStyle(
-            'Body',
-            parent=styles['Normal'],
-            fontName=default_font,
-            fontSize=11,
-            textColor=colors.black,
-            spaceAfter=6,
-            alignment=TA_LEFT,
-            leading=14
-        )
-        
-        # === HEADER SECTION ===
-        story.append(Paragraph(safe_text("HỢP ĐỒNG BẢO HIỂM"), header_style))
-        story.append(Paragraph(safe_text(f"Số hợp đồng: BH{purchase.policy_number or str(purchase.id).zfill(8)}"), subtitle_style))
-        
-        # Company header with border
-        story.append(Spacer(1, 0.3*inch))
-        story.append(Paragraph(safe_text("CÔNG TY BẢO HIỂM VAM"), company_style))
-        
-        # Company details
-        company_info = [
-            f"<b>Công ty:</b> {safe_text(purchase.insurance_company or 'VAM Insurance')}",
-            f"<b>Địa chỉ:</b> {safe_text('TP. Hồ Chí Minh, Việt Nam')}",
-            "<b>Hotline:</b> 1900 xxxx",
-            f"<b>Ngày tạo hợp đồng:</b> {datetime.now().strftime('%d/%m/%Y')}"
-        ]
-        
-        for info in company_info:
-            story.append(Paragraph(info, body_style))
-        
-        story.append(Spacer(1, 0.4*inch))
-        
-        # === PACKAGE INFORMATION SECTION ===
-        story.append(Paragraph(safe_text("I. THÔNG TIN GÓI BẢO HIỂM"), section_heading_style))
-        
-        # Create separate styles for different types of information
-        label_style = ParagraphStyle(
-            'Label',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=11,
-            textColor=colors.black,
-            leftIndent=10
-        )
-        
-        value_style = ParagraphStyle(
-            'Value',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=11,
-            textColor=colors.black,
-            leftIndent=10
-        )
-        
-        coverage_style = ParagraphStyle(
-            'Coverage',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=11,
-            textColor=colors.HexColor('#059669'),
-            leftIndent=10
-        )
-        
-        premium_style = ParagraphStyle(
-            'Premium',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=11,
-            textColor=colors.HexColor('#DC2626'),
-            leftIndent=10
-        )
-        
-        # Format coverage amount properly
-        coverage_display = purchase.coverage_amount or '300.000.000 VNĐ/người/năm'
-        if not any(x in coverage_display for x in ['/', 'người', 'năm']):
-            coverage_display += '/người/năm'
-            
-        # Format premium amount
-        premium_display = format_currency_for_pdf(purchase.premium_amount)
-        
-        package_data = [
-            [Paragraph(safe_text('<b>Tên gói bảo hiểm</b>'), label_style), Paragraph(safe_text(purchase.package_name or 'N/A'), value_style)],
-            [Paragraph(safe_text('<b>Loại bảo hiểm</b>'), label_style), Paragraph(safe_text(purchase.package_type or 'N/A'), value_style)],
-            [Paragraph(safe_text('<b>Số tiền bảo hiểm<br/>(Mức bảo hiểm tối đa)</b>'), label_style), Paragraph(safe_text(f'<b>{coverage_display}</b>'), coverage_style)],
-            [Paragraph(safe_text('<b>Phí bảo hiểm<br/>(Số tiền phải trả)</b>'), label_style), Paragraph(safe_text(f'<b>{premium_display}</b>'), premium_style)],
-            [Paragraph(safe_text('<b>Tần suất thanh toán</b>'), label_style), Paragraph(safe_text(purchase.payment_frequency or 'Hàng năm'), value_style)],
-            [Paragraph(safe_text('<b>Ngày bắt đầu</b>'), label_style), Paragraph(safe_text(format_date_vietnamese(purchase.start_date)), value_style)],
-            [Paragraph(safe_text('<b>Ngày kết thúc</b>'), label_style), Paragraph(safe_text(format_date_vietnamese(purchase.end_date)), value_style)],
-        ]
-        
-        package_table = Table(package_data, colWidths=[5*cm, 10*cm])
-        package_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#EBF8FF')),
-            ('BACKGROUND', (1, 0), (1, -1), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), default_font),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#F8FAFC'), colors.white]),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        story.append(package_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # === CUSTOMER INFORMATION SECTION ===
-        story.append(Paragraph(safe_text("II. THÔNG TIN KHÁCH HÀNG"), section_heading_style))
-        
-        customer_data = [
-            [Paragraph(safe_text('<b>Họ và tên</b>'), label_style), Paragraph(safe_text(purchase.customer_name or 'N/A'), value_style)],
-            [Paragraph(safe_text('<b>Số điện thoại</b>'), label_style), Paragraph(safe_text(purchase.customer_phone or 'N/A'), value_style)],
-            [Paragraph(safe_text('<b>Email</b>'), label_style), Paragraph(safe_text(purchase.customer_email or 'Chưa cung cấp'), value_style)],
-            [Paragraph(safe_text('<b>Địa chỉ</b>'), label_style), Paragraph(safe_text(getattr(purchase, 'customer_address', None) or 'Chưa cung cấp'), value_style)],
-            [Paragraph(safe_text('<b>Số CMND/CCCD</b>'), label_style), Paragraph(safe_text(getattr(purchase, 'customer_id_number', None) or 'Chưa cung cấp'), value_style)],
-        ]
-        
-        # Add beneficiary info if available
-        beneficiary_name = getattr(purchase, 'beneficiary_name', None)
-        if beneficiary_name:
-            customer_data.extend([
-                [Paragraph(safe_text('<b>Người thụ hưởng</b>'), label_style), Paragraph(safe_text(beneficiary_name), value_style)],
-                [Paragraph(safe_text('<b>Mối quan hệ</b>'), label_style), Paragraph(safe_text(getattr(purchase, 'beneficiary_relationship', None) or 'N/A'), value_style)],
-            ])
-        
-        customer_table = Table(customer_data, colWidths=[5*cm, 10*cm])
-        customer_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#FEF3F2')),
-            ('BACKGROUND', (1, 0), (1, -1), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), default_font),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#FFFBFB'), colors.white]),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        story.append(customer_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # === VEHICLE INFORMATION (if applicable) ===
-        if purchase.vehicle_type:
-            story.append(Paragraph("III. THÔNG TIN PHƯƠNG TIỆN", section_heading_style))
-            
-            vehicle_data = [
-                [Paragraph('<b>Loại phương tiện</b>', label_style), Paragraph(purchase.vehicle_type or 'N/A', value_style)],
-                [Paragraph('<b>Biển số đăng ký</b>', label_style), Paragraph(purchase.license_plate or 'Chưa cung cấp', value_style)],
-            ]
-            
-            vehicle_table = Table(vehicle_data, colWidths=[5*cm, 10*cm])
-            vehicle_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F0F9FF')),
-                ('BACKGROUND', (1, 0), (1, -1), colors.white),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), default_font),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#F8FBFF'), colors.white]),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('LEFTPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            story.append(vehicle_table)
-            story.append(Spacer(1, 0.3*inch))
-        
-        # === PAYMENT INFORMATION SECTION ===
-        next_section = "IV." if purchase.vehicle_type else "III."
-        story.append(Paragraph(f"{next_section} THÔNG TIN THANH TOÁN", section_heading_style))
-        
-        payment_status_color = colors.HexColor("#059669") if purchase.payment_status == "PAID" else colors.HexColor("#DC2626") if purchase.payment_status == "FAILED" else colors.HexColor("#D97706")
-        
-        payment_status_style = ParagraphStyle(
-            'PaymentStatus',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=11,
-            textColor=payment_status_color,
-            leftIndent=10
-        )
-        
-        payment_data = [
-            [Paragraph('<b>Phương thức thanh toán</b>', label_style), Paragraph(purchase.payment_method or 'Chưa xác định', value_style)],
-            [Paragraph('<b>Trạng thái thanh toán</b>', label_style), Paragraph(f'<b>{purchase.payment_status or "PENDING"}</b>', payment_status_style)],
-            [Paragraph('<b>Mã giao dịch</b>', label_style), Paragraph(getattr(purchase, 'transaction_id', None) or f'TX{purchase.id}{datetime.now().strftime("%Y%m%d")}', value_style)],
-        ]
-        
-        payment_table = Table(payment_data, colWidths=[5*cm, 10*cm])
-        payment_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F0FDF4')),
-            ('BACKGROUND', (1, 0), (1, -1), colors.white),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), default_font),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#F7FEF7'), colors.white]),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E5E7EB')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ]))
-        story.append(payment_table)
-        story.append(Spacer(1, 0.5*inch))
-        
-        # === TERMS AND CONDITIONS ===
-        terms_section = "V." if purchase.vehicle_type else "IV."
-        story.append(Paragraph(f"{terms_section} ĐIỀU KHOẢN VÀ ĐIỀU KIỆN", section_heading_style))
-        
-        terms_text = f"""
-        <b>GIẢI THÍCH CÁC KHOẢN TIỀN:</b><br/>
-        • <b>Số tiền bảo hiểm ({coverage_display}):</b> Đây là số tiền tối đa mà Công ty bảo hiểm sẽ chi trả khi xảy ra rủi ro được bảo hiểm.<br/>
-        • <b>Phí bảo hiểm ({premium_display}):</b> Đây là số tiền Bên mua bảo hiểm phải thanh toán để duy trì hợp đồng bảo hiểm.<br/><br/>
-        
-        <b>ĐIỀU KHOẢN VÀ ĐIỀU KIỆN:</b><br/>
-        1. Hợp đồng này có hiệu lực kể từ ngày ký và thanh toán đầy đủ phí bảo hiểm.<br/>
-        2. Bên mua bảo hiểm có trách nhiệm cung cấp thông tin chính xác và đầy đủ.<br/>
-        3. Công ty bảo hiểm cam kết bồi thường theo đúng điều khoản đã thỏa thuận.<br/>
-        4. Mọi tranh chấp sẽ được giải quyết theo quy định của pháp luật Việt Nam.<br/>
-        5. Hợp đồng này được lập thành 02 bản có giá trị pháp lý như nhau.
-        """
-        
-        story.append(Paragraph(terms_text, body_style))
-        story.append(Spacer(1, 0.5*inch))
-        
-        # === SIGNATURE SECTION ===
-        story.append(Spacer(1, 0.3*inch))
-        
-        signature_header = Paragraph(
-            f"<b>Ngày ký: {datetime.now().strftime('%d tháng %m năm %Y')}</b>",
-            ParagraphStyle('SignatureHeader', parent=body_style, alignment=TA_CENTER, fontSize=12)
-        )
-        story.append(signature_header)
-        story.append(Spacer(1, 0.2*inch))
-        
-        signature_style = ParagraphStyle(
-            'Signature',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=11,
-            alignment=TA_CENTER
-        )
-        
-        signature_small_style = ParagraphStyle(
-            'SignatureSmall',
-            parent=body_style,
-            fontName=default_font,
-            fontSize=9,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#6B7280')
-        )
-        
-        signature_data = [
-            [Paragraph('<b>BÊN MUA BẢO HIỂM</b>', signature_style), Paragraph('<b>ĐẠI DIỆN CÔNG TY</b>', signature_style)],
-            [Paragraph('', signature_style), Paragraph('', signature_style)],
-            [Paragraph('', signature_style), Paragraph('', signature_style)],
-            [Paragraph('', signature_style), Paragraph('', signature_style)],
-            [Paragraph(f'<b>{purchase.customer_name}</b>', signature_style), Paragraph('<b>Giám đốc</b>', signature_style)],
-            [Paragraph('<i>(Ký và ghi rõ họ tên)</i>', signature_small_style), Paragraph('<i>(Ký tên và đóng dấu)</i>', signature_small_style)],
-        ]
-        
-        signature_table = Table(signature_data, colWidths=[7.5*cm, 7.5*cm])
-        signature_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), default_font),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('FONTSIZE', (0, 5), (-1, 5), 9),
-            ('BOTTOMPADDING', (0, 1), (-1, 3), 15),
-            ('TOPPADDING', (0, 4), (-1, 4), 10),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        story.append(signature_table)
-        
-        # === FOOTER ===
-        story.append(Spacer(1, 0.5*inch))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=body_style,
-            fontSize=10,
-            textColor=colors.HexColor('#6B7280'),
-            alignment=TA_CENTER,
-            leading=12
-        )
-        
-        footer_text = f"""
-        <b>HỢP ĐỒNG BẢO HIỂM - SỐ: BH{purchase.policy_number or str(purchase.id).zfill(8)}</b><br/>
-        Được tạo tự động bởi hệ thống VAM Insurance vào ngày {datetime.now().strftime('%d/%m/%Y lúc %H:%M')}<br/>
-        Để biết thêm thông tin, vui lòng liên hệ hotline: 1900 xxxx - website: www.vaminsurance.vn
-        """
-        
-        story.append(Paragraph(footer_text, footer_style))
-        
-        # Build PDF
-        doc.build(story)
-        
-        # Get PDF data
-        buffer.seek(0)
-        pdf_data = buffer.getvalue()
-        buffer.close()
+        # ReportLab layout is CPU-bound; build it off the event loop
+        pdf_data = await run_cpu(build_contract_pdf, ContractDetails.from_purchase(purchase))
         
         # Return as file response
         from fastapi.responses import Response
@@ -2544,8 +2928,8 @@ async def analyze_document_location(document_id: str):
             if not pages or not pages[0].image_url:
                 raise HTTPException(status_code=400, detail="No image found for this document")
             
-            from app.ai_service import get_image_path_from_url, extract_person_info
-            image_path = get_image_path_from_url(pages[0].image_url)
+            from app.ai_service import extract_person_info
+            image_path = await resolve_page_image_path(pages[0], tier="model")
             
             if not image_path or not os.path.exists(image_path):
                 raise HTTPException(status_code=400, detail=f"Image file not found: {image_path}")
@@ -1,4 +1,4 @@
-import type { DocumentInfo, DocumentRegion, ProcessingStatus, DocumentJsonData, PersonInfo } from './types'
+import type { DocumentInfo, DocumentRegion, ProcessingStatus, DocumentJsonData, PersonInfo, BatchAnalysis, BatchUploadResponse } from './types'
 
 const API_BASE = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
@@ -85,6 +85,36 @@ export const documentApi = {
     return { document_id: data.document_id, status: 'uploaded' }
   },
 
+  // Upload several documents at once; analyses is applied to every file,
+  // or given per file in the same order as files
+  uploadDocumentsBatch: async (
+    files: File[],
+    analyses?: BatchAnalysis[] | BatchAnalysis[][]
+  ): Promise<BatchUploadResponse> => {
+    const formData = new FormData()
+    files.forEach((file) => formData.append('files', file))
+
+    if (analyses && analyses.length > 0) {
+      if (Array.isArray(analyses[0])) {
+        (analyses as BatchAnalysis[][]).forEach((fileAnalyses) => formData.append('analyses', fileAnalyses.join(',')))
+      } else {
+        formData.append('analyses', (analyses as BatchAnalysis[]).join(','))
+      }
+    }
+
+    const response = await fetch(`${API_BASE}/documents/upload-batch`, {
+      method: 'POST',
+      body: formData,
+    })
+
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({}))
+      throw new Error(error.detail || 'Batch upload failed')
+    }
+
+    return response.json()
+  },
+
   // Start document processing
   startProcessing: async (documentId: string): Promise<{ job_id: string; status: string }> => {
     const response = await fetch(`${API_BASE}/documents/${documentId}/process`, {
@@ -249,6 +279,22 @@ export const documentApi = {
     return data.vehicle_info
   },
 
+  // Classify each page and run only the matching extractor (person / vehicle / general)
+  extractAuto: async (documentId: string) => {
+    const response = await fetch(`${API_BASE}/documents/${documentId}/extract-auto`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+    })
+    
+    if (!response.ok) {
+      throw new Error('Automatic extraction failed')
+    }
+    
+    return response.json()
+  },
+
   // Get insurance recommendation based on address/region
   getInsuranceRecommendation: async (documentId: string) => {
     const response = await fetch(`${API_BASE}/documents/${documentId}/recommend-insurance`, {
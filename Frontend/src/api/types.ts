@@ -10,6 +10,9 @@ export interface DocumentRegion {
 export interface DocumentPage {
   page_index: number
   image_url: string
+  thumbnail_url?: string
+  screen_url?: string
+  analysis_image_url?: string
 }
 
 export interface DocumentInfo {
@@ -23,6 +26,26 @@ export interface ProcessingStatus {
   progress: number
 }
 
+// Analyses that can be queued per file of a batch upload
+export type BatchAnalysis = 'person' | 'vehicle' | 'general' | 'auto'
+
+// One file of a batch upload manifest
+export interface BatchUploadItem {
+  filename: string
+  status: 'UPLOADED' | 'ERROR'
+  document_id: string | null
+  duplicate_of: string | null
+  error: string | null
+  jobs: Partial<Record<BatchAnalysis, string>> // analysis -> job id
+}
+
+export interface BatchUploadResponse {
+  total: number
+  succeeded: number
+  failed: number
+  items: BatchUploadItem[]
+}
+
 // Person information extracted from CCCD/ID/Driver License
 export interface PersonInfo {
   fullName: string | null
@@ -3,8 +3,9 @@ import { useDocumentStore } from '../../store/document'
 export default function VisualView() {
   const { currentDocument, currentPage } = useDocumentStore()
   
-  // Get current page image URL from document data
-  const currentPageImage = currentDocument?.pages?.[currentPage]?.image_url || ''
+  // Get current page image URL from document data (screen-size tier when available)
+  const page = currentDocument?.pages?.[currentPage]
+  const currentPageImage = page?.screen_url || page?.image_url || ''
   const imageUrl = currentPageImage.startsWith('http') ? currentPageImage : `http://localhost:8000${currentPageImage}`
   
   // Check if current page has a valid image